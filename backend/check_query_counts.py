@@ -0,0 +1,171 @@
+"""
+Query Count Check
+Runs the achievement listing queries against an in-memory SQLite database
+seeded with 100+ rows, reads the same attributes the endpoints read, and
+fails if any endpoint issues more queries than its fixed budget (N+1 check).
+
+Usage:
+    python check_query_counts.py
+"""
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import (
+    SysUser, SysStudent, SysTeacher, BizAchievement,
+    AchievementStatus, UserRole
+)
+from services.achievement_queries import (
+    student_achievements_query, achievement_detail_query, chat_context_achievements_query,
+    review_queue_filters, review_queue_query, review_queue_count_query
+)
+
+STUDENTS = 20
+TEACHERS = 10
+ACHIEVEMENTS_PER_STUDENT = 6  # 120 achievements in total
+PAGE_SIZE = 100
+
+
+class QueryCounter:
+    """Counts statements sent to the database while active"""
+
+    def __init__(self, engine):
+        self.count = 0
+        self.active = False
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active:
+            self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        self.active = True
+        return self
+
+    def __exit__(self, *exc_info):
+        self.active = False
+
+
+def seed(engine):
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        teachers = [
+            SysTeacher(name=f"教师{i}", title="教授", department="计算机学院")
+            for i in range(TEACHERS)
+        ]
+        db.add_all(teachers)
+
+        started = datetime(2024, 1, 1)
+        for i in range(STUDENTS):
+            user = SysUser(username=f"student{i:03d}", password_hash="x", role=UserRole.STUDENT)
+            student = SysStudent(user=user, student_number=f"2024{i:04d}", name=f"学生{i}", major="软件工程")
+            db.add(student)
+            for j in range(ACHIEVEMENTS_PER_STUDENT):
+                db.add(BizAchievement(
+                    student=student,
+                    teacher=teachers[(i + j) % TEACHERS],
+                    title=f"成果{i}-{j}",
+                    type="competition",
+                    content_json={"award_level": "一等奖"},
+                    status=list(AchievementStatus)[j % 3],
+                    is_deleted=False,
+                    created_at=started + timedelta(hours=i * ACHIEVEMENTS_PER_STUDENT + j)
+                ))
+        db.commit()
+
+
+def render_student_list(achievements):
+    return [(ach.title, ach.status.value, ach.teacher.name if ach.teacher else None) for ach in achievements]
+
+
+def render_chat_context(achievements):
+    return [
+        (
+            ach.title, ach.content_json,
+            ach.teacher.name if ach.teacher else None,
+            ach.teacher.title if ach.teacher else None,
+            ach.teacher.department if ach.teacher else None
+        )
+        for ach in achievements
+    ]
+
+
+def render_review_page(achievements):
+    return [
+        (
+            ach.title, ach.student.name, ach.student.student_number,
+            ach.student.major, ach.teacher.name
+        )
+        for ach in achievements
+    ]
+
+
+def check(name, counter, budget, rows, run):
+    with counter:
+        rendered = run()
+    ok = counter.count <= budget and len(rendered) == rows
+    mark = "✅" if ok else "❌"
+    print(f"{mark} {name}: {len(rendered)} rows, {counter.count} queries (budget {budget})")
+    return ok
+
+
+def main():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    seed(engine)
+    counter = QueryCounter(engine)
+    results = []
+
+    print("=" * 70)
+    print("Achievement listing query counts")
+    print("=" * 70)
+
+    # Reference: lazy loading issues one extra query per distinct teacher
+    with Session(engine) as db:
+        with counter:
+            render_student_list(db.scalars(select(BizAchievement)).all())
+        print(f"ℹ️  lazy-loaded listing for reference: {counter.count} queries")
+
+    with Session(engine) as db:
+        results.append(check(
+            "student achievements", counter, 1, ACHIEVEMENTS_PER_STUDENT,
+            lambda: render_student_list(db.scalars(student_achievements_query(1)).all())
+        ))
+
+    with Session(engine) as db:
+        results.append(check(
+            "achievement detail", counter, 1, 1,
+            lambda: render_student_list(db.scalars(achievement_detail_query(1, 1)).all())
+        ))
+
+    with Session(engine) as db:
+        results.append(check(
+            "ai chat context", counter, 1, ACHIEVEMENTS_PER_STUDENT,
+            lambda: render_chat_context(db.scalars(chat_context_achievements_query(1)).all())
+        ))
+
+    with Session(engine) as db:
+        def review_page():
+            filters = review_queue_filters()
+            db.scalar(review_queue_count_query(filters))
+            return render_review_page(db.scalars(review_queue_query(filters).limit(PAGE_SIZE)).all())
+
+        results.append(check(f"admin review page ({PAGE_SIZE} rows)", counter, 2, PAGE_SIZE, review_page))
+
+    print()
+    if all(results):
+        print("✅ All listing endpoints stay within their query budget")
+        return 0
+    print("❌ Some listing endpoints exceed their query budget (N+1 loads?)")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
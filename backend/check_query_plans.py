@@ -0,0 +1,92 @@
+"""
+Query Plan Check
+Runs EXPLAIN for the hot achievement queries against the configured MySQL
+database and fails if they stop using their composite indexes
+(migration 005). Plans depend on table statistics, so run it against a
+database with realistic data rather than an empty one.
+
+Usage:
+    python check_query_plans.py
+"""
+import sys
+from datetime import datetime
+from sqlalchemy import select, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from database import engine
+from models import SysStudent, AchievementStatus
+from services.achievement_queries import (
+    student_achievements_query, review_queue_filters, review_queue_query
+)
+
+STUDENT_INDEX = "ix_biz_achievements_student_deleted_created"
+REVIEW_INDEX = "ix_biz_achievements_status_created"
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN <statement>, with parameters bound the same way as the statement itself"""
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
+def check(conn, name, statement, expected_index):
+    rows = conn.execute(Explain(statement)).mappings().all()
+    plan = next((row for row in rows if row["table"] == "biz_achievements"), None)
+
+    if plan is None:
+        print(f"❌ {name}: biz_achievements not found in plan")
+        return False
+
+    ok = plan["key"] == expected_index
+    mark = "✅" if ok else "❌"
+    print(f"{mark} {name}")
+    print(f"   key: {plan['key']} (expected {expected_index})")
+    print(f"   possible_keys: {plan['possible_keys']}")
+    print(f"   rows: {plan['rows']}, extra: {plan['Extra']}")
+    return ok
+
+
+def main():
+    if engine.dialect.name != "mysql":
+        print(f"❌ EXPLAIN check needs MySQL, DATABASE_URL uses {engine.dialect.name}")
+        return 1
+
+    print("=" * 70)
+    print("Achievement query plans")
+    print("=" * 70)
+
+    with engine.connect() as conn:
+        student_id = conn.scalar(select(func.min(SysStudent.id))) or 1
+        cursor = (datetime.utcnow(), 2 ** 31 - 1)
+        pending = review_queue_filters(AchievementStatus.PENDING)
+
+        results = [
+            check(conn, "student achievements",
+                  student_achievements_query(student_id), STUDENT_INDEX),
+            check(conn, "student achievements by status",
+                  student_achievements_query(student_id, AchievementStatus.APPROVED), STUDENT_INDEX),
+            check(conn, "review queue, first page",
+                  review_queue_query(pending).limit(11), REVIEW_INDEX),
+            check(conn, "review queue, cursor page",
+                  review_queue_query(pending, after=cursor).limit(11), REVIEW_INDEX),
+        ]
+
+    print()
+    if all(results):
+        print("✅ All queries use their composite indexes")
+        return 0
+    print("❌ Some queries no longer use their composite indexes")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
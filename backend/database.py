@@ -1,19 +1,68 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from config import settings
+from db_metrics import PoolMetrics, pool_options, instrument_engine
 
-# Create database engine
+# Async drivers used for each sync driver in DATABASE_URL
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqlconnector": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_database_url() -> str:
+    """ASYNC_DATABASE_URL if set, otherwise DATABASE_URL with its async driver"""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    
+    url = make_url(settings.DATABASE_URL)
+    async_driver = ASYNC_DRIVERS.get(url.drivername)
+    if not async_driver:
+        raise ValueError(f"No async driver configured for '{url.drivername}', set ASYNC_DATABASE_URL")
+    return url.set(drivername=async_driver).render_as_string(hide_password=False)
+
+
+# Create database engine (pool sized from DB_POOL_* settings)
+sync_pool_metrics = PoolMetrics("sync")
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
-    pool_recycle=3600,
-    echo=True  # Set to False in production
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    echo=settings.DB_ECHO,
+    **pool_options(settings.DATABASE_URL, QueuePool, sync_pool_metrics)
 )
+instrument_engine(engine, sync_pool_metrics)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for async routers (queries do not block the event loop)
+async_pool_metrics = PoolMetrics("async")
+ASYNC_DATABASE_URL = get_async_database_url()
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    echo=settings.DB_ECHO,
+    **pool_options(ASYNC_DATABASE_URL, AsyncAdaptedQueuePool, async_pool_metrics)
+)
+instrument_engine(async_engine.sync_engine, async_pool_metrics)
+
+# Objects stay usable after commit; async sessions cannot lazy-load on attribute access
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for models
 Base = declarative_base()
 
@@ -27,6 +76,12 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dependency for getting an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
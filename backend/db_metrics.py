@@ -0,0 +1,184 @@
+"""
+Database Pool Telemetry
+Connection pool counters, checkout wait times and a sampled slow-query log
+for the sync and async engines
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+from config import settings
+
+logger = logging.getLogger("db.slow_query")
+
+# Engines registered with instrument_engine(), by name
+_registry: Dict[str, "PoolMetrics"] = {}
+
+
+class PoolMetrics:
+    """Counters for one engine's connection pool"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.engine = None
+        self._lock = threading.Lock()
+        self._wait_ms = deque(maxlen=1000)
+        self._stats = {
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "connects": 0,
+            "invalidations": 0,
+            "slow_queries": 0
+        }
+
+    def record_checkout(self, wait_ms: float, timed_out: bool):
+        with self._lock:
+            if timed_out:
+                self._stats["checkout_timeouts"] += 1
+            else:
+                self._stats["checkouts"] += 1
+            self._wait_ms.append(wait_ms)
+
+    def increment(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def snapshot(self) -> Dict:
+        """
+        Get pool metrics
+
+        Returns:
+            Current pool occupancy, configured limits, counters and checkout
+            wait percentiles (ms) since process start
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            waits = sorted(self._wait_ms)
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 1)
+
+        pool = self.engine.pool if self.engine is not None else None
+        stats["pool_class"] = type(pool).__name__ if pool is not None else None
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "pool_size": pool.size(),
+                "max_overflow": settings.DB_MAX_OVERFLOW,
+                "pool_timeout": pool.timeout(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                # Negative while the pool has not opened all of its base connections
+                "overflow": max(0, pool.overflow())
+            })
+        stats["wait_ms"] = {
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": round(waits[-1], 1) if waits else 0,
+            "samples": len(waits)
+        }
+        return stats
+
+
+class _TimedCheckoutMixin:
+    """Times QueuePool._do_get, which blocks up to pool_timeout for a free connection"""
+
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.metrics.record_checkout((time.perf_counter() - started) * 1000, timed_out)
+
+
+def pool_options(url: str, pool_class, metrics: PoolMetrics) -> Dict:
+    """
+    Engine keyword arguments for a sized, instrumented queue pool
+
+    SQLite URLs keep SQLAlchemy's default pool, which does not take sizing arguments.
+
+    Args:
+        url: Database URL the engine is created for
+        pool_class: QueuePool for sync engines, AsyncAdaptedQueuePool for async ones
+        metrics: Counters the pool reports checkout waits to
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+
+    # recreate() on dispose builds the pool from self.__class__, so the metrics stay attached
+    instrumented = type(
+        f"Instrumented{pool_class.__name__}",
+        (_TimedCheckoutMixin, pool_class),
+        {"metrics": metrics}
+    )
+    return {
+        "poolclass": instrumented,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT
+    }
+
+
+def instrument_engine(engine: Engine, metrics: PoolMetrics):
+    """
+    Register an engine for pool stats and attach the slow-query log
+
+    Pass async_engine.sync_engine for async engines.
+    """
+    metrics.engine = engine
+    _registry[metrics.name] = metrics
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.increment("connects")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.increment("invalidations")
+
+    if settings.DB_SLOW_QUERY_MS <= 0:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms < settings.DB_SLOW_QUERY_MS:
+            return
+
+        metrics.increment("slow_queries")
+        if random.random() >= settings.DB_SLOW_QUERY_SAMPLE_RATE:
+            return
+
+        # Parameters are left out, they may contain password hashes or personal data
+        logger.warning(
+            f"Slow query on {metrics.name} engine ({elapsed_ms:.0f} ms"
+            f"{', executemany' if executemany else ''}): {statement[:1000]}"
+        )
+
+
+def get_pool_stats() -> Dict:
+    """Metrics for every registered engine, by engine name"""
+    return {name: metrics.snapshot() for name, metrics in _registry.items()}
@@ -1,16 +1,22 @@
 from fastapi import Depends, HTTPException, status, Header
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from auth import decode_access_token
-from database import get_db
+from database import get_db, get_async_db
 from models import SysUser, SysStudent, UserRole
+from services.principal_cache import AuthPrincipal, principal_cache
 
 
-def get_current_user(
+def get_current_principal(
     authorization: Optional[str] = Header(None),
     db: Session = Depends(get_db)
-) -> SysUser:
-    """Get current authenticated user from JWT token"""
+) -> AuthPrincipal:
+    """
+    Get the authenticated principal from the JWT token
+    
+    Served from the principal cache, so a warm cache costs no database query
+    """
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -33,8 +39,30 @@ def get_current_user(
             detail="Invalid token payload"
         )
     
-    user = db.query(SysUser).filter(SysUser.id == int(user_id)).first()
+    principal = principal_cache.load(db, int(user_id))
+    if not principal:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    
+    if not principal.matches_claims(payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token is no longer valid, please log in again"
+        )
+    
+    return principal
+
+
+def get_current_user(
+    principal: AuthPrincipal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+) -> SysUser:
+    """Get current authenticated user row (use get_current_principal when the row is not needed)"""
+    user = db.get(SysUser, principal.user_id)
     if not user:
+        principal_cache.invalidate(principal.user_id)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
@@ -43,29 +71,61 @@ def get_current_user(
     return user
 
 
-def require_student(current_user: SysUser = Depends(get_current_user)) -> SysStudent:
-    """Require student role and return student profile"""
-    if current_user.role != UserRole.STUDENT:
+def require_student_principal(principal: AuthPrincipal = Depends(get_current_principal)) -> AuthPrincipal:
+    """Require student role without loading any rows (principal.student_id is the student profile id)"""
+    if principal.role != UserRole.STUDENT:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Student role required"
         )
     
-    if not current_user.student:
+    if not principal.student_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Student profile not found"
+        )
+    
+    return principal
+
+
+def require_student(
+    principal: AuthPrincipal = Depends(require_student_principal),
+    db: Session = Depends(get_db)
+) -> SysStudent:
+    """Require student role and return student profile"""
+    student = db.get(SysStudent, principal.student_id)
+    if not student:
+        principal_cache.invalidate(principal.user_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Student profile not found"
+        )
+    
+    return student
+
+
+async def require_student_async(
+    principal: AuthPrincipal = Depends(require_student_principal),
+    db: AsyncSession = Depends(get_async_db)
+) -> SysStudent:
+    """Require student role and return student profile loaded through the async session"""
+    student = await db.get(SysStudent, principal.student_id)
+    if not student:
+        principal_cache.invalidate(principal.user_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Student profile not found"
         )
     
-    return current_user.student
+    return student
 
 
-def require_admin(current_user: SysUser = Depends(get_current_user)) -> SysUser:
+def require_admin(principal: AuthPrincipal = Depends(get_current_principal)) -> AuthPrincipal:
     """Require admin role"""
-    if current_user.role != UserRole.ADMIN:
+    if principal.role != UserRole.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin role required"
         )
     
-    return current_user
+    return principal
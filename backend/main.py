@@ -8,6 +8,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from config import settings
 from database import init_db
+import asyncio
 import os
 
 # Import routers
@@ -52,10 +53,33 @@ app.include_router(feishu.router)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
+    """Initialize database and background workers on startup"""
     print("Initializing database...")
     init_db()
     print("Database initialized successfully!")
+    
+    from services.ocr_jobs import ocr_job_queue
+    from services.feishu import feishu_import_runner
+    from services.achievement_retrieval import load_tokenizer
+    await ocr_job_queue.start()
+    await feishu_import_runner.start()
+    await asyncio.to_thread(load_tokenizer)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers and close shared HTTP/database pools on shutdown"""
+    from database import async_engine
+    from services.ocr_jobs import ocr_job_queue
+    from services.feishu import feishu_client_registry, feishu_import_runner
+    from services.password_hasher import password_hasher
+    from services.rate_limiter import auth_throttle
+    await ocr_job_queue.stop()
+    await feishu_import_runner.stop()
+    password_hasher.shutdown()
+    await auth_throttle.close()
+    await feishu_client_registry.close_all()
+    await async_engine.dispose()
 
 
 @app.get("/")
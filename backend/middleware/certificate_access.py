@@ -12,7 +12,8 @@ import re
 from config import settings
 from auth import decode_access_token
 from database import SessionLocal
-from models import SysUser, UserRole
+from models import UserRole
+from services.principal_cache import principal_cache
 
 
 class CertificateAccessMiddleware(BaseHTTPMiddleware):
@@ -50,46 +51,45 @@ class CertificateAccessMiddleware(BaseHTTPMiddleware):
             # Decode token and verify access
             try:
                 payload = decode_access_token(token)
-                username = payload.get("sub")
+                user_id = payload.get("sub") if payload else None
                 
-                if not username:
+                if not user_id:
                     raise HTTPException(
                         status_code=status.HTTP_401_UNAUTHORIZED,
                         detail="Invalid token"
                     )
                 
-                # Get user from database
+                # Get principal (cached; database is only hit on a miss)
                 db = SessionLocal()
                 try:
-                    user = db.query(SysUser).filter(SysUser.username == username).first()
-                    
-                    if not user:
-                        raise HTTPException(
-                            status_code=status.HTTP_401_UNAUTHORIZED,
-                            detail="User not found"
-                        )
-                    
-                    # Check access permissions
-                    # Admin can access all certificates
-                    if user.role == UserRole.ADMIN:
+                    principal = principal_cache.load(db, int(user_id))
+                finally:
+                    db.close()
+                
+                if not principal or not principal.matches_claims(payload):
+                    raise HTTPException(
+                        status_code=status.HTTP_401_UNAUTHORIZED,
+                        detail="User not found"
+                    )
+                
+                # Check access permissions
+                # Admin can access all certificates
+                if principal.role == UserRole.ADMIN:
+                    pass  # Allow access
+                # Student can only access their own certificates
+                elif principal.role == UserRole.STUDENT:
+                    if principal.student_id == file_owner_id:
                         pass  # Allow access
-                    # Student can only access their own certificates
-                    elif user.role == UserRole.STUDENT:
-                        if user.student and user.student.id == file_owner_id:
-                            pass  # Allow access
-                        else:
-                            raise HTTPException(
-                                status_code=status.HTTP_403_FORBIDDEN,
-                                detail="Access denied: You can only access your own certificates"
-                            )
                     else:
                         raise HTTPException(
                             status_code=status.HTTP_403_FORBIDDEN,
-                            detail="Access denied"
+                            detail="Access denied: You can only access your own certificates"
                         )
-                        
-                finally:
-                    db.close()
+                else:
+                    raise HTTPException(
+                        status_code=status.HTTP_403_FORBIDDEN,
+                        detail="Access denied"
+                    )
                     
             except HTTPException:
                 raise
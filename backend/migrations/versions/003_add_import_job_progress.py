@@ -0,0 +1,46 @@
+"""Add background job progress fields to feishu_import_logs table
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add status and checkpoint columns so imports can run and resume in the background"""
+    op.add_column('feishu_import_logs',
+        sa.Column('status', sa.String(20), nullable=True, server_default='completed')
+    )
+    op.add_column('feishu_import_logs',
+        sa.Column('skip_invalid', sa.Boolean(), nullable=True, server_default='1')
+    )
+    op.add_column('feishu_import_logs',
+        sa.Column('processed_records', sa.Integer(), nullable=True, server_default='0')
+    )
+    op.add_column('feishu_import_logs', sa.Column('last_page_token', sa.String(200), nullable=True))
+    op.add_column('feishu_import_logs', sa.Column('error_message', sa.Text(), nullable=True))
+    op.add_column('feishu_import_logs', sa.Column('finished_at', sa.DateTime(), nullable=True))
+    op.add_column('feishu_import_logs', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_feishu_import_logs_status'), 'feishu_import_logs', ['status'])
+
+
+def downgrade():
+    """Remove background job progress columns"""
+    op.drop_index(op.f('ix_feishu_import_logs_status'), table_name='feishu_import_logs')
+    op.drop_column('feishu_import_logs', 'updated_at')
+    op.drop_column('feishu_import_logs', 'finished_at')
+    op.drop_column('feishu_import_logs', 'error_message')
+    op.drop_column('feishu_import_logs', 'last_page_token')
+    op.drop_column('feishu_import_logs', 'processed_records')
+    op.drop_column('feishu_import_logs', 'skip_invalid')
+    op.drop_column('feishu_import_logs', 'status')
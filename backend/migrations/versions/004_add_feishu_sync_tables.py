@@ -0,0 +1,66 @@
+"""Add Feishu record mappings and sync watermarks for incremental sync
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create record mapping / sync state tables and add sync fields to import logs"""
+    op.create_table(
+        'feishu_record_mappings',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('app_token', sa.String(100), nullable=False),
+        sa.Column('table_id', sa.String(100), nullable=False),
+        sa.Column('record_id', sa.String(100), nullable=False),
+        sa.Column('achievement_id', sa.Integer(), sa.ForeignKey('biz_achievements.id'), nullable=False),
+        sa.Column('file_token', sa.String(200), nullable=True),
+        sa.Column('feishu_modified_at', sa.BigInteger(), nullable=True),
+        sa.Column('synced_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('app_token', 'table_id', 'record_id', name='uq_feishu_record')
+    )
+    op.create_index(op.f('ix_feishu_record_mappings_id'), 'feishu_record_mappings', ['id'])
+    op.create_index(
+        op.f('ix_feishu_record_mappings_achievement_id'), 'feishu_record_mappings', ['achievement_id']
+    )
+    
+    op.create_table(
+        'feishu_sync_states',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('app_token', sa.String(100), nullable=False),
+        sa.Column('table_id', sa.String(100), nullable=False),
+        sa.Column('last_modified_watermark', sa.BigInteger(), nullable=True),
+        sa.Column('last_import_log_id', sa.Integer(), nullable=True),
+        sa.Column('last_synced_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('app_token', 'table_id', name='uq_feishu_sync_table')
+    )
+    op.create_index(op.f('ix_feishu_sync_states_id'), 'feishu_sync_states', ['id'])
+    
+    op.add_column('feishu_import_logs',
+        sa.Column('mode', sa.String(20), nullable=True, server_default='full')
+    )
+    op.add_column('feishu_import_logs',
+        sa.Column('skipped_count', sa.Integer(), nullable=True, server_default='0')
+    )
+
+
+def downgrade():
+    """Drop incremental sync tables and fields"""
+    op.drop_column('feishu_import_logs', 'skipped_count')
+    op.drop_column('feishu_import_logs', 'mode')
+    op.drop_index(op.f('ix_feishu_sync_states_id'), table_name='feishu_sync_states')
+    op.drop_table('feishu_sync_states')
+    op.drop_index(op.f('ix_feishu_record_mappings_achievement_id'), table_name='feishu_record_mappings')
+    op.drop_index(op.f('ix_feishu_record_mappings_id'), table_name='feishu_record_mappings')
+    op.drop_table('feishu_record_mappings')
@@ -0,0 +1,42 @@
+"""Add composite indexes for the student list and admin review queue queries
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Replace single-column student_id/status indexes with composites matching the hot queries"""
+    # Student list: WHERE student_id = ? AND is_deleted = 0 ORDER BY created_at DESC
+    op.create_index(
+        'ix_biz_achievements_student_deleted_created', 'biz_achievements',
+        ['student_id', 'is_deleted', 'created_at']
+    )
+    # Admin review queue: WHERE status = ? ORDER BY created_at DESC, id DESC
+    op.create_index(
+        'ix_biz_achievements_status_created', 'biz_achievements',
+        ['status', 'created_at']
+    )
+
+    # Both are leftmost prefixes of the new indexes (which also back the student_id foreign key)
+    op.drop_index(op.f('ix_biz_achievements_student_id'), table_name='biz_achievements')
+    op.drop_index(op.f('ix_biz_achievements_status'), table_name='biz_achievements')
+
+
+def downgrade():
+    """Restore single-column indexes"""
+    op.create_index(op.f('ix_biz_achievements_status'), 'biz_achievements', ['status'])
+    op.create_index(op.f('ix_biz_achievements_student_id'), 'biz_achievements', ['student_id'])
+    op.drop_index('ix_biz_achievements_status_created', table_name='biz_achievements')
+    op.drop_index('ix_biz_achievements_student_deleted_created', table_name='biz_achievements')
@@ -0,0 +1,29 @@
+"""Add context_version to sys_students for the AI chat context cache
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add the counter bumped on every achievement create/audit/delete/import"""
+    op.add_column(
+        'sys_students',
+        sa.Column('context_version', sa.Integer(), nullable=False, server_default='0')
+    )
+
+
+def downgrade():
+    """Remove context_version column"""
+    op.drop_column('sys_students', 'context_version')
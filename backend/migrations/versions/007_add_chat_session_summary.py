@@ -0,0 +1,28 @@
+"""Add rolling history summary to ai_chat_sessions
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add history_summary and summarized_until columns"""
+    op.add_column('ai_chat_sessions', sa.Column('history_summary', sa.Text(), nullable=True))
+    op.add_column('ai_chat_sessions', sa.Column('summarized_until', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    """Remove rolling summary columns"""
+    op.drop_column('ai_chat_sessions', 'summarized_until')
+    op.drop_column('ai_chat_sessions', 'history_summary')
@@ -0,0 +1,26 @@
+"""Add retry_record_ids to feishu_sync_states
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Record ids that failed to import, retried by the next incremental sync"""
+    op.add_column('feishu_sync_states', sa.Column('retry_record_ids', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    """Remove retry_record_ids column"""
+    op.drop_column('feishu_sync_states', 'retry_record_ids')
@@ -1,4 +1,4 @@
-﻿from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, ForeignKey, JSON, Boolean
+﻿from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Enum, ForeignKey, JSON, Boolean, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -62,6 +62,7 @@ class SysStudent(Base):
     name = Column(String(50), nullable=False)
     major = Column(String(100))  # 专业
     persona_cache = Column(JSON)  # AI生成的画像数据
+    context_version = Column(Integer, nullable=False, default=0, server_default="0")  # 成果变更时递增，失效AI对话上下文缓存
     
     # Relationships
     user = relationship("SysUser", back_populates="student")
@@ -72,16 +73,22 @@ class SysStudent(Base):
 class BizAchievement(Base):
     """Achievement table"""
     __tablename__ = "biz_achievements"
+    __table_args__ = (
+        # 学生成果列表: WHERE student_id = ? AND is_deleted = 0 ORDER BY created_at DESC
+        Index("ix_biz_achievements_student_deleted_created", "student_id", "is_deleted", "created_at"),
+        # 管理员审核队列: WHERE status = ? ORDER BY created_at DESC, id DESC（InnoDB二级索引隐含主键id）
+        Index("ix_biz_achievements_status_created", "status", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    student_id = Column(Integer, ForeignKey("sys_students.id"), nullable=False, index=True)
+    student_id = Column(Integer, ForeignKey("sys_students.id"), nullable=False)
     teacher_id = Column(Integer, ForeignKey("sys_teachers.id"), nullable=False, index=True)
     title = Column(String(200), nullable=False)
     type = Column(String(50), nullable=False)  # 字典值
     content_json = Column(JSON)  # OCR识别后的结构化详情
     evidence_url = Column(String(500))  # 证书图片地址
     feishu_attachment_token = Column(String(200), default=None)  # 飞书附件临时token
-    status = Column(Enum(AchievementStatus), default=AchievementStatus.PENDING, index=True)
+    status = Column(Enum(AchievementStatus), default=AchievementStatus.PENDING)
     audit_comment = Column(Text)  # 审核意见
     is_deleted = Column(Boolean, default=False, index=True)  # 软删除标记
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -98,6 +105,8 @@ class AiChatSession(Base):
     id = Column(String(36), primary_key=True)  # UUID
     student_id = Column(Integer, ForeignKey("sys_students.id"), nullable=False, index=True)
     title = Column(String(200))  # 会话摘要
+    history_summary = Column(Text)  # 较早对话的滚动摘要（超出提示词预算的历史消息）
+    summarized_until = Column(Integer)  # 已并入摘要的最新消息ID
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
@@ -167,4 +176,49 @@ class FeishuImportLog(Base):
     failed_count = Column(Integer, default=0)
     error_details = Column(JSON)
     import_duration_seconds = Column(Integer, default=0)
+    
+    # Background job progress (checkpointed after every page)
+    mode = Column(String(20), default="full")  # full, incremental
+    status = Column(String(20), default="completed", index=True)  # queued, running, completed, failed
+    skip_invalid = Column(Boolean, default=True)
+    processed_records = Column(Integer, default=0)
+    skipped_count = Column(Integer, default=0)  # 增量同步中未变化的记录
+    last_page_token = Column(String(200))
+    error_message = Column(Text)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class FeishuRecordMapping(Base):
+    """Feishu record_id -> achievement mapping, used to upsert instead of re-inserting"""
+    __tablename__ = "feishu_record_mappings"
+    __table_args__ = (
+        UniqueConstraint("app_token", "table_id", "record_id", name="uq_feishu_record"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    app_token = Column(String(100), nullable=False)
+    table_id = Column(String(100), nullable=False)
+    record_id = Column(String(100), nullable=False)
+    achievement_id = Column(Integer, ForeignKey("biz_achievements.id"), nullable=False, index=True)
+    file_token = Column(String(200))  # 上次导入的附件token，未变化时不重新下载
+    feishu_modified_at = Column(BigInteger)  # 飞书 last_modified_time（毫秒）
+    synced_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class FeishuSyncState(Base):
+    """Incremental sync watermark per Feishu table"""
+    __tablename__ = "feishu_sync_states"
+    __table_args__ = (
+        UniqueConstraint("app_token", "table_id", name="uq_feishu_sync_table"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    app_token = Column(String(100), nullable=False)
+    table_id = Column(String(100), nullable=False)
+    last_modified_watermark = Column(BigInteger, default=0)  # 毫秒，之后修改的记录才会同步
+    retry_record_ids = Column(JSON)  # 导入失败的record_id，下次增量同步时无论是否修改都重试
+    last_import_log_id = Column(Integer)
+    last_synced_at = Column(DateTime)
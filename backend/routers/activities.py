@@ -8,7 +8,8 @@ from datetime import datetime
 
 from database import get_db
 from utils import success_response, error_response
-from dependencies import require_student, require_admin
+from dependencies import require_student_principal, require_admin
+from services.principal_cache import AuthPrincipal
 from models import SysStudent, SysUser
 
 router = APIRouter(prefix="/api/v1/activities", tags=["Activities"])
@@ -20,7 +21,7 @@ async def get_activities(
     page_size: int = Query(10, ge=1, le=100),
     status: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: SysUser = Depends(require_student)
+    current_user: AuthPrincipal = Depends(require_student_principal)
 ):
     """
     获取活动列表（学生端）
@@ -96,7 +97,7 @@ async def get_activities(
 async def get_activity_detail(
     activity_id: int,
     db: Session = Depends(get_db),
-    current_user: SysUser = Depends(require_student)
+    current_user: AuthPrincipal = Depends(require_student_principal)
 ):
     """
     获取活动详情
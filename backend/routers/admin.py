@@ -1,9 +1,8 @@
 from fastapi import APIRouter, Depends, Query, Path
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime
-from database import get_db
+from database import get_async_db
 from schemas import AchievementListResponse, AchievementResponse, AchievementAudit
 from utils import success_response, error_response
 from models import (
@@ -11,6 +10,13 @@ from models import (
     SysTeacher, SysUser
 )
 from dependencies import require_admin
+from services.principal_cache import AuthPrincipal
+from services.chat_context import context_version_bump
+from config import settings
+from services.achievement_queries import (
+    review_queue_filters, review_queue_query, review_queue_count_query,
+    encode_review_cursor, decode_review_cursor, review_count_cache
+)
 
 router = APIRouter(prefix="/api/v1/admin", tags=["Admin"])
 
@@ -21,39 +27,64 @@ async def get_achievements_for_review(
     student_name: Optional[str] = Query(None),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
-    admin: SysUser = Depends(require_admin),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None),
+    with_total: bool = Query(True),
+    admin: AuthPrincipal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get achievements for review
     - Admin can view all achievements
-    - Filter by status and student name
-    - Pagination support
+    - Filter by status and student (name substring, student number prefix or pinyin initials)
+    - Keyset pagination: pass next_cursor from the previous page as cursor
+      (constant cost per page); page is only used without a cursor
+    - total is cached briefly per filter, with_total=false skips it (null)
     """
-    # Build query with joins
-    query = db.query(BizAchievement).join(
-        SysStudent, BizAchievement.student_id == SysStudent.id
-    ).join(
-        SysTeacher, BizAchievement.teacher_id == SysTeacher.id
-    )
-    
     # Apply filters
+    status_enum = None
     if status:
         try:
             status_enum = AchievementStatus(status)
-            query = query.filter(BizAchievement.status == status_enum)
         except ValueError:
             return error_response(msg="Invalid status value", code=400)
     
+    after = None
+    if cursor:
+        try:
+            after = decode_review_cursor(cursor)
+        except ValueError:
+            return error_response(msg="Invalid cursor", code=400)
+    
+    # Name / number / pinyin lookup through the in-process index; LIKE if too broad
+    student_ids = None
     if student_name:
-        query = query.filter(SysStudent.name.like(f"%{student_name}%"))
+        from services.student_search import student_search_index
+        
+        await student_search_index.ensure_fresh(db)
+        student_ids = student_search_index.search(student_name, settings.STUDENT_SEARCH_MAX_MATCHES)
     
-    # Get total count
-    total = query.count()
+    filters = review_queue_filters(status_enum, student_name, student_ids)
     
-    # Apply pagination
-    offset = (page - 1) * page_size
-    achievements = query.order_by(BizAchievement.created_at.desc()).offset(offset).limit(page_size).all()
+    # Get total count (cached per filter)
+    total = None
+    if with_total:
+        count_key = (status_enum, student_name or None)
+        total = review_count_cache.get(count_key)
+        if total is None:
+            total = await db.scalar(review_queue_count_query(filters))
+            review_count_cache.set(count_key, total)
+    
+    # Apply pagination (student/teacher are filled from the join, no extra queries)
+    # One extra row tells whether there is a next page
+    query = review_queue_query(filters, after=after)
+    if after is None and page > 1:
+        query = query.offset((page - 1) * page_size)
+    result = await db.execute(query.limit(page_size + 1))
+    achievements = result.scalars().all()
+    
+    has_more = len(achievements) > page_size
+    achievements = achievements[:page_size]
+    next_cursor = encode_review_cursor(achievements[-1]) if has_more else None
     
     # Format response
     achievement_list = []
@@ -76,7 +107,49 @@ async def get_achievements_for_review(
     
     return success_response(data={
         "list": achievement_list,
-        "total": total
+        "total": total,
+        "has_more": has_more,
+        "next_cursor": next_cursor
+    })
+
+
+@router.get("/achievements/stats")
+async def get_achievement_stats(
+    admin: AuthPrincipal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get achievement counts by status for the dashboard
+    - One GROUP BY status query; counts match the review list totals (soft-deleted included)
+    """
+    from services.achievement_stats import get_status_counts
+    
+    stats = await get_status_counts(db, include_deleted=True)
+    return success_response(data=stats)
+
+
+@router.get("/students/search")
+async def search_students(
+    q: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(20, ge=1, le=100),
+    admin: AuthPrincipal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Search students for the review filter
+    - Name substring, student number prefix, pinyin prefix or initials (e.g. "zs")
+    - Served from the in-process index, no table scan
+    """
+    from services.student_search import student_search_index
+    
+    await student_search_index.ensure_fresh(db)
+    student_ids = student_search_index.search(q, settings.STUDENT_SEARCH_MAX_MATCHES)
+    if student_ids is None:
+        return success_response(data={"list": [], "too_many": True})
+    
+    return success_response(data={
+        "list": student_search_index.describe(student_ids[:limit]),
+        "too_many": False
     })
 
 
@@ -84,8 +157,8 @@ async def get_achievements_for_review(
 async def audit_achievement(
     achievement_id: int = Path(...),
     audit_req: AchievementAudit = None,
-    admin: SysUser = Depends(require_admin),
-    db: Session = Depends(get_db)
+    admin: AuthPrincipal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Audit achievement
@@ -94,7 +167,7 @@ async def audit_achievement(
     - Invalidates student persona cache on approval
     """
     # Get achievement
-    achievement = db.query(BizAchievement).filter(BizAchievement.id == achievement_id).first()
+    achievement = await db.get(BizAchievement, achievement_id)
     
     if not achievement:
         return error_response(msg="Achievement not found", code=404)
@@ -113,15 +186,65 @@ async def audit_achievement(
         achievement.audit_comment = audit_req.comment or "Approved"
         
         # Invalidate persona cache for student
-        student = db.query(SysStudent).filter(SysStudent.id == achievement.student_id).first()
+        student = await db.get(SysStudent, achievement.student_id)
         if student:
             student.persona_cache = None  # Mark for regeneration
     else:
         achievement.status = AchievementStatus.REJECTED
         achievement.audit_comment = audit_req.comment
     
-    db.commit()
+    # Status and audit comment are part of the student's AI chat context
+    await db.execute(context_version_bump([achievement.student_id]))
+    await db.commit()
+    review_count_cache.clear()
     
     # TODO: Send notification to student (optional)
     
     return success_response(msg=f"Achievement {audit_req.action}d successfully")
+
+
+@router.get("/ocr/cache-stats")
+async def get_ocr_cache_stats(
+    admin: AuthPrincipal = Depends(require_admin)
+):
+    """
+    Get certificate recognition cache statistics
+    - Hit/miss counters since process start
+    - Current entry count and hit rate
+    """
+    from services.recognition_cache import recognition_cache
+    
+    return success_response(data=recognition_cache.get_stats())
+
+
+@router.get("/auth/hash-pool-stats")
+async def get_hash_pool_stats(
+    admin: AuthPrincipal = Depends(require_admin)
+):
+    """
+    Get password hashing pool metrics
+    - Pending operations and queue depth against the configured limits
+    - Rejected (429) count and hash latency percentiles since process start
+    """
+    from services.password_hasher import password_hasher
+    
+    return success_response(data=password_hasher.get_stats())
+
+
+@router.get("/db/pool-stats")
+async def get_db_pool_stats(
+    admin: AuthPrincipal = Depends(require_admin)
+):
+    """
+    Get database connection pool metrics for this worker
+    - Checked-out / idle / overflow connections against the configured limits
+    - Checkout wait percentiles, checkout timeouts and slow-query count since process start
+    - max_connections_per_worker is the ceiling to size workers against MySQL max_connections
+    """
+    from db_metrics import get_pool_stats
+    
+    engines = get_pool_stats()
+    return success_response(data={
+        "engines": engines,
+        "max_connections_per_worker": len(engines) * (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+    })
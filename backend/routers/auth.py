@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.responses import JSONResponse
+import math
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from schemas import LoginRequest, LoginResponse, UserInfo, RefreshTokenRequest, TokenResponse
 from utils import success_response, error_response
 from models import SysUser, UserRole
-from auth import verify_password, create_access_token, create_refresh_token, decode_refresh_token, get_password_hash
+from auth import create_access_token, create_refresh_token, decode_refresh_token
+from services.principal_cache import build_principal, principal_cache
+from services.password_hasher import password_hasher, HashingPoolSaturated
+from services.rate_limiter import auth_throttle
 
 router = APIRouter(prefix="/api/v1/auth", tags=["Authentication"])
 
 
 @router.post("/login")
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
+async def login(request: LoginRequest, http_request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     User login endpoint
     - Validates username and password with strict data validation
@@ -18,23 +25,52 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
     - Access token: short-lived, for API requests
     - Refresh token: long-lived, for renewing access tokens
     - Auto-upgrades legacy Bcrypt passwords to Argon2 on successful login
+    - Password hashing runs on a bounded pool; returns 429 when it is saturated
+    - Throttled per IP and username; repeated failures are rejected before hashing
     """
+    client_ip = _client_ip(http_request)
+    
+    retry_after = await auth_throttle.check_login(request.username, client_ip)
+    if retry_after:
+        return _too_many_requests("Too many login attempts, please try again later", retry_after)
+    
     # Find user
-    user = db.query(SysUser).filter(SysUser.username == request.username).first()
+    user = await db.scalar(
+        select(SysUser).options(selectinload(SysUser.student)).where(SysUser.username == request.username)
+    )
     
-    if not user or not verify_password(request.password, user.password_hash):
+    if not user:
+        await auth_throttle.record_login_failure(request.username, client_ip)
         return error_response(msg="Invalid username or password", code=401)
     
-    # Auto-upgrade legacy Bcrypt password to Argon2
-    # This happens transparently when user logs in with old password
-    if user.password_hash.startswith('$2b$') or user.password_hash.startswith('$2a$'):
-        # User is using legacy Bcrypt password, upgrade to Argon2
-        user.password_hash = get_password_hash(request.password)
-        db.commit()
+    try:
+        password_valid = await password_hasher.verify(request.password, user.password_hash)
+        
+        if not password_valid:
+            await auth_throttle.record_login_failure(request.username, client_ip)
+            return error_response(msg="Invalid username or password", code=401)
+        
+        # Auto-upgrade legacy Bcrypt password to Argon2
+        # This happens transparently when user logs in with old password
+        new_password_hash = None
+        if user.password_hash.startswith('$2b$') or user.password_hash.startswith('$2a$'):
+            # User is using legacy Bcrypt password, upgrade to Argon2
+            new_password_hash = await password_hasher.hash(request.password)
+    except HashingPoolSaturated:
+        return _too_many_requests("Too many login requests, please try again shortly", 1)
+    
+    await auth_throttle.record_login_success(request.username, client_ip)
+    
+    if new_password_hash:
+        user.password_hash = new_password_hash
+        await db.commit()
+        principal_cache.invalidate(user.id)
         print(f"✅ Auto-upgraded password for user: {user.username} (Bcrypt → Argon2)")
     
-    # Create token payload
-    token_data = {"sub": str(user.id), "role": user.role.value}
+    # Create token payload (claims let later requests skip the user lookup)
+    principal = build_principal(user)
+    principal_cache.set(principal)
+    token_data = principal.to_claims()
     
     # Create both access and refresh tokens
     access_token = create_access_token(data=token_data)
@@ -63,13 +99,17 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/refresh", response_model=TokenResponse)
-async def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_db)):
+async def refresh_token(request: RefreshTokenRequest, http_request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Refresh access token endpoint
     - Validates refresh token
     - Issues new access token
     - Does NOT issue new refresh token (use existing one)
     """
+    retry_after = await auth_throttle.check_refresh(_client_ip(http_request))
+    if retry_after:
+        return _too_many_requests("Too many refresh requests, please try again later", retry_after)
+    
     # Decode and validate refresh token
     payload = decode_refresh_token(request.refresh_token)
     if not payload:
@@ -77,19 +117,20 @@ async def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_
     
     # Extract user info from token
     user_id = payload.get("sub")
-    user_role = payload.get("role")
     
     if not user_id:
         return error_response(msg="Invalid token payload", code=401)
     
-    # Verify user still exists and is active
-    user = db.query(SysUser).filter(SysUser.id == int(user_id)).first()
-    if not user:
+    # Verify user still exists and the password/role have not changed since login
+    principal = await principal_cache.load_async(db, int(user_id))
+    if not principal:
         return error_response(msg="User not found", code=401)
     
-    # Create new access token with same data
-    token_data = {"sub": user_id, "role": user_role}
-    new_access_token = create_access_token(data=token_data)
+    if not principal.matches_claims(payload):
+        return error_response(msg="Refresh token is no longer valid, please log in again", code=401)
+    
+    # Create new access token with current claims
+    new_access_token = create_access_token(data=principal.to_claims())
     
     response_data = TokenResponse(
         access_token=new_access_token,
@@ -98,3 +139,15 @@ async def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_
     
     return success_response(data=response_data.model_dump())
 
+
+def _client_ip(http_request: Request) -> str:
+    return http_request.client.host if http_request.client else "unknown"
+
+
+def _too_many_requests(msg: str, retry_after: float) -> JSONResponse:
+    """HTTP 429 with a Retry-After header"""
+    return JSONResponse(
+        status_code=429,
+        content=error_response(msg=msg, code=429),
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
@@ -3,15 +3,21 @@ Certificate Recognition Router
 Provides API endpoints for certificate recognition using AI
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Dict
+import asyncio
+import json
 import os
+import time
 import uuid
+import aiofiles
 from datetime import datetime
 
 from config import settings
 from services.certificate_recognition import certificate_recognition_service
-from dependencies import get_current_user
+from dependencies import get_current_principal
+from services.principal_cache import AuthPrincipal
 from models import SysUser
 
 router = APIRouter(
@@ -23,7 +29,7 @@ router = APIRouter(
 @router.post("/recognize", response_model=Dict)
 async def recognize_certificate(
     file: UploadFile = File(...),
-    current_user: SysUser = Depends(get_current_user)
+    current_user: AuthPrincipal = Depends(get_current_principal)
 ):
     """
     Recognize a certificate image and extract structured information
@@ -98,10 +104,66 @@ async def recognize_certificate(
                 pass
 
 
+def _cleanup_temp_files(temp_files: List[Dict]):
+    """Remove temporary certificate files"""
+    for temp_file in temp_files:
+        if os.path.exists(temp_file["filepath"]):
+            try:
+                os.remove(temp_file["filepath"])
+            except:
+                pass
+
+
+async def _recognize_temp_file(temp_file: Dict, request_semaphore: asyncio.Semaphore) -> Dict:
+    """
+    Recognize one saved certificate and record how long it took
+    
+    The per-request semaphore keeps one large batch from taking every global
+    slot; the service itself enforces the global limit.
+    """
+    start = time.perf_counter()
+    
+    async with request_semaphore:
+        try:
+            # Model call timeout (OCR_REQUEST_TIMEOUT) is enforced by the service
+            result = await certificate_recognition_service.recognize_certificate(
+                temp_file["filepath"]
+            )
+            validated_result = certificate_recognition_service.validate_recognition_result(result)
+            
+            entry = {
+                "filename": temp_file["original_filename"],
+                **validated_result
+            }
+        except Exception as e:
+            entry = {
+                "filename": temp_file["original_filename"],
+                "success": False,
+                "error": str(e)
+            }
+    
+    entry["index"] = temp_file["index"]
+    entry["elapsed_ms"] = int((time.perf_counter() - start) * 1000)
+    return entry
+
+
+def _batch_summary(results: List[Dict], started_at: float) -> Dict:
+    """Build batch statistics"""
+    successful = sum(1 for r in results if r.get("success"))
+    
+    return {
+        "total": len(results),
+        "successful": successful,
+        "failed": len(results) - successful,
+        "elapsed_ms": int((time.perf_counter() - started_at) * 1000)
+    }
+
+
 @router.post("/batch-recognize", response_model=Dict)
 async def batch_recognize_certificates(
     files: List[UploadFile] = File(...),
-    current_user: SysUser = Depends(get_current_user)
+    stream: bool = Query(False, description="Stream results as NDJSON as each file finishes"),
+    current_user: AuthPrincipal = Depends(get_current_principal)
 ):
     """
     Batch recognize multiple certificate images
@@ -111,15 +173,24 @@ async def batch_recognize_certificates(
     **Request Body**:
     - files: List of certificate image files
     
+    **Query Parameters**:
+    - stream: If true, returns application/x-ndjson with one
+      {"type": "result", ...} line per file as it finishes, then a
+      {"type": "summary", ...} line
+    
     **Response**:
     - success: Whether batch recognition was successful
-    - results: List of recognition results for each file
+    - results: List of recognition results for each file (in upload order),
+      each with index and elapsed_ms
     - total: Total number of files processed
     - successful: Number of successfully recognized certificates
     - failed: Number of failed recognitions
+    - elapsed_ms: Wall time for the whole batch
     """
+    started_at = time.perf_counter()
+    
     # Validate number of files
-    max_batch_size = 10
+    max_batch_size = settings.OCR_BATCH_MAX_FILES
     if len(files) > max_batch_size:
         raise HTTPException(
             status_code=400,
@@ -130,30 +201,34 @@ async def batch_recognize_certificates(
     os.makedirs(temp_dir, exist_ok=True)
     
     temp_files = []
-    results = []
+    rejected = []
     
     try:
         # Save all files temporarily
-        for file in files:
+        for index, file in enumerate(files):
             # Validate file type
             allowed_extensions = [".jpg", ".jpeg", ".png", ".bmp", ".gif"]
             file_extension = os.path.splitext(file.filename)[1].lower()
             
             if file_extension not in allowed_extensions:
-                results.append({
+                rejected.append({
+                    "index": index,
                     "filename": file.filename,
                     "success": False,
-                    "error": f"Invalid file type: {file_extension}"
+                    "error": f"Invalid file type: {file_extension}",
+                    "elapsed_ms": 0
                 })
                 continue
             
             # Check file size
             file_content = await file.read()
             if len(file_content) > settings.MAX_FILE_SIZE:
-                results.append({
+                rejected.append({
+                    "index": index,
                     "filename": file.filename,
                     "success": False,
-                    "error": "File size exceeds maximum"
+                    "error": "File size exceeds maximum",
+                    "elapsed_ms": 0
                 })
                 continue
             
@@ -161,43 +236,56 @@ async def batch_recognize_certificates(
             temp_filename = f"{uuid.uuid4()}{file_extension}"
             temp_filepath = os.path.join(temp_dir, temp_filename)
             
-            with open(temp_filepath, "wb") as f:
-                f.write(file_content)
+            async with aiofiles.open(temp_filepath, "wb") as f:
+                await f.write(file_content)
             
             temp_files.append({
+                "index": index,
                 "filepath": temp_filepath,
                 "original_filename": file.filename
             })
-        
-        # Recognize all certificates
-        for temp_file in temp_files:
+    except Exception as e:
+        _cleanup_temp_files(temp_files)
+        raise HTTPException(status_code=500, detail=f"Error in batch processing: {str(e)}")
+    
+    request_semaphore = asyncio.Semaphore(max(1, settings.OCR_BATCH_CONCURRENCY))
+    
+    if stream:
+        async def ndjson_stream():
+            results = list(rejected)
+            tasks = [
+                asyncio.create_task(_recognize_temp_file(temp_file, request_semaphore))
+                for temp_file in temp_files
+            ]
             try:
-                result = await certificate_recognition_service.recognize_certificate(
-                    temp_file["filepath"]
-                )
-                validated_result = certificate_recognition_service.validate_recognition_result(result)
+                for entry in rejected:
+                    yield json.dumps({"type": "result", **entry}, ensure_ascii=False) + "\n"
                 
-                results.append({
-                    "filename": temp_file["original_filename"],
-                    **validated_result
-                })
-            except Exception as e:
-                results.append({
-                    "filename": temp_file["original_filename"],
-                    "success": False,
-                    "error": str(e)
-                })
+                for finished in asyncio.as_completed(tasks):
+                    entry = await finished
+                    results.append(entry)
+                    yield json.dumps({"type": "result", **entry}, ensure_ascii=False) + "\n"
+                
+                yield json.dumps({"type": "summary", **_batch_summary(results, started_at)}) + "\n"
+            finally:
+                # Client disconnected or stream finished
+                for task in tasks:
+                    task.cancel()
+                _cleanup_temp_files(temp_files)
         
-        # Calculate statistics
-        successful = sum(1 for r in results if r.get("success"))
-        failed = len(results) - successful
+        return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+    
+    try:
+        # Recognize all certificates concurrently
+        recognized = await asyncio.gather(
+            *(_recognize_temp_file(temp_file, request_semaphore) for temp_file in temp_files)
+        )
+        results = sorted(rejected + list(recognized), key=lambda r: r["index"])
         
         return {
             "success": True,
             "results": results,
-            "total": len(results),
-            "successful": successful,
-            "failed": failed
+            **_batch_summary(results, started_at)
         }
         
     except Exception as e:
@@ -205,12 +293,7 @@ async def batch_recognize_certificates(
     
     finally:
         # Clean up all temporary files
-        for temp_file in temp_files:
-            if os.path.exists(temp_file["filepath"]):
-                try:
-                    os.remove(temp_file["filepath"])
-                except:
-                    pass
+        _cleanup_temp_files(temp_files)
 
 
 @router.get("/health")
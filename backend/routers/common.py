@@ -8,7 +8,7 @@ from database import get_db
 from schemas import TeacherResponse, UploadResponse, ResponseModel
 from utils import success_response, error_response
 from models import SysTeacher
-from dependencies import get_current_user
+from dependencies import get_current_principal
 from config import settings
 
 router = APIRouter(prefix="/api/v1/common", tags=["Common"])
@@ -39,7 +39,7 @@ async def get_teachers(
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_principal)
 ):
     """
     File upload endpoint
@@ -8,7 +8,8 @@ from datetime import datetime
 
 from database import get_db
 from utils import success_response, error_response
-from dependencies import require_student
+from dependencies import require_student_principal
+from services.principal_cache import AuthPrincipal
 from models import SysStudent, SysUser
 
 router = APIRouter(prefix="/api/v1/courses", tags=["Courses"])
@@ -21,7 +22,7 @@ async def get_courses(
     semester: Optional[str] = None,
     category: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: SysUser = Depends(require_student)
+    current_user: AuthPrincipal = Depends(require_student_principal)
 ):
     """
     获取课程列表（学生端）
@@ -137,7 +138,7 @@ async def get_courses(
 async def get_course_detail(
     course_id: int,
     db: Session = Depends(get_db),
-    current_user: SysUser = Depends(require_student)
+    current_user: AuthPrincipal = Depends(require_student_principal)
 ):
     """
     获取课程详情
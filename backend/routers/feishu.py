@@ -10,6 +10,7 @@ import logging
 
 from database import get_db
 from dependencies import require_admin, require_student
+from services.principal_cache import AuthPrincipal
 from models import SysUser, SysStudent, BizAchievement, AchievementStatus, FeishuConfig, FeishuFieldMapping, FeishuImportLog
 from schemas_feishu import (
     FeishuConfigCreate, FeishuConfigResponse,
@@ -20,7 +21,12 @@ from schemas_feishu import (
 )
 from utils import success_response, error_response
 from config import settings
-from services.feishu import FeishuClient, DataMapper, AttachmentDownloader
+from services.feishu import FeishuClient, get_feishu_client, DataMapper, AttachmentDownloader, feishu_import_runner
+from services.feishu.feishu_client import build_equals_filter
+from services.feishu.data_mapper import get_or_create_default_mappings
+from services.feishu.import_jobs import (
+    import_job_view, JOB_QUEUED, UNFINISHED_STATUSES, MODE_FULL, MODE_INCREMENTAL
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/feishu", tags=["Feishu Integration"])
@@ -31,7 +37,7 @@ router = APIRouter(prefix="/api/v1/feishu", tags=["Feishu Integration"])
 @router.post("/config")
 async def save_feishu_config(
     config: FeishuConfigCreate,
-    admin: SysUser = Depends(require_admin),
+    admin: AuthPrincipal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """
@@ -69,7 +75,7 @@ async def save_feishu_config(
 
 @router.get("/config")
 async def get_feishu_config(
-    admin: SysUser = Depends(require_admin),
+    admin: AuthPrincipal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """
@@ -94,7 +100,7 @@ async def get_feishu_config(
 
 @router.post("/test-connection")
 async def test_feishu_connection(
-    admin: SysUser = Depends(require_admin),
+    admin: AuthPrincipal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """
@@ -106,7 +112,7 @@ async def test_feishu_connection(
         return error_response(msg="请先配置飞书应用", code=400)
     
     try:
-        client = FeishuClient(config.app_id, config.app_secret)
+        client = get_feishu_client(config.app_id, config.app_secret)
         is_connected = await client.test_connection()
         
         if is_connected:
@@ -124,7 +130,7 @@ async def test_feishu_connection(
 @router.get("/tables/{app_token}")
 async def list_feishu_tables(
     app_token: str,
-    admin: SysUser = Depends(require_admin),
+    admin: AuthPrincipal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """
@@ -136,7 +142,7 @@ async def list_feishu_tables(
         return error_response(msg="请先配置飞书应用", code=400)
     
     try:
-        client = FeishuClient(config.app_id, config.app_secret)
+        client = get_feishu_client(config.app_id, config.app_secret)
         tables = await client.list_tables(app_token)
         
         return success_response(data={"tables": tables})
@@ -151,7 +157,7 @@ async def list_feishu_tables(
 @router.post("/preview")
 async def preview_import_data(
     request: FeishuImportRequest,
-    admin: SysUser = Depends(require_admin),
+    admin: AuthPrincipal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """
@@ -164,26 +170,25 @@ async def preview_import_data(
     
     try:
         # 初始化飞书客户端
-        client = FeishuClient(config.app_id, config.app_secret)
-        
-        # 获取表格记录
-        records = await client.get_table_records(
-            request.app_token,
-            request.table_id
-        )
-        
-        # 限制预览数量
-        if request.preview_limit:
-            records = records[:request.preview_limit]
+        client = get_feishu_client(config.app_id, config.app_secret)
         
         # 获取或创建默认映射
-        mappings = _get_or_create_default_mappings(db, config.id)
+        mappings = get_or_create_default_mappings(db, config.id)
         
         # 数据映射和验证
         mapper = DataMapper(mappings, db)
         preview_results = []
         
-        for idx, record in enumerate(records, 1):
+        # 逐页拉取记录，达到预览数量后立即停止
+        records = client.iter_records(
+            request.app_token,
+            request.table_id,
+            limit=request.preview_limit or None
+        )
+        
+        idx = 0
+        async for record in records:
+            idx += 1
             fields = record.get("fields", {})
             transformed, errors = mapper.transform_record(fields)
             
@@ -214,133 +219,47 @@ async def preview_import_data(
 @router.post("/import")
 async def execute_import(
     request: FeishuImportRequest,
-    admin: SysUser = Depends(require_admin),
+    admin: AuthPrincipal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """
     执行导入（管理员）
+    
+    导入在后台逐页执行，立即返回任务ID，通过 /import-jobs/{job_id} 查询进度。
+    已导入过的飞书记录会更新原成果，不会重复创建。
     """
-    config = db.query(FeishuConfig).filter(FeishuConfig.status == "active").first()
+    return _submit_import_job(request, admin, db, MODE_FULL)
+
+
+@router.post("/sync")
+async def execute_sync(
+    request: FeishuImportRequest,
+    admin: AuthPrincipal = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    增量同步（管理员）
     
-    if not config:
-        return error_response(msg="请先配置飞书应用", code=400)
+    只处理上次成功同步后修改过的记录，可定时调用
+    """
+    return _submit_import_job(request, admin, db, MODE_INCREMENTAL)
+
+
+@router.get("/import-jobs/{job_id}")
+async def get_import_job(
+    job_id: int,
+    admin: AuthPrincipal = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    查询导入任务进度（管理员）
+    """
+    import_log = db.query(FeishuImportLog).filter(FeishuImportLog.id == job_id).first()
     
-    start_time = datetime.now()
-    import_results = []
+    if not import_log:
+        return error_response(msg="导入任务不存在", code=404)
     
-    try:
-        # 初始化服务
-        client = FeishuClient(config.app_id, config.app_secret)
-        downloader = AttachmentDownloader(client)
-        
-        # 获取记录
-        records = await client.get_table_records(request.app_token, request.table_id)
-        
-        # 获取映射配置
-        mappings = _get_or_create_default_mappings(db, config.id)
-        mapper = DataMapper(mappings, db)
-        
-        success_count = 0
-        failed_count = 0
-        
-        for idx, record in enumerate(records, 1):
-            try:
-                fields = record.get("fields", {})
-                transformed, errors = mapper.transform_record(fields)
-                
-                # 跳过无效记录
-                if errors and request.skip_invalid:
-                    import_results.append({
-                        "row": idx,
-                        "status": "failed",
-                        "error": "; ".join(errors)
-                    })
-                    failed_count += 1
-                    continue
-                
-                # 处理附件
-                evidence_url = None
-                feishu_token = None
-                
-                attachments = fields.get("证书附件", [])
-                if attachments and len(attachments) > 0:
-                    file_token = attachments[0].get("file_token")
-                    if file_token:
-                        local_url, success, retry_token = await downloader.download_and_save(
-                            file_token,
-                            transformed["student_id"]
-                        )
-                        if success:
-                            evidence_url = local_url
-                        else:
-                            feishu_token = retry_token
-                
-                # 创建成果记录
-                new_achievement = BizAchievement(
-                    student_id=transformed["student_id"],
-                    teacher_id=transformed["teacher_id"],
-                    title=transformed["title"],
-                    type=transformed.get("type", ""),
-                    content_json={
-                        "date": transformed.get("date"),
-                        "award_level": transformed.get("level"),
-                        "award": transformed.get("award"),
-                        "issuer": transformed.get("issuer"),
-                        "certificate_number": transformed.get("certificate_number")
-                    },
-                    evidence_url=evidence_url,
-                    feishu_attachment_token=feishu_token,
-                    status=AchievementStatus.PENDING
-                )
-                
-                db.add(new_achievement)
-                db.flush()  # 获取ID
-                
-                import_results.append({
-                    "row": idx,
-                    "status": "success",
-                    "achievement_id": new_achievement.id
-                })
-                success_count += 1
-                
-            except Exception as e:
-                logger.error(f"导入第{idx}行失败: {str(e)}")
-                import_results.append({
-                    "row": idx,
-                    "status": "failed",
-                    "error": str(e)
-                })
-                failed_count += 1
-        
-        # 记录导入日志
-        duration = (datetime.now() - start_time).seconds
-        import_log = FeishuImportLog(
-            operator_id=admin.id,
-            operator_role="admin",
-            app_token=request.app_token,
-            table_id=request.table_id,
-            total_records=len(records),
-            success_count=success_count,
-            failed_count=failed_count,
-            error_details=[r for r in import_results if r["status"] == "failed"],
-            import_duration_seconds=duration
-        )
-        db.add(import_log)
-        
-        db.commit()
-        
-        return success_response(data={
-            "total": len(records),
-            "imported": success_count,
-            "failed": failed_count,
-            "details": import_results,
-            "import_log_id": import_log.id
-        })
-        
-    except Exception as e:
-        logger.error(f"执行导入失败: {str(e)}")
-        db.rollback()
-        return error_response(msg=f"导入失败: {str(e)}", code=500)
+    return success_response(data=import_job_view(import_log))
 
 
 # ==================== 导入历史 ====================
@@ -349,7 +268,7 @@ async def execute_import(
 async def get_import_history(
     page: int = 1,
     page_size: int = 20,
-    admin: SysUser = Depends(require_admin),
+    admin: AuthPrincipal = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """
@@ -370,9 +289,13 @@ async def get_import_history(
                     "id": log.id,
                     "operator_id": log.operator_id,
                     "operator_role": log.operator_role,
+                    "mode": log.mode,
+                    "status": log.status,
                     "total_records": log.total_records,
+                    "processed_records": log.processed_records,
                     "success_count": log.success_count,
                     "failed_count": log.failed_count,
+                    "skipped_count": log.skipped_count,
                     "import_duration_seconds": log.import_duration_seconds,
                     "created_at": log.created_at.isoformat()
                 }
@@ -405,20 +328,16 @@ async def student_quick_preview(
         return error_response(msg="飞书功能未配置", code=400)
     
     try:
-        client = FeishuClient(config.app_id, config.app_secret)
-        all_records = await client.get_table_records(request.app_token, request.table_id)
+        client = get_feishu_client(config.app_id, config.app_secret)
         
-        # 筛选当前学生的记录
-        student_records = []
-        for record in all_records:
-            fields = record.get("fields", {})
-            record_student_name = fields.get("学生姓名", "").replace(" ", "")
-            
-            if record_student_name == student.name.replace(" ", ""):
-                student_records.append(record)
+        # 筛选当前学生的记录：由飞书服务端按姓名过滤，没有记录时不再扫描整表
+        student_records = await _collect_student_records(
+            client, request.app_token, request.table_id, student.name,
+            filter_formula=build_equals_filter("学生姓名", student.name.strip())
+        )
         
         # 转换数据
-        mappings = _get_or_create_default_mappings(db, config.id)
+        mappings = get_or_create_default_mappings(db, config.id)
         mapper = DataMapper(mappings, db)
         
         preview_records = []
@@ -454,29 +373,75 @@ async def student_quick_preview(
 
 # ==================== 辅助函数 ====================
 
-def _get_or_create_default_mappings(db: Session, config_id: int) -> List[FeishuFieldMapping]:
-    """获取或创建默认字段映射"""
-    from services.feishu.data_mapper import create_default_mappings
+async def _collect_student_records(
+    client: FeishuClient,
+    app_token: str,
+    table_id: str,
+    student_name: str,
+    filter_formula: str
+) -> List[dict]:
+    """
+    读取服务端筛选后的记录，只保留学生姓名匹配的行（忽略空格）
     
-    # 检查是否已存在
-    existing = db.query(FeishuFieldMapping).filter(
-        FeishuFieldMapping.config_id == config_id
-    ).all()
+    姓名前后的空格在映射时统一去除（见 DataMapper._resolve_student_id），
+    这里不为表格中姓名带空格的记录回退到整表扫描
+    """
+    target_name = student_name.replace(" ", "")
+    matched = []
     
-    if existing:
-        return existing
+    async for record in client.iter_records(app_token, table_id, filter_formula=filter_formula):
+        fields = record.get("fields", {})
+        record_student_name = fields.get("学生姓名", "").replace(" ", "")
+        
+        if record_student_name == target_name:
+            matched.append(record)
     
-    # 创建默认映射
-    default_configs = create_default_mappings()
-    mappings = []
+    return matched
+
+
+def _submit_import_job(request: FeishuImportRequest, admin: AuthPrincipal, db: Session, mode: str):
+    """创建导入任务并提交后台执行；同一数据表已有未完成任务时直接返回该任务"""
+    config = db.query(FeishuConfig).filter(FeishuConfig.status == "active").first()
     
-    for cfg in default_configs:
-        mapping = FeishuFieldMapping(
-            config_id=config_id,
-            **cfg
-        )
-        db.add(mapping)
-        mappings.append(mapping)
+    if not config:
+        return error_response(msg="请先配置飞书应用", code=400)
     
-    db.commit()
-    return mappings
+    try:
+        running_log = db.query(FeishuImportLog).filter(
+            FeishuImportLog.app_token == request.app_token,
+            FeishuImportLog.table_id == request.table_id,
+            FeishuImportLog.status.in_(UNFINISHED_STATUSES)
+        ).first()
+        
+        if running_log:
+            return success_response(
+                data=import_job_view(running_log),
+                msg="该数据表已有导入任务在执行"
+            )
+        
+        import_log = FeishuImportLog(
+            operator_id=admin.id,
+            operator_role="admin",
+            app_token=request.app_token,
+            table_id=request.table_id,
+            mode=mode,
+            status=JOB_QUEUED,
+            skip_invalid=request.skip_invalid,
+            processed_records=0,
+            skipped_count=0,
+            error_details=[]
+        )
+        db.add(import_log)
+        db.commit()
+        
+        feishu_import_runner.submit(import_log.id)
+        
+        return success_response(
+            data=import_job_view(import_log),
+            msg="导入任务已提交"
+        )
+        
+    except Exception as e:
+        logger.error(f"提交导入任务失败: {str(e)}")
+        db.rollback()
+        return error_response(msg=f"导入失败: {str(e)}", code=500)
@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
+import asyncio
+import json
+import time
 import uuid
 import httpx
 from datetime import datetime, timedelta
-from database import get_db
+from database import get_async_db
 from schemas import (
     OCRResponse, AchievementCreate, AchievementResponse,
     ChatRequest, ChatResponse, PersonaResponse
@@ -12,9 +17,16 @@ from schemas import (
 from utils import success_response, error_response
 from models import (
     SysStudent, BizAchievement, AchievementStatus,
-    AiChatSession, AiChatMessage, MessageRole, SysTeacher
+    AiChatSession, AiChatMessage, MessageRole, SysTeacher, SysUser
 )
-from dependencies import require_student
+from dependencies import require_student_async, require_student_principal
+from services.principal_cache import AuthPrincipal
+from services.achievement_queries import (
+    student_achievements_query, achievement_detail_query
+)
+from services.achievement_stats import get_status_counts
+from services.chat_context import chat_context_cache, context_version_bump
+from services.chat_prompt import chat_prompt_builder, log_turn
 from config import settings
 
 router = APIRouter(prefix="/api/v1/student", tags=["Student"])
@@ -23,81 +35,40 @@ router = APIRouter(prefix="/api/v1/student", tags=["Student"])
 @router.post("/ocr/recognize")
 async def ocr_recognize(
     file: UploadFile = File(...),
-    student: SysStudent = Depends(require_student)
+    principal: AuthPrincipal = Depends(require_student_principal)
 ):
     """
     Certificate recognition with permanent storage (Step 1 of 2)
     - Accepts certificate image
     - Saves file permanently to student's directory
-    - Calls AI vision model (qwen-vl-max) for extraction
-    - Returns structured data + file URL
+    - Queues the AI vision model (qwen-vl-max) extraction as a background job
+    - Returns job id + file URL immediately
+    - Result is fetched via /ocr/jobs/{job_id} (or its SSE stream)
     - User can then confirm and submit achievement in Step 2
     """
     from services.file_manager import file_manager
-    from services.certificate_recognition_openai import certificate_recognition_service_openai
+    from services.ocr_jobs import ocr_job_queue
     
     try:
         # Step 1: Save certificate permanently
-        file_info = await file_manager.save_certificate_permanent(file, student.id)
+        file_info = await file_manager.save_certificate_permanent(file, principal.student_id)
         
-        # Step 2: Recognize certificate using AI (OpenAI-compatible API)
-        recognition_result = certificate_recognition_service_openai.recognize_certificate(
-            file_info["file_path"]
-        )
+        # Step 2: Queue recognition job
+        job = await ocr_job_queue.submit(principal.student_id, file_info)
         
-        # Step 3: Validate result
-        validated_result = certificate_recognition_service_openai.validate_recognition_result(
-            recognition_result
-        )
-        
-        # Step 4: Return result
-        if validated_result.get("success"):
-            data = validated_result.get("data", {})
-            
-            return success_response(data={
-                "recognized_data": {
-                    # Basic fields
-                    "title": data.get("certificate_name"),
-                    "date": data.get("issue_date"),
-                    "issuer": data.get("issuing_organization"),
-                    "suggested_type": data.get("category"),
-                    "award_level": data.get("award_level"),  # 奖项级别（国家级、省部级等）
-                    "award": data.get("award"),  # 具体奖项（一等奖、二等奖等）
-                    "certificate_number": data.get("certificate_number"),
-                    "recipient_name": data.get("recipient_name"),
-                    
-                    # New enhanced fields
-                    "project_name": data.get("project_name"),
-                    "team_members": data.get("team_members", []),
-                    "advisors": data.get("advisors", []),
-                    "additional_info": data.get("additional_info"),
-                    
-                    # Confidence scores
-                    "recognition_confidence": data.get("recognition_confidence", {})
-                },
+        return success_response(
+            data={
+                "job_id": job["job_id"],
+                "status": job["status"],
                 "file_url": file_info["file_url"],
                 "file_info": {
                     "filename": file_info["filename"],
                     "original_filename": file_info["original_filename"],
                     "size_bytes": file_info["size_bytes"]
-                },
-                "ai_metadata": {
-                    "model_used": data.get("model_used"),
-                    "recognition_time": data.get("recognition_time"),
-                    "confidence": data.get("confidence")
-                },
-                "usage": validated_result.get("usage", {})
-            })
-        else:
-            # Recognition failed, but file is still saved
-            return error_response(
-                msg=f"Certificate saved but recognition failed: {validated_result.get('error')}",
-                code=500,
-                data={
-                    "file_url": file_info["file_url"],
-                    "recognized_data": None
                 }
-            )
+            },
+            msg="Certificate saved, recognition queued"
+        )
             
     except HTTPException as e:
         raise e
@@ -105,11 +76,79 @@ async def ocr_recognize(
         return error_response(msg=f"Error processing certificate: {str(e)}", code=500)
 
 
+@router.get("/ocr/jobs/{job_id}")
+async def get_ocr_job(
+    job_id: str,
+    principal: AuthPrincipal = Depends(require_student_principal)
+):
+    """
+    Get certificate recognition job status
+    - status: queued / processing / succeeded / failed
+    - result: same structure as the former synchronous ocr/recognize response
+    """
+    from services.ocr_jobs import ocr_job_queue, public_job_view
+    
+    job = await ocr_job_queue.get_job(job_id, principal.student_id)
+    if not job:
+        return error_response(msg="OCR job not found", code=404)
+    
+    return success_response(data=public_job_view(job))
+
+
+@router.get("/ocr/jobs/{job_id}/events")
+async def stream_ocr_job(
+    job_id: str,
+    principal: AuthPrincipal = Depends(require_student_principal)
+):
+    """
+    Stream certificate recognition job status as server-sent events
+    - Emits a "status" event on every state change
+    - Closes after the job succeeds or fails
+    """
+    from services.ocr_jobs import ocr_job_queue, public_job_view, FINISHED_STATUSES
+    
+    if not await ocr_job_queue.get_job(job_id, principal.student_id):
+        return error_response(msg="OCR job not found", code=404)
+    
+    async def event_stream():
+        last_status = None
+        last_sent = time.monotonic()
+        while True:
+            # Read the sequence first so a change made while we yield is not missed
+            sequence = ocr_job_queue.change_sequence()
+            job = await ocr_job_queue.get_job(job_id, principal.student_id)
+            if not job:
+                break
+            
+            if job["status"] != last_status:
+                last_status = job["status"]
+                payload = json.dumps(public_job_view(job), ensure_ascii=False)
+                yield f"event: status\ndata: {payload}\n\n"
+                last_sent = time.monotonic()
+            
+            if job["status"] in FINISHED_STATUSES:
+                break
+            
+            # Woken by local changes; polls for changes made by other worker processes
+            await ocr_job_queue.wait_for_change(sequence, timeout=ocr_job_queue.poll_interval)
+            
+            # Heartbeat keeps proxies from closing idle connections
+            if time.monotonic() - last_sent >= 15:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/achievements")
 async def create_achievement(
     achievement: AchievementCreate,
-    student: SysStudent = Depends(require_student),
-    db: Session = Depends(get_db)
+    principal: AuthPrincipal = Depends(require_student_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Submit achievement (Step 2 of 2)
@@ -121,7 +160,7 @@ async def create_achievement(
     from services.file_manager import file_manager
     
     # Validate teacher exists
-    teacher = db.query(SysTeacher).filter(SysTeacher.id == achievement.teacher_id).first()
+    teacher = await db.get(SysTeacher, achievement.teacher_id)
     if not teacher:
         return error_response(msg="Teacher not found", code=404)
     
@@ -129,7 +168,7 @@ async def create_achievement(
     if achievement.evidence_url:
         if not file_manager.verify_certificate_access(
             achievement.evidence_url, 
-            student.id, 
+            principal.student_id, 
             is_admin=False
         ):
             return error_response(
@@ -139,7 +178,7 @@ async def create_achievement(
     
     # Create achievement
     new_achievement = BizAchievement(
-        student_id=student.id,
+        student_id=principal.student_id,
         teacher_id=achievement.teacher_id,
         title=achievement.title,
         type=achievement.type,
@@ -149,8 +188,8 @@ async def create_achievement(
     )
     
     db.add(new_achievement)
-    db.commit()
-    db.refresh(new_achievement)
+    await db.execute(context_version_bump([principal.student_id]))
+    await db.commit()
     
     return success_response(data={"id": new_achievement.id}, msg="Achievement submitted successfully")
 
@@ -158,8 +197,8 @@ async def create_achievement(
 @router.get("/achievements")
 async def get_my_achievements(
     status: Optional[str] = Query(None),
-    student: SysStudent = Depends(require_student),
-    db: Session = Depends(get_db)
+    principal: AuthPrincipal = Depends(require_student_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get my achievements
@@ -167,19 +206,15 @@ async def get_my_achievements(
     - Optional filter by status
     - Excludes soft-deleted achievements by default
     """
-    query = db.query(BizAchievement).filter(
-        BizAchievement.student_id == student.id,
-        BizAchievement.is_deleted == False  # 排除已删除的成果
-    )
-    
+    status_enum = None
     if status:
         try:
             status_enum = AchievementStatus(status)
-            query = query.filter(BizAchievement.status == status_enum)
         except ValueError:
             return error_response(msg="Invalid status value", code=400)
     
-    achievements = query.order_by(BizAchievement.created_at.desc()).all()
+    result = await db.execute(student_achievements_query(principal.student_id, status_enum))
+    achievements = result.scalars().all()
     
     achievement_list = []
     for ach in achievements:
@@ -201,8 +236,8 @@ async def get_my_achievements(
 @router.get("/achievements/{achievement_id}")
 async def get_achievement_detail(
     achievement_id: int,
-    student: SysStudent = Depends(require_student),
-    db: Session = Depends(get_db)
+    principal: AuthPrincipal = Depends(require_student_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get achievement detail by ID
@@ -211,10 +246,8 @@ async def get_achievement_detail(
     - Includes teacher information
     """
     # Query achievement and verify ownership
-    achievement = db.query(BizAchievement).filter(
-        BizAchievement.id == achievement_id,
-        BizAchievement.student_id == student.id
-    ).first()
+    result = await db.execute(achievement_detail_query(achievement_id, principal.student_id))
+    achievement = result.scalars().first()
     
     if not achievement:
         return error_response(msg="Achievement not found", code=404)
@@ -254,8 +287,8 @@ async def get_achievement_detail(
 @router.delete("/achievements/{achievement_id}")
 async def delete_achievement(
     achievement_id: int,
-    student: SysStudent = Depends(require_student),
-    db: Session = Depends(get_db)
+    principal: AuthPrincipal = Depends(require_student_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Delete achievement (soft delete)
@@ -263,24 +296,28 @@ async def delete_achievement(
     - Marks achievement as deleted instead of hard deleting
     """
     # Query achievement and verify ownership
-    achievement = db.query(BizAchievement).filter(
-        BizAchievement.id == achievement_id,
-        BizAchievement.student_id == student.id
-    ).first()
+    result = await db.execute(
+        select(BizAchievement).where(
+            BizAchievement.id == achievement_id,
+            BizAchievement.student_id == principal.student_id
+        )
+    )
+    achievement = result.scalars().first()
     
     if not achievement:
         return error_response(msg="Achievement not found", code=404)
     
     # Soft delete: mark as deleted
     achievement.is_deleted = True
-    db.commit()
+    await db.execute(context_version_bump([principal.student_id]))
+    await db.commit()
     
     return success_response(msg="Achievement deleted successfully")
 
 
 @router.get("/certificates")
 async def get_my_certificates(
-    student: SysStudent = Depends(require_student)
+    principal: AuthPrincipal = Depends(require_student_principal)
 ):
     """
     Get list of my certificates
@@ -289,7 +326,7 @@ async def get_my_certificates(
     """
     from services.file_manager import file_manager
     
-    certificates = file_manager.get_student_certificates(student.id)
+    certificates = file_manager.get_student_certificates(principal.student_id)
     
     return success_response(data={
         "certificates": certificates,
@@ -299,8 +336,8 @@ async def get_my_certificates(
 
 @router.get("/persona")
 async def get_persona(
-    student: SysStudent = Depends(require_student),
-    db: Session = Depends(get_db)
+    student: SysStudent = Depends(require_student_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get student persona
@@ -330,7 +367,7 @@ async def get_persona(
         }
         
         student.persona_cache = persona_data
-        db.commit()
+        await db.commit()
     else:
         persona_data = student.persona_cache
     
@@ -340,127 +377,33 @@ async def get_persona(
 @router.post("/ai/chat")
 async def ai_chat(
     chat_req: ChatRequest,
-    student: SysStudent = Depends(require_student),
-    db: Session = Depends(get_db)
+    student: SysStudent = Depends(require_student_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     AI chat with context management
     - Backend manages conversation history
-    - Implements RAG with student achievements
+    - Implements RAG: top-k achievements retrieved for the question (BM25)
     - Stores messages in database
     - Uses real LLM API (Alibaba Cloud Qwen)
+    - /ai/chat/stream returns the same reply token by token
     """
-    from services.ai_chat_service import ai_chat_service
+    from services.ai_chat_service import ai_chat_service, FALLBACK_REPLY
     
-    # Get or create session
-    session_id = chat_req.session_id
+    prepared = await _prepare_chat(chat_req, student, db)
+    if not prepared:
+        return error_response(msg="Session not found", code=404)
+    session_id, plan = prepared
     
-    if not session_id:
-        # Create new session
-        session_id = str(uuid.uuid4())
-        new_session = AiChatSession(
-            id=session_id,
-            student_id=student.id,
-            title=chat_req.message[:50]  # Use first 50 chars as title
-        )
-        db.add(new_session)
-        db.commit()
-    else:
-        # Validate session belongs to student
-        session = db.query(AiChatSession).filter(
-            AiChatSession.id == session_id,
-            AiChatSession.student_id == student.id
-        ).first()
-        
-        if not session:
-            return error_response(msg="Session not found", code=404)
-    
-    # Store user message
-    user_message = AiChatMessage(
-        session_id=session_id,
-        role=MessageRole.USER,
-        content=chat_req.message
-    )
-    db.add(user_message)
-    db.commit()
-    
-    # Retrieve chat history (last 10 messages for context)
-    history_messages = db.query(AiChatMessage).filter(
-        AiChatMessage.session_id == session_id
-    ).order_by(AiChatMessage.created_at.desc()).limit(10).all()
-    history_messages.reverse()  # Oldest first
-    
-    # Format history for LLM (exclude current message)
-    chat_history = [
-        {
-            "role": msg.role.value,
-            "content": msg.content
-        }
-        for msg in history_messages[:-1]
-    ] if len(history_messages) > 1 else []
-    
-    # Retrieve all achievements for comprehensive AI analysis (not just approved)
-    # 查询所有状态的成果，让AI能够全面分析学生情况
-    achievements = db.query(BizAchievement).filter(
-        BizAchievement.student_id == student.id,
-        BizAchievement.is_deleted == False  # 排除已删除的
-    ).order_by(BizAchievement.created_at.desc()).all()  # 移除20条限制，获取所有成果
-    
-    # Count achievements by status for statistics
-    approved_count = sum(1 for ach in achievements if ach.status == AchievementStatus.APPROVED)
-    pending_count = sum(1 for ach in achievements if ach.status == AchievementStatus.PENDING)
-    rejected_count = sum(1 for ach in achievements if ach.status == AchievementStatus.REJECTED)
-    
-    # Build student context with complete achievement data
-    student_context = {
-        "name": student.name,
-        "major": student.major,
-        "class_name": getattr(student, 'class_name', None),
-        "achievements": [
-            {
-                # 基本信息
-                "id": ach.id,
-                "title": ach.title,
-                "type": ach.type,
-                "status": ach.status.value,
-                
-                # 详细内容（OCR识别的结构化数据）
-                "content_json": ach.content_json,
-                
-                # 证书相关
-                "evidence_url": ach.evidence_url,
-                "feishu_attachment_token": ach.feishu_attachment_token,
-                
-                # 审核信息
-                "audit_comment": ach.audit_comment,
-                
-                # 时间信息
-                "created_at": ach.created_at.isoformat() if ach.created_at else None,
-                
-                # 教师信息（如果需要）
-                "teacher_name": ach.teacher.name if ach.teacher else None,
-                "teacher_title": ach.teacher.title if ach.teacher else None,
-                "teacher_department": ach.teacher.department if ach.teacher else None,
-            }
-            for ach in achievements
-        ],
-        "statistics": {
-            "total_achievements": len(achievements),
-            "approved_achievements": approved_count,
-            "pending_achievements": pending_count,
-            "rejected_achievements": rejected_count,
-            "approval_rate": round(approved_count / len(achievements) * 100, 2) if len(achievements) > 0 else 0
-        }
-    }
-    
-    # Call AI chat service
-    ai_result = ai_chat_service.chat(
+    # Call AI chat service (async; canned reply when the concurrency limit is reached)
+    ai_result = await ai_chat_service.achat(
         user_message=chat_req.message,
-        student_context=student_context,
-        chat_history=chat_history,
+        student_context=plan.student_context,
+        chat_history=plan.chat_history,
         temperature=0.7,
         max_tokens=800
     )
+    log_turn(session_id, plan.accounting, ai_result.get("usage"))
     
     # Handle AI service response
     if not ai_result.get("success"):
@@ -469,23 +412,12 @@ async def ai_chat(
         print(f"❌ AI Chat Service Error: {error_msg}")
         print(f"Full AI Result: {ai_result}")
         # Fallback response if AI service fails
-        ai_response = "抱歉，AI助手暂时无法回复。请检查网络连接或稍后再试。"
+        ai_response = FALLBACK_REPLY
     else:
         ai_response = ai_result.get("message", "抱歉，暂时无法生成回复。")
     
     # Store AI response
-    assistant_message = AiChatMessage(
-        session_id=session_id,
-        role=MessageRole.ASSISTANT,
-        content=ai_response
-    )
-    db.add(assistant_message)
-    
-    # Update session timestamp
-    session = db.query(AiChatSession).filter(AiChatSession.id == session_id).first()
-    session.updated_at = datetime.utcnow()
-    
-    db.commit()
+    await _save_assistant_message(db, session_id, ai_response)
     
     return success_response(data={
         "session_id": session_id,
@@ -494,15 +426,83 @@ async def ai_chat(
     })
 
 
+@router.post("/ai/chat/stream")
+async def ai_chat_stream(
+    chat_req: ChatRequest,
+    student: SysStudent = Depends(require_student_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    AI chat with the reply streamed as server-sent events
+    - "session" event first: {"session_id"}
+    - "delta" event per generated chunk: {"content"}
+    - "done" event once the assembled reply is stored: {"session_id", "message"}
+    - Session, history and context handling are the same as /ai/chat
+    """
+    from database import AsyncSessionLocal
+    from services.ai_chat_service import ai_chat_service, FALLBACK_REPLY
+    
+    prepared = await _prepare_chat(chat_req, student, db)
+    if not prepared:
+        return error_response(msg="Session not found", code=404)
+    session_id, plan = prepared
+    log_turn(session_id, plan.accounting)
+    
+    async def store_reply(content: str):
+        # The request's session is closed once streaming starts, use a fresh one
+        async with AsyncSessionLocal() as stream_db:
+            await _save_assistant_message(stream_db, session_id, content)
+    
+    async def event_stream():
+        yield _sse_event("session", {"session_id": session_id})
+        
+        parts = []
+        stored = False
+        chunks = ai_chat_service.chat_stream(
+            user_message=chat_req.message,
+            student_context=plan.student_context,
+            chat_history=plan.chat_history,
+            temperature=0.7,
+            max_tokens=800
+        )
+        try:
+            async for chunk in chunks:
+                if chunk["type"] == "delta":
+                    parts.append(chunk["content"])
+                    yield _sse_event("delta", {"content": chunk["content"]})
+                else:
+                    print(f"❌ AI Chat Service Error: {chunk.get('error')}")
+            
+            ai_response = "".join(parts)
+            if not ai_response:
+                ai_response = FALLBACK_REPLY
+                yield _sse_event("delta", {"content": ai_response})
+            
+            await store_reply(ai_response)
+            stored = True
+            yield _sse_event("done", {"session_id": session_id, "message": ai_response})
+        finally:
+            await chunks.aclose()
+            # Client disconnected mid-reply: keep what was generated so far
+            if not stored and parts:
+                await asyncio.shield(store_reply("".join(parts)))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/me")
 async def get_student_me(
-    student: SysStudent = Depends(require_student),
-    db: Session = Depends(get_db)
+    student: SysStudent = Depends(require_student_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取当前登录学生的基本信息
     """
-    user = student.user
+    user = await db.get(SysUser, student.user_id)
     
     return success_response(data={
         "id": student.id,
@@ -521,34 +521,25 @@ async def get_student_me(
 
 @router.get("/profile")
 async def get_student_profile(
-    student: SysStudent = Depends(require_student),
-    db: Session = Depends(get_db)
+    student: SysStudent = Depends(require_student_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取学生的详细档案信息
     包含基本信息、成果统计、证书统计等
     """
-    user = student.user
-    
-    # 统计成果数量
-    total_achievements = db.query(BizAchievement).filter(
-        BizAchievement.student_id == student.id
-    ).count()
-    
-    approved_achievements = db.query(BizAchievement).filter(
-        BizAchievement.student_id == student.id,
-        BizAchievement.status == AchievementStatus.APPROVED
-    ).count()
+    user = await db.get(SysUser, student.user_id)
     
-    pending_achievements = db.query(BizAchievement).filter(
-        BizAchievement.student_id == student.id,
-        BizAchievement.status == AchievementStatus.PENDING
-    ).count()
+    # 统计成果数量（一次 GROUP BY status 查询）
+    stats = await get_status_counts(db, student_id=student.id, include_deleted=True)
     
     # 获取最近的成果
-    recent_achievements = db.query(BizAchievement).filter(
-        BizAchievement.student_id == student.id
-    ).order_by(BizAchievement.created_at.desc()).limit(5).all()
+    result = await db.execute(
+        select(BizAchievement).where(
+            BizAchievement.student_id == student.id
+        ).order_by(BizAchievement.created_at.desc()).limit(5)
+    )
+    recent_achievements = result.scalars().all()
     
     return success_response(data={
         "basic_info": {
@@ -562,10 +553,10 @@ async def get_student_profile(
             "avatar_url": user.avatar_url
         },
         "statistics": {
-            "total_achievements": total_achievements,
-            "approved_achievements": approved_achievements,
-            "pending_achievements": pending_achievements,
-            "approval_rate": round(approved_achievements / total_achievements * 100, 2) if total_achievements > 0 else 0
+            "total_achievements": stats["total"],
+            "approved_achievements": stats["approved"],
+            "pending_achievements": stats["pending"],
+            "approval_rate": stats["approval_rate"]
         },
         "recent_achievements": [
             {
@@ -579,3 +570,118 @@ async def get_student_profile(
         ]
     })
 
+
+async def _prepare_chat(chat_req: ChatRequest, student: SysStudent, db: AsyncSession):
+    """
+    Get or create the chat session, store the user message and build the model input
+    within the prompt token budget (older history is summarized into the session summary)
+    
+    Returns:
+        (session_id, PromptPlan), or None if the session does not belong to
+        the student
+    """
+    # Get or create session
+    session_id = chat_req.session_id
+    
+    if not session_id:
+        # Create new session
+        session_id = str(uuid.uuid4())
+        session = AiChatSession(
+            id=session_id,
+            student_id=student.id,
+            title=chat_req.message[:50]  # Use first 50 chars as title
+        )
+        db.add(session)
+        await db.commit()
+    else:
+        # Validate session belongs to student
+        session = await db.scalar(
+            select(AiChatSession).where(
+                AiChatSession.id == session_id,
+                AiChatSession.student_id == student.id
+            )
+        )
+        
+        if not session:
+            return None
+    
+    # Store user message
+    user_message = AiChatMessage(
+        session_id=session_id,
+        role=MessageRole.USER,
+        content=chat_req.message
+    )
+    db.add(user_message)
+    await db.commit()
+    
+    # Retrieve earlier messages not yet folded into the rolling summary
+    history_limit = 2 * settings.AI_CHAT_HISTORY_MAX_MESSAGES
+    history_query = select(AiChatMessage).where(
+        AiChatMessage.session_id == session_id,
+        AiChatMessage.id != user_message.id
+    )
+    if session.summarized_until:
+        history_query = history_query.where(AiChatMessage.id > session.summarized_until)
+    result = await db.execute(
+        history_query.order_by(AiChatMessage.id.desc()).limit(history_limit)
+    )
+    history_messages = list(result.scalars().all())
+    
+    # Sessions created before the rolling summary existed can hold more messages
+    # than one load; on their first turn also fold the messages just before the
+    # window into the summary. Older ones are left out to bound that one-off
+    # summary call and are skipped from then on via summarized_until.
+    if session.summarized_until is None and len(history_messages) == history_limit:
+        result = await db.execute(
+            select(AiChatMessage).where(
+                AiChatMessage.session_id == session_id,
+                AiChatMessage.id < history_messages[-1].id
+            ).order_by(AiChatMessage.id.desc()).limit(history_limit)
+        )
+        history_messages.extend(result.scalars().all())
+    history_messages.reverse()  # Oldest first
+    
+    # Student context (achievements + statistics, pre-rendered), reused across
+    # turns until an achievement of this student is created/audited/deleted
+    context = await chat_context_cache.load(db, student)
+    
+    # Fit context, summary, history and question into the prompt token budget
+    from services.ai_chat_service import ai_chat_service
+    plan = await chat_prompt_builder.build(
+        system_prompt=ai_chat_service.system_prompt,
+        context=context,
+        question=chat_req.message,
+        history=[
+            {"id": msg.id, "role": msg.role.value, "content": msg.content}
+            for msg in history_messages
+        ],
+        summary=session.history_summary,
+        summarized_until=session.summarized_until
+    )
+    
+    if plan.summary_changed:
+        session.history_summary = plan.summary
+        session.summarized_until = plan.summarized_until
+        await db.commit()
+    
+    return session_id, plan
+
+
+async def _save_assistant_message(db: AsyncSession, session_id: str, content: str):
+    """Store an assistant reply and bump the session timestamp"""
+    assistant_message = AiChatMessage(
+        session_id=session_id,
+        role=MessageRole.ASSISTANT,
+        content=content
+    )
+    db.add(assistant_message)
+    
+    # Update session timestamp
+    session = await db.get(AiChatSession, session_id)
+    session.updated_at = datetime.utcnow()
+    
+    await db.commit()
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
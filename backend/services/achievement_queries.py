@@ -0,0 +1,177 @@
+"""
+Achievement Query Builders
+Statements for the achievement listing endpoints. Each one loads the
+relationships its endpoint reads up front, so a page costs a fixed number of
+queries however many rows it has (async sessions cannot lazy-load at all).
+The admin review queue pages by keyset cursor on (created_at, id).
+"""
+
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Select, select, func, or_, and_
+from sqlalchemy.orm import joinedload, contains_eager
+from config import settings
+from models import BizAchievement, AchievementStatus, SysStudent, SysTeacher
+
+
+def student_achievements_query(student_id: int, status: Optional[AchievementStatus] = None) -> Select:
+    """A student's achievements (soft-deleted excluded), newest first, with teacher"""
+    query = select(BizAchievement).options(
+        joinedload(BizAchievement.teacher)
+    ).where(
+        BizAchievement.student_id == student_id,
+        BizAchievement.is_deleted == False  # 排除已删除的成果
+    )
+    if status is not None:
+        query = query.where(BizAchievement.status == status)
+    return query.order_by(BizAchievement.created_at.desc())
+
+
+def achievement_detail_query(achievement_id: int, student_id: int) -> Select:
+    """One achievement owned by the student, with teacher"""
+    return select(BizAchievement).options(
+        joinedload(BizAchievement.teacher)
+    ).where(
+        BizAchievement.id == achievement_id,
+        BizAchievement.student_id == student_id
+    )
+
+
+def chat_context_achievements_query(student_id: int) -> Select:
+    """All of a student's achievements for the AI chat context, with the teacher columns it quotes"""
+    return select(BizAchievement).options(
+        joinedload(BizAchievement.teacher).load_only(
+            SysTeacher.name, SysTeacher.title, SysTeacher.department
+        )
+    ).where(
+        BizAchievement.student_id == student_id,
+        BizAchievement.is_deleted == False  # 排除已删除的
+    ).order_by(BizAchievement.created_at.desc())
+
+
+def review_queue_filters(
+    status: Optional[AchievementStatus] = None,
+    student_name: Optional[str] = None,
+    student_ids: Optional[List[int]] = None
+) -> List:
+    """
+    WHERE clauses for the admin review queue
+
+    Args:
+        status: Achievement status
+        student_name: Name text, matched with LIKE on the joined SysStudent
+            when student_ids is None
+        student_ids: Students already resolved by the search index
+    """
+    filters = []
+    if status is not None:
+        filters.append(BizAchievement.status == status)
+    if student_ids is not None:
+        filters.append(BizAchievement.student_id.in_(student_ids))
+    elif student_name:
+        filters.append(SysStudent.name.like(f"%{student_name}%"))
+    return filters
+
+
+def _join_review_tables(query: Select) -> Select:
+    return query.join(
+        SysStudent, BizAchievement.student_id == SysStudent.id
+    ).join(
+        SysTeacher, BizAchievement.teacher_id == SysTeacher.id
+    )
+
+
+def review_queue_query(filters: List, after: Optional[Tuple[datetime, int]] = None) -> Select:
+    """
+    Review queue rows, newest first; student/teacher are filled from the same join
+
+    Args:
+        filters: Clauses from review_queue_filters()
+        after: (created_at, id) of the last row of the previous page (decoded cursor)
+    """
+    query = _join_review_tables(select(BizAchievement)).options(
+        contains_eager(BizAchievement.student),
+        contains_eager(BizAchievement.teacher)
+    ).where(*filters)
+
+    if after is not None:
+        created_at, achievement_id = after
+        query = query.where(or_(
+            BizAchievement.created_at < created_at,
+            and_(BizAchievement.created_at == created_at, BizAchievement.id < achievement_id)
+        ))
+
+    # id breaks ties so rows with the same created_at are neither skipped nor repeated
+    return query.order_by(BizAchievement.created_at.desc(), BizAchievement.id.desc())
+
+
+def review_queue_count_query(filters: List) -> Select:
+    """Total rows matching the review queue filters"""
+    return _join_review_tables(select(func.count(BizAchievement.id))).where(*filters)
+
+
+def encode_review_cursor(achievement: BizAchievement) -> str:
+    """Opaque cursor pointing after the given row"""
+    raw = json.dumps({"t": achievement.created_at.isoformat(), "i": achievement.id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_review_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor from encode_review_cursor()
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["t"]), int(data["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+class ReviewCountCache:
+    """
+    Short-lived cache of review queue totals, keyed by filter values
+
+    Counting the 3-way join is the expensive part of a review page; paging
+    through one filter reuses the same total. Audits invalidate it, new
+    submissions show up once the TTL expires.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple, tuple] = {}
+
+    def get(self, key: tuple) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            return entry[0]
+
+    def set(self, key: tuple, total: int):
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # Filters are free text, so drop expired entries instead of growing forever
+            if len(self._entries) >= 1000:
+                self._entries = {k: v for k, v in self._entries.items() if v[1] >= now}
+                if len(self._entries) >= 1000:
+                    self._entries.clear()
+            self._entries[key] = (total, now + self.ttl_seconds)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Create singleton instance
+review_count_cache = ReviewCountCache(ttl_seconds=settings.ADMIN_REVIEW_COUNT_CACHE_SECONDS)
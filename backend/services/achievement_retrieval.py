@@ -0,0 +1,110 @@
+"""
+Achievement Retrieval
+BM25 index over a student's achievements (title, type and content_json text)
+used to pick the achievements relevant to an AI chat question. Indexes are
+built with the student's chat context (services.chat_context), so every
+achievement create / audit / delete / import rebuilds them on the next turn.
+
+Chinese text is segmented with jieba when installed, otherwise split into
+character bigrams.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import jieba
+    JIEBA_AVAILABLE = True
+except ImportError:
+    JIEBA_AVAILABLE = False
+
+_CJK_RUN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Function words that would otherwise match most questions
+_STOPWORDS = frozenset([
+    "的", "了", "和", "与", "及", "是", "在", "有", "我", "你", "吗", "呢", "吧",
+    "什么", "怎么", "怎样", "如何", "哪些", "哪个", "一下", "可以", "我的",
+])
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+
+def load_tokenizer():
+    """Load the jieba dictionary up front (the first segmentation otherwise takes about a second)"""
+    if JIEBA_AVAILABLE:
+        jieba.initialize()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into lowercase words and Chinese terms (jieba words or character bigrams)"""
+    if not text:
+        return []
+    text = text.lower()
+    tokens = _WORD_RE.findall(text)
+    for run in _CJK_RUN_RE.findall(text):
+        if JIEBA_AVAILABLE:
+            tokens.extend(jieba.lcut_for_search(run))
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return [token for token in tokens if token not in _STOPWORDS]
+
+
+def achievement_text(ach: Dict) -> str:
+    """Searchable text of an achievement dict: title, type and scalar content_json values"""
+    parts = [ach.get("title") or "", ach.get("type") or ""]
+    content = ach.get("content_json")
+    if isinstance(content, dict):
+        parts.extend(
+            str(value) for value in content.values() if isinstance(value, (str, int, float))
+        )
+    return " ".join(parts)
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents, addressed by position"""
+
+    def __init__(self, documents: Sequence[List[str]]):
+        self.size = len(documents)
+        self._term_freqs = [Counter(tokens) for tokens in documents]
+        self._lengths = [len(tokens) for tokens in documents]
+        self._avg_length = (sum(self._lengths) / self.size) if self.size else 0.0
+
+        doc_freqs = Counter()
+        for freqs in self._term_freqs:
+            doc_freqs.update(freqs.keys())
+        self._idf = {
+            term: math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def search(self, query: str, limit: int) -> List[int]:
+        """
+        Positions of the best-matching documents, best first
+
+        Documents sharing no term with the query are not returned.
+        """
+        terms = [term for term in set(tokenize(query)) if term in self._idf]
+        if not terms or limit <= 0:
+            return []
+
+        scores = []
+        for position, freqs in enumerate(self._term_freqs):
+            score = 0.0
+            norm = K1 * (1 - B + B * self._lengths[position] / (self._avg_length or 1))
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (K1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((score, position))
+
+        # Ties keep the original (newest first) order
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return [position for _, position in scores[:limit]]
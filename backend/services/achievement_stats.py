@@ -0,0 +1,60 @@
+"""
+Achievement Statistics Service
+Per-status achievement counts from a single GROUP BY status query, shared by
+the student profile, the AI chat context and the admin dashboard
+"""
+
+from typing import Dict, Optional
+from sqlalchemy import Select, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import BizAchievement, AchievementStatus
+
+
+def status_counts_query(student_id: Optional[int] = None, include_deleted: bool = False) -> Select:
+    """(status, count) rows for one student, or for all achievements"""
+    query = select(BizAchievement.status, func.count(BizAchievement.id)).group_by(BizAchievement.status)
+    if student_id is not None:
+        query = query.where(BizAchievement.student_id == student_id)
+    if not include_deleted:
+        query = query.where(BizAchievement.is_deleted == False)
+    return query
+
+
+def summarize_status_counts(rows) -> Dict:
+    """
+    Build the statistics dict from (status, count) rows
+
+    Returns:
+        total / approved / pending / rejected counts and approval_rate (percent)
+    """
+    counts = {status: 0 for status in AchievementStatus}
+    for status, count in rows:
+        if status is not None:
+            counts[AchievementStatus(status)] = count
+
+    total = sum(count for _, count in rows)
+    approved = counts[AchievementStatus.APPROVED]
+    return {
+        "total": total,
+        "approved": approved,
+        "pending": counts[AchievementStatus.PENDING],
+        "rejected": counts[AchievementStatus.REJECTED],
+        "approval_rate": round(approved / total * 100, 2) if total > 0 else 0
+    }
+
+
+async def get_status_counts(
+    db: AsyncSession,
+    student_id: Optional[int] = None,
+    include_deleted: bool = False
+) -> Dict:
+    """
+    Count achievements by status in one query
+
+    Args:
+        db: Async database session
+        student_id: Restrict to one student (all achievements if None)
+        include_deleted: Also count soft-deleted achievements
+    """
+    result = await db.execute(status_counts_query(student_id, include_deleted))
+    return summarize_status_counts(result.all())
@@ -3,12 +3,19 @@ AI Chat Service using OpenAI Compatible API (Alibaba Cloud Qwen)
 Provides conversational AI capabilities for student learning assistance
 """
 
+import asyncio
 import json
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Union
 from datetime import datetime
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from config import settings
 
+# Canned reply stored and shown when the model cannot answer
+FALLBACK_REPLY = "抱歉，AI助手暂时无法回复。请检查网络连接或稍后再试。"
+
+# Characters of each message passed to the summary model
+SUMMARY_INPUT_CLIP_CHARS = 500
+
 
 class AiChatService:
     """Service for AI-powered chat with student context awareness"""
@@ -17,6 +24,11 @@ class AiChatService:
         self.api_key = settings.DASHSCOPE_API_KEY or settings.QWEN_API_KEY
         self.model_name = settings.QWEN_MODEL_NAME  # Use text model for chat
         self.base_url = settings.QWEN_BASE_URL
+        self.max_concurrency = max(1, settings.AI_CHAT_MAX_CONCURRENCY)
+        self.request_timeout = settings.AI_CHAT_REQUEST_TIMEOUT
+        self.queue_timeout = settings.AI_CHAT_QUEUE_TIMEOUT
+        self.summary_model_name = settings.AI_CHAT_SUMMARY_MODEL or self.model_name
+        self.summary_timeout = settings.AI_CHAT_SUMMARY_TIMEOUT
         
         # Initialize OpenAI client with DashScope endpoint
         self.client = OpenAI(
@@ -24,6 +36,16 @@ class AiChatService:
             base_url=self.base_url
         )
         
+        # Async client for use inside request handlers (does not block the event loop)
+        self.async_client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            timeout=self.request_timeout
+        )
+        
+        # Created lazily so it binds to the running event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        
         # System prompt for student learning assistant
         self.system_prompt = """你是一位专业的AI学习助手，专门帮助大学生进行学习规划、成果分析和职业发展指导。
 
@@ -45,20 +67,35 @@ class AiChatService:
 - 始终保持积极正面的态度
 - 尊重学生隐私，不要求不必要的个人信息"""
     
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Get the semaphore limiting concurrent chat model calls"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+    
+    async def _acquire_slot(self) -> bool:
+        """Wait up to queue_timeout for a model call slot; False if the limiter stays saturated"""
+        try:
+            await asyncio.wait_for(self._get_semaphore().acquire(), timeout=self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
     def chat(
         self,
         user_message: str,
-        student_context: Optional[Dict] = None,
+        student_context: Optional[Union[Dict, str]] = None,
         chat_history: Optional[List[Dict]] = None,
         temperature: float = 0.7,
         max_tokens: int = 800
     ) -> Dict:
         """
-        Send a chat message and get AI response
+        Send a chat message and get AI response (blocking; request handlers use achat())
         
         Args:
             user_message: The user's message
-            student_context: Optional context about the student (achievements, profile, etc.)
+            student_context: Optional context about the student (achievements, profile, etc.),
+                either a dict or text already rendered by render_student_context()
             chat_history: Optional list of previous messages [{"role": "user"/"assistant", "content": "..."}]
             temperature: Response creativity (0.0-1.0)
             max_tokens: Maximum response length
@@ -67,69 +104,248 @@ class AiChatService:
             Dictionary containing the AI response and metadata
         """
         try:
-            # Build messages array
-            messages = []
-            
-            # Add system prompt with student context
-            system_content = self.system_prompt
-            if student_context:
-                context_str = self._format_student_context(student_context)
-                system_content += f"\n\n当前学生信息：\n{context_str}"
-            
-            messages.append({
-                "role": "system",
-                "content": system_content
-            })
-            
-            # Add chat history (limit to last 10 messages to control token usage)
-            if chat_history:
-                limited_history = chat_history[-10:] if len(chat_history) > 10 else chat_history
-                messages.extend(limited_history)
-            
-            # Add current user message
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
+            messages = self._build_messages(user_message, student_context, chat_history)
             
             # Call OpenAI-compatible API
             completion = self.client.chat.completions.create(
                 model=self.model_name,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                timeout=self.request_timeout
             )
+            return self._completion_result(completion)
             
-            # Extract response
-            ai_response = completion.choices[0].message.content
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def achat(
+        self,
+        user_message: str,
+        student_context: Optional[Union[Dict, str]] = None,
+        chat_history: Optional[List[Dict]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 800
+    ) -> Dict:
+        """
+        Send a chat message and get AI response without blocking the event loop
+        
+        At most AI_CHAT_MAX_CONCURRENCY calls run at once per worker; when no
+        slot frees up within AI_CHAT_QUEUE_TIMEOUT the canned reply is returned
+        with "saturated": True instead of queueing further.
+        
+        Args:
+            Same as chat()
             
+        Returns:
+            Same as chat()
+        """
+        if not await self._acquire_slot():
             return {
-                "success": True,
-                "message": ai_response,
-                "usage": {
-                    "prompt_tokens": completion.usage.prompt_tokens if completion.usage else 0,
-                    "completion_tokens": completion.usage.completion_tokens if completion.usage else 0,
-                    "total_tokens": completion.usage.total_tokens if completion.usage else 0
-                },
-                "model": self.model_name,
-                "timestamp": datetime.utcnow().isoformat()
+                "success": False,
+                "saturated": True,
+                "error": "AI chat service is busy (concurrency limit reached)",
+                "message": FALLBACK_REPLY
             }
+        
+        try:
+            messages = self._build_messages(user_message, student_context, chat_history)
+            
+            # Call OpenAI-compatible API
+            completion = await self.async_client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=self.request_timeout
+            )
+            return self._completion_result(completion)
             
         except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            print(f"❌ AI Chat Service Exception: {str(e)}")
-            print(f"Traceback:\n{error_details}")
-            print(f"API Key configured: {bool(self.api_key)}")
-            print(f"Model: {self.model_name}")
-            print(f"Base URL: {self.base_url}")
-            return {
-                "success": False,
-                "error": f"AI chat service error: {str(e)}",
-                "message": "抱歉，AI助手暂时无法回复，请稍后再试。"
-            }
+            return self._error_result(e)
+        finally:
+            self._get_semaphore().release()
+    
+    async def chat_stream(
+        self,
+        user_message: str,
+        student_context: Optional[Union[Dict, str]] = None,
+        chat_history: Optional[List[Dict]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 800
+    ) -> AsyncIterator[Dict]:
+        """
+        Stream an AI response as it is generated
+        
+        Holds a concurrency slot (see achat()) until the stream ends.
+        
+        Args:
+            Same as chat()
+            
+        Yields:
+            {"type": "delta", "content": "..."} for each chunk of the reply,
+            then {"type": "error", "error": "..."} if the call fails or no slot is free
+        """
+        if not await self._acquire_slot():
+            yield {"type": "error", "error": "AI chat service is busy (concurrency limit reached)"}
+            return
+        
+        # The slot is released in the outer finally so that nothing in the
+        # cleanup (e.g. cancellation when the client disconnects) can leak it
+        try:
+            stream = None
+            try:
+                messages = self._build_messages(user_message, student_context, chat_history)
+                stream = await self.async_client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    timeout=self.request_timeout
+                )
+                
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        yield {"type": "delta", "content": content}
+                        
+            except Exception as e:
+                print(f"❌ AI Chat Stream Exception: {str(e)}")
+                yield {"type": "error", "error": f"AI chat service error: {str(e)}"}
+            finally:
+                # Release the upstream connection if the client went away mid-stream
+                if stream is not None:
+                    try:
+                        await stream.response.aclose()
+                    except Exception as e:
+                        print(f"⚠️ AI Chat Stream close failed: {str(e)}")
+        finally:
+            self._get_semaphore().release()
     
-    def _format_student_context(self, context: Dict) -> str:
+    async def summarize_history(
+        self,
+        summary: Optional[str],
+        messages: List[Dict],
+        max_tokens: int
+    ) -> Optional[str]:
+        """
+        Fold older chat messages into the session's rolling summary
+        
+        Uses a concurrency slot like achat(), with the (cheaper) summary model
+        and a short timeout since the user's reply waits for it.
+        
+        Args:
+            summary: Summary so far, if any
+            messages: Messages to fold in [{"role", "content"}], oldest first
+            max_tokens: Maximum summary length
+            
+        Returns:
+            The updated summary, or None if the call failed or no slot was free
+        """
+        if not await self._acquire_slot():
+            return None
+        
+        try:
+            transcript = "\n".join(
+                f"{'学生' if message['role'] == 'user' else '助手'}："
+                f"{message['content'][:SUMMARY_INPUT_CLIP_CHARS]}"
+                for message in messages
+            )
+            prompt = (
+                f"已有摘要：\n{summary or '（无）'}\n\n新增对话：\n{transcript}\n\n"
+                f"请将新增对话并入已有摘要，输出更新后的完整摘要。保留学生的目标、"
+                f"关注的问题、已给出的关键建议和结论，省略寒暄，不超过{max_tokens}字。"
+            )
+            completion = await self.async_client.chat.completions.create(
+                model=self.summary_model_name,
+                messages=[
+                    {"role": "system", "content": "你负责压缩学习助手与学生的对话历史，只输出摘要正文。"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=max_tokens,
+                timeout=self.summary_timeout
+            )
+            content = completion.choices[0].message.content
+            return content.strip() if content else None
+            
+        except Exception as e:
+            print(f"❌ AI Chat Summary Exception: {str(e)}")
+            return None
+        finally:
+            self._get_semaphore().release()
+    
+    def _completion_result(self, completion) -> Dict:
+        """Result dict for a successful completion"""
+        # Extract response
+        ai_response = completion.choices[0].message.content
+        
+        return {
+            "success": True,
+            "message": ai_response,
+            "usage": {
+                "prompt_tokens": completion.usage.prompt_tokens if completion.usage else 0,
+                "completion_tokens": completion.usage.completion_tokens if completion.usage else 0,
+                "total_tokens": completion.usage.total_tokens if completion.usage else 0
+            },
+            "model": self.model_name,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    
+    def _error_result(self, e: Exception) -> Dict:
+        """Log a failed call and build its result dict"""
+        import traceback
+        error_details = traceback.format_exc()
+        print(f"❌ AI Chat Service Exception: {str(e)}")
+        print(f"Traceback:\n{error_details}")
+        print(f"API Key configured: {bool(self.api_key)}")
+        print(f"Model: {self.model_name}")
+        print(f"Base URL: {self.base_url}")
+        return {
+            "success": False,
+            "error": f"AI chat service error: {str(e)}",
+            "message": "抱歉，AI助手暂时无法回复，请稍后再试。"
+        }
+    
+    def _build_messages(
+        self,
+        user_message: str,
+        student_context: Optional[Union[Dict, str]] = None,
+        chat_history: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """Build the messages array: system prompt with student context, history, user message"""
+        messages = []
+        
+        # Add system prompt with student context
+        system_content = self.system_prompt
+        if student_context:
+            if isinstance(student_context, str):
+                context_str = student_context
+            else:
+                context_str = self.render_student_context(student_context)
+            system_content += f"\n\n当前学生信息：\n{context_str}"
+        
+        messages.append({
+            "role": "system",
+            "content": system_content
+        })
+        
+        # Add chat history (limited to the most recent messages to control token usage)
+        if chat_history:
+            messages.extend(chat_history[-settings.AI_CHAT_HISTORY_MAX_MESSAGES:])
+        
+        # Add current user message
+        messages.append({
+            "role": "user",
+            "content": user_message
+        })
+        
+        return messages
+    
+    def render_student_context(self, context: Dict) -> str:
         """
         Format student context into a readable string for the AI
         
@@ -142,12 +358,9 @@ class AiChatService:
         parts = []
         
         # Student basic info
-        if "name" in context:
-            parts.append(f"姓名：{context['name']}")
-        if "major" in context:
-            parts.append(f"专业：{context['major']}")
-        if "class_name" in context:
-            parts.append(f"班级：{context['class_name']}")
+        profile = self.render_profile(context)
+        if profile:
+            parts.append(profile)
         
         # Achievements - now with full details
         if "achievements" in context and context["achievements"]:
@@ -161,63 +374,84 @@ class AiChatService:
             display_count = min(10, total_count)
             
             for i, ach in enumerate(achievements[:display_count], 1):
-                ach_type = ach.get("type", "其他")
-                ach_title = ach.get("title", "未命名")
-                ach_status = ach.get("status", "unknown")
-                
-                # 状态标识
-                status_emoji = {
-                    "approved": "✅",
-                    "pending": "⏳",
-                    "rejected": "❌"
-                }.get(ach_status, "❓")
-                
-                parts.append(f"  {i}. {status_emoji} [{ach_type}] {ach_title}")
-                
-                # 如果有详细内容，展示关键信息
-                if ach.get("content_json"):
-                    content = ach["content_json"]
-                    details = []
-                    if content.get("award_level"):
-                        details.append(f"级别:{content['award_level']}")
-                    if content.get("award"):
-                        details.append(f"奖项:{content['award']}")
-                    if content.get("issuing_organization"):
-                        details.append(f"颁发:{content['issuing_organization']}")
-                    if details:
-                        parts.append(f"     {' | '.join(details)}")
-                
-                # 如果有审核意见，展示
-                if ach.get("audit_comment"):
-                    parts.append(f"     审核意见: {ach['audit_comment']}")
-                
-                # 教师信息
-                if ach.get("teacher_name"):
-                    teacher_info = ach['teacher_name']
-                    if ach.get("teacher_title"):
-                        teacher_info += f"({ach['teacher_title']})"
-                    parts.append(f"     指导教师: {teacher_info}")
+                parts.append(f"  {i}. {self.render_achievement(ach)}")
             
             if total_count > display_count:
                 parts.append(f"  ...以及其他 {total_count - display_count} 项成果（详见完整数据）")
         
         # Statistics - now with more details
         if "statistics" in context:
-            stats = context["statistics"]
-            parts.append(f"\n成果统计：")
-            if "total_achievements" in stats:
-                parts.append(f"  总计：{stats['total_achievements']} 项")
-            if "approved_achievements" in stats:
-                parts.append(f"  已通过：{stats['approved_achievements']} 项")
-            if "pending_achievements" in stats:
-                parts.append(f"  待审核：{stats['pending_achievements']} 项")
-            if "rejected_achievements" in stats:
-                parts.append(f"  已拒绝：{stats['rejected_achievements']} 项")
-            if "approval_rate" in stats:
-                parts.append(f"  通过率：{stats['approval_rate']}%")
+            parts.append(f"\n{self.render_statistics(context['statistics'])}")
         
         return "\n".join(parts) if parts else "暂无学生信息"
     
+    def render_profile(self, context: Dict) -> str:
+        """Student basic info lines (name, major, class)"""
+        parts = []
+        if "name" in context:
+            parts.append(f"姓名：{context['name']}")
+        if "major" in context:
+            parts.append(f"专业：{context['major']}")
+        if "class_name" in context:
+            parts.append(f"班级：{context['class_name']}")
+        return "\n".join(parts)
+    
+    def render_achievement(self, ach: Dict) -> str:
+        """One achievement (status, type, title, key details), without the list number"""
+        ach_type = ach.get("type", "其他")
+        ach_title = ach.get("title", "未命名")
+        ach_status = ach.get("status", "unknown")
+        
+        # 状态标识
+        status_emoji = {
+            "approved": "✅",
+            "pending": "⏳",
+            "rejected": "❌"
+        }.get(ach_status, "❓")
+        
+        parts = [f"{status_emoji} [{ach_type}] {ach_title}"]
+        
+        # 如果有详细内容，展示关键信息
+        if ach.get("content_json"):
+            content = ach["content_json"]
+            details = []
+            if content.get("award_level"):
+                details.append(f"级别:{content['award_level']}")
+            if content.get("award"):
+                details.append(f"奖项:{content['award']}")
+            if content.get("issuing_organization"):
+                details.append(f"颁发:{content['issuing_organization']}")
+            if details:
+                parts.append(f"     {' | '.join(details)}")
+        
+        # 如果有审核意见，展示
+        if ach.get("audit_comment"):
+            parts.append(f"     审核意见: {ach['audit_comment']}")
+        
+        # 教师信息
+        if ach.get("teacher_name"):
+            teacher_info = ach['teacher_name']
+            if ach.get("teacher_title"):
+                teacher_info += f"({ach['teacher_title']})"
+            parts.append(f"     指导教师: {teacher_info}")
+        
+        return "\n".join(parts)
+    
+    def render_statistics(self, stats: Dict) -> str:
+        """Achievement statistics section"""
+        parts = [f"成果统计："]
+        if "total_achievements" in stats:
+            parts.append(f"  总计：{stats['total_achievements']} 项")
+        if "approved_achievements" in stats:
+            parts.append(f"  已通过：{stats['approved_achievements']} 项")
+        if "pending_achievements" in stats:
+            parts.append(f"  待审核：{stats['pending_achievements']} 项")
+        if "rejected_achievements" in stats:
+            parts.append(f"  已拒绝：{stats['rejected_achievements']} 项")
+        if "approval_rate" in stats:
+            parts.append(f"  通过率：{stats['approval_rate']}%")
+        return "\n".join(parts)
+    
     def validate_api_key(self) -> bool:
         """
         Validate that the API key is configured
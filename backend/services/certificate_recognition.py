@@ -3,6 +3,7 @@ Certificate Recognition Service
 Uses Alibaba Cloud Bailian (Qwen-plus) to recognize and extract information from achievement certificates
 """
 
+import asyncio
 import base64
 import json
 import io
@@ -11,6 +12,7 @@ from datetime import datetime
 import httpx
 from PIL import Image
 from config import settings
+from services.ocr_limiter import get_ocr_semaphore
 
 
 class CertificateRecognitionService:
@@ -20,6 +22,10 @@ class CertificateRecognitionService:
         self.api_key = settings.QWEN_API_KEY
         self.model_name = settings.QWEN_MODEL_NAME
         self.api_url = settings.QWEN_BASE_URL
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Get the semaphore limiting concurrent model calls across all requests (shared with OCR jobs)"""
+        return get_ocr_semaphore()
         
     def compress_image(self, image_path: str, max_size: int = 1600, quality: int = 85) -> bytes:
         """
@@ -78,8 +84,8 @@ class CertificateRecognitionService:
             Dictionary containing extracted certificate information
         """
         try:
-            # Encode image to base64 (with compression)
-            image_base64 = self.encode_image_to_base64(image_path)
+            # Encode image to base64 (with compression) in a worker thread
+            image_base64 = await asyncio.to_thread(self.encode_image_to_base64, image_path)
             
             # Prepare the prompt for certificate recognition
             prompt = """请仔细分析这张图片（通常是获奖证书、奖状或成果证明），并尽可能准确地提取以下关键信息。
@@ -149,15 +155,16 @@ JSON 模板：
                 }
             }
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                
-                result = response.json()
+            async with self._get_semaphore():
+                async with httpx.AsyncClient(timeout=settings.OCR_REQUEST_TIMEOUT) as client:
+                    response = await client.post(
+                        self.api_url,
+                        headers=headers,
+                        json=payload
+                    )
+                    response.raise_for_status()
+                    
+                    result = response.json()
                 
                 # Extract the response text
                 if "output" in result and "choices" in result["output"]:
@@ -229,11 +236,10 @@ JSON 模板：
         Returns:
             List of dictionaries containing extracted information for each certificate
         """
-        results = []
-        for image_path in image_paths:
-            result = await self.recognize_certificate(image_path)
-            results.append(result)
-        return results
+        # Runs concurrently, bounded by the global semaphore
+        return list(await asyncio.gather(
+            *(self.recognize_certificate(image_path) for image_path in image_paths)
+        ))
     
     def validate_recognition_result(self, result: Dict) -> Dict:
         """
@@ -4,57 +4,19 @@ Uses Alibaba Cloud DashScope with OpenAI-compatible interface
 Enhanced to extract team members and advisors information
 """
 
+import asyncio
 import base64
 import json
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from config import settings
+from services.ocr_limiter import get_ocr_semaphore
+from services.recognition_cache import recognition_cache
 
 
-class CertificateRecognitionServiceOpenAI:
-    """Service for recognizing and extracting information from certificates using OpenAI-compatible API"""
-    
-    def __init__(self):
-        self.api_key = settings.DASHSCOPE_API_KEY or settings.QWEN_API_KEY
-        self.model_name = settings.QWEN_VL_MODEL  # Use VL model for vision tasks
-        self.base_url = settings.QWEN_BASE_URL
-        
-        # Initialize OpenAI client with DashScope endpoint
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
-        
-    def encode_image_to_base64(self, image_path: str) -> str:
-        """
-        Encode image file to base64 string
-        
-        Args:
-            image_path: Path to the image file
-            
-        Returns:
-            Base64 encoded string of the image
-        """
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-    
-    def recognize_certificate(self, image_path: str) -> Dict:
-        """
-        Recognize certificate and extract structured information using OpenAI-compatible API
-        
-        Args:
-            image_path: Path to the certificate image
-            
-        Returns:
-            Dictionary containing extracted certificate information
-        """
-        try:
-            # Encode image to base64
-            image_base64 = self.encode_image_to_base64(image_path)
-            
-            # Prepare the prompt for certificate recognition
-            prompt = """请仔细识别这张获奖证书/成果证书，并提取以下所有信息。
+# Prompt for certificate recognition
+RECOGNITION_PROMPT = """请仔细识别这张获奖证书/成果证书，并提取以下所有信息。
 
 【重要提示】人名识别准确性至关重要，请务必：
 1. 仔细辨认每个汉字，特别是人名
@@ -119,31 +81,84 @@ class CertificateRecognitionServiceOpenAI:
 - team_members和advisors必须是数组
 - 人名识别不确定时，在recognition_confidence中标注为medium或low
 - 只返回JSON，不要有任何解释性文字"""
+
+
+class CertificateRecognitionServiceOpenAI:
+    """Service for recognizing and extracting information from certificates using OpenAI-compatible API"""
+    
+    def __init__(self):
+        self.api_key = settings.DASHSCOPE_API_KEY or settings.QWEN_API_KEY
+        self.model_name = settings.QWEN_VL_MODEL  # Use VL model for vision tasks
+        self.base_url = settings.QWEN_BASE_URL
+        self.request_timeout = settings.OCR_REQUEST_TIMEOUT
+        
+        # Initialize OpenAI client with DashScope endpoint
+        self.client = OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url
+        )
+        
+        # Async client for use inside request handlers (does not block the event loop)
+        self.async_client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            timeout=self.request_timeout
+        )
+        
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Get the semaphore limiting concurrent vision model calls (shared with the upload routes)"""
+        return get_ocr_semaphore()
+    
+    def encode_image_to_base64(self, image_path: str) -> str:
+        """
+        Encode image file to base64 string
+        
+        Args:
+            image_path: Path to the image file
             
-            # Create chat completion request with vision
-            completion = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
+        Returns:
+            Base64 encoded string of the image
+        """
+        with open(image_path, "rb") as image_file:
+            return base64.b64encode(image_file.read()).decode('utf-8')
+    
+    def _read_image(self, image_path: str) -> bytes:
+        """Read raw image bytes"""
+        with open(image_path, "rb") as image_file:
+            return image_file.read()
+    
+    def _build_messages(self, image_base64: str) -> List[Dict]:
+        """Build the vision chat messages for a base64 encoded certificate image"""
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{image_base64}"
+                        }
+                    },
                     {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
-                                }
-                            },
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
+                        "type": "text",
+                        "text": RECOGNITION_PROMPT
                     }
-                ],
-                temperature=0.1,  # Lower temperature for more consistent output
-                max_tokens=1500  # Increased for more detailed extraction
-            )
+                ]
+            }
+        ]
+    
+    def _parse_completion(self, completion) -> Dict:
+        """
+        Parse the model completion into the recognition result
+        
+        Args:
+            completion: Chat completion returned by the OpenAI-compatible API
             
+        Returns:
+            Dictionary containing extracted certificate information
+        """
+        content = None
+        try:
             # Extract the response
             content = completion.choices[0].message.content
             
@@ -180,8 +195,89 @@ class CertificateRecognitionServiceOpenAI:
             return {
                 "success": False,
                 "error": f"Failed to parse JSON response: {str(e)}",
-                "raw_response": content if 'content' in locals() else None
+                "raw_response": content
+            }
+    
+    def recognize_certificate(self, image_path: str) -> Dict:
+        """
+        Recognize certificate and extract structured information using OpenAI-compatible API
+        
+        Blocking call - use recognize_certificate_async from request handlers.
+        
+        Args:
+            image_path: Path to the certificate image
+            
+        Returns:
+            Dictionary containing extracted certificate information
+        """
+        try:
+            # Return cached result for previously recognized images
+            image_bytes = self._read_image(image_path)
+            sha256, phash = recognition_cache.compute_keys(image_bytes)
+            cached = recognition_cache.get(sha256, phash)
+            if cached:
+                return cached
+            
+            # Encode image to base64
+            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+            
+            # Create chat completion request with vision
+            completion = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=self._build_messages(image_base64),
+                temperature=0.1,  # Lower temperature for more consistent output
+                max_tokens=1500,  # Increased for more detailed extraction
+                timeout=self.request_timeout
+            )
+            
+            result = self._parse_completion(completion)
+            if result.get("success"):
+                recognition_cache.set(sha256, phash, result)
+            return result
+                    
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Unexpected error: {str(e)}"
             }
+    
+    async def recognize_certificate_async(self, image_path: str) -> Dict:
+        """
+        Recognize certificate without blocking the event loop
+        
+        At most OCR_MAX_CONCURRENCY vision calls run at once; further uploads
+        wait for a free slot instead of piling up on the model endpoint.
+        
+        Args:
+            image_path: Path to the certificate image
+            
+        Returns:
+            Dictionary containing extracted certificate information
+        """
+        try:
+            # File read, hashing and cache lookup run in a worker thread
+            image_bytes = await asyncio.to_thread(self._read_image, image_path)
+            sha256, phash = await asyncio.to_thread(recognition_cache.compute_keys, image_bytes)
+            cached = await asyncio.to_thread(recognition_cache.get, sha256, phash)
+            if cached:
+                return cached
+            
+            async with self._get_semaphore():
+                encoded = await asyncio.to_thread(base64.b64encode, image_bytes)
+                image_base64 = encoded.decode('utf-8')
+                
+                completion = await self.async_client.chat.completions.create(
+                    model=self.model_name,
+                    messages=self._build_messages(image_base64),
+                    temperature=0.1,
+                    max_tokens=1500
+                )
+            
+            result = self._parse_completion(completion)
+            if result.get("success"):
+                await asyncio.to_thread(recognition_cache.set, sha256, phash, result)
+            return result
+                    
         except Exception as e:
             return {
                 "success": False,
@@ -269,7 +365,8 @@ class CertificateRecognitionServiceOpenAI:
         return {
             "success": True,
             "data": cleaned_data,
-            "usage": result.get("usage", {})
+            "usage": result.get("usage", {}),
+            "cached": result.get("cached", False)
         }
 
 
@@ -0,0 +1,168 @@
+"""
+Chat Context Cache
+Per-student AI chat context (profile, achievements and statistics, each
+pre-rendered for the system prompt), reused across turns until the student's
+context_version changes. The version is bumped in the same transaction as every achievement
+create / audit / delete / import, so all workers see the change.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from models import SysStudent
+from services.chat_prompt import estimate_tokens
+from services.achievement_retrieval import BM25Index, achievement_text, tokenize
+
+
+@dataclass(frozen=True)
+class AchievementBlock:
+    """One achievement rendered for the prompt"""
+    id: int
+    text: str  # Rendered lines, without the list number
+    tokens: int  # estimate_tokens(text)
+
+
+@dataclass(frozen=True)
+class ChatContext:
+    """Student context for one context_version"""
+    version: int
+    context: Dict  # Structured data (name, achievements, statistics)
+    profile: str  # Rendered name / major / class
+    statistics: str  # Rendered statistics section
+    achievements: Tuple[AchievementBlock, ...]  # Newest first
+    index: BM25Index  # Over achievements, by position
+
+
+def context_version_bump(student_ids: Iterable[int]):
+    """UPDATE statement invalidating the cached chat context of the given students"""
+    return update(SysStudent).where(
+        SysStudent.id.in_(list(student_ids))
+    ).values(
+        context_version=SysStudent.context_version + 1
+    ).execution_options(synchronize_session=False)
+
+
+class ChatContextCache:
+    """LRU cache of ChatContext by student id (an entry is only used for its own version)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, ChatContext]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, student_id: int, version: int) -> Optional[ChatContext]:
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is None or entry.version != version:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(student_id)
+            self._stats["hits"] += 1
+            return entry
+
+    def set(self, student_id: int, entry: ChatContext):
+        with self._lock:
+            self._entries[student_id] = entry
+            self._entries.move_to_end(student_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
+
+    async def load(self, db: AsyncSession, student: SysStudent) -> ChatContext:
+        """
+        Get the student's chat context, building it on a miss
+
+        A hit costs no queries; a miss loads achievements (teacher included)
+        and status counts, then renders each prompt section and builds the
+        retrieval index once.
+        """
+        version = student.context_version or 0
+        entry = self.get(student.id, version)
+        if entry:
+            return entry
+
+        from services.achievement_queries import chat_context_achievements_query
+        from services.achievement_stats import get_status_counts
+        from services.ai_chat_service import ai_chat_service
+
+        # 查询所有状态的成果，让AI能够全面分析学生情况（教师信息随同一查询加载）
+        result = await db.execute(chat_context_achievements_query(student.id))
+        achievements = result.scalars().all()
+
+        # Count achievements by status for statistics (one GROUP BY query)
+        stats = await get_status_counts(db, student_id=student.id)
+
+        context = build_student_context(student, achievements, stats)
+        entry = ChatContext(
+            version=version,
+            context=context,
+            profile=ai_chat_service.render_profile(context),
+            statistics=ai_chat_service.render_statistics(context["statistics"]),
+            achievements=tuple(
+                _achievement_block(ach, ai_chat_service.render_achievement(ach))
+                for ach in context["achievements"]
+            ),
+            index=BM25Index([tokenize(achievement_text(ach)) for ach in context["achievements"]])
+        )
+        self.set(student.id, entry)
+        return entry
+
+
+def _achievement_block(ach: Dict, text: str) -> AchievementBlock:
+    return AchievementBlock(id=ach["id"], text=text, tokens=estimate_tokens(text))
+
+
+def build_student_context(student: SysStudent, achievements, stats: Dict) -> Dict:
+    """Structured student context with complete achievement data"""
+    return {
+        "name": student.name,
+        "major": student.major,
+        "class_name": getattr(student, 'class_name', None),
+        "achievements": [
+            {
+                # 基本信息
+                "id": ach.id,
+                "title": ach.title,
+                "type": ach.type,
+                "status": ach.status.value,
+
+                # 详细内容（OCR识别的结构化数据）
+                "content_json": ach.content_json,
+
+                # 证书相关
+                "evidence_url": ach.evidence_url,
+                "feishu_attachment_token": ach.feishu_attachment_token,
+
+                # 审核信息
+                "audit_comment": ach.audit_comment,
+
+                # 时间信息
+                "created_at": ach.created_at.isoformat() if ach.created_at else None,
+
+                # 教师信息（如果需要）
+                "teacher_name": ach.teacher.name if ach.teacher else None,
+                "teacher_title": ach.teacher.title if ach.teacher else None,
+                "teacher_department": ach.teacher.department if ach.teacher else None,
+            }
+            for ach in achievements
+        ],
+        "statistics": {
+            "total_achievements": stats["total"],
+            "approved_achievements": stats["approved"],
+            "pending_achievements": stats["pending"],
+            "rejected_achievements": stats["rejected"],
+            "approval_rate": stats["approval_rate"]
+        }
+    }
+
+
+# Create singleton instance
+chat_context_cache = ChatContextCache(max_entries=settings.AI_CHAT_CONTEXT_CACHE_MAX_ENTRIES)
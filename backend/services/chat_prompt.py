@@ -0,0 +1,267 @@
+"""
+Chat Prompt Builder
+Assembles the AI chat prompt within AI_CHAT_MAX_PROMPT_TOKENS: fixed parts
+(system prompt, profile, statistics, question) first, then the rolling
+summary of older turns, recent history (newest first) and the top-k
+achievements retrieved for the question. History that no longer fits is folded into
+the session's rolling summary, written by the summary model
+(AI_CHAT_SUMMARY_MODEL), instead of being dropped. If that call fails the
+folded messages are appended as clipped excerpts instead.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# CJK ideographs, CJK/full-width punctuation
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+# Role markers etc. added by the chat template around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Section headings added by _render_context, and the "  N. " prefix per achievement
+SECTION_HEADINGS_TOKENS = 50
+ITEM_PREFIX_TOKENS = 3
+# Characters kept per message when it is appended as an excerpt (summary call failed)
+EXCERPT_CLIP_CHARS = 80
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Estimate the token count of text without calling the model
+
+    Counts one token per CJK character and one per four other characters.
+    Qwen's tokenizer merges common Chinese words, so this errs on the high
+    side, which is the safe direction for a budget.
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+@dataclass
+class PromptPlan:
+    """Result of ChatPromptBuilder.build()"""
+    student_context: str  # Appended to the system prompt
+    chat_history: List[Dict]  # [{"role", "content"}], oldest first
+    summary: Optional[str]  # Rolling summary after this turn
+    summarized_until: Optional[int]  # Id of the newest message folded into the summary
+    summary_changed: bool  # Whether summary / summarized_until need saving
+    accounting: Dict  # Estimated tokens per prompt part
+
+
+class ChatPromptBuilder:
+    """Token-budgeted prompt assembly for AI chat"""
+
+    def __init__(
+        self,
+        max_prompt_tokens: int,
+        summary_max_tokens: int,
+        history_max_messages: int,
+        retrieval_top_k: int
+    ):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.history_max_messages = history_max_messages
+        self.retrieval_top_k = retrieval_top_k
+
+    async def build(
+        self,
+        system_prompt: str,
+        context,
+        question: str,
+        history: Sequence[Dict],
+        summary: Optional[str] = None,
+        summarized_until: Optional[int] = None
+    ) -> PromptPlan:
+        """
+        Fit the prompt into max_prompt_tokens
+
+        Args:
+            system_prompt: Base system prompt
+            context: ChatContext of the student (see services.chat_context)
+            question: Current user message
+            history: Unsummarized earlier messages [{"id", "role", "content"}], oldest first
+            summary: Session's rolling summary so far
+            summarized_until: Id of the newest message already in the summary
+
+        Returns:
+            PromptPlan
+        """
+        fixed = (
+            estimate_tokens(system_prompt) + estimate_tokens(context.profile)
+            + estimate_tokens(context.statistics) + SECTION_HEADINGS_TOKENS
+            + 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+        question_tokens = estimate_tokens(question)
+        summary_tokens = estimate_tokens(summary)
+
+        # Recent history gets up to half of what the fixed parts leave, newest first
+        remaining = self.max_prompt_tokens - fixed - question_tokens - summary_tokens
+        history_budget = max(0, remaining // 2)
+        kept, history_tokens = [], 0
+        for message in reversed(history):
+            tokens = estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+            if len(kept) >= self.history_max_messages or history_tokens + tokens > history_budget:
+                break
+            kept.append(message)
+            history_tokens += tokens
+        kept.reverse()
+
+        # Older messages move into the rolling summary. When some have to, the
+        # older half of the kept window goes with them, so the summary model
+        # runs every few turns rather than on every turn
+        fold_count = len(history) - len(kept)
+        if fold_count:
+            fold_count += len(kept) // 2
+            kept = list(history[fold_count:])
+            history_tokens = sum(
+                estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in kept
+            )
+        folded = history[:fold_count]
+        summary_changed = bool(folded)
+        if folded:
+            summary = await self._fold(summary, folded)
+            summarized_until = folded[-1]["id"]
+            summary_tokens = estimate_tokens(summary)
+
+        # Retrieved achievements fill the rest, most relevant first
+        achievement_budget = max(
+            0, self.max_prompt_tokens - fixed - question_tokens - summary_tokens - history_tokens
+        )
+        selected, achievement_tokens = [], 0
+        for block in self.retrieve_achievements(question, context):
+            tokens = block.tokens + ITEM_PREFIX_TOKENS
+            if achievement_tokens + tokens <= achievement_budget:
+                selected.append(block)
+                achievement_tokens += tokens
+
+        # The per-part figures are estimates; drop the least relevant achievements
+        # while the rendered prompt still comes out over budget
+        while True:
+            student_context = self._render_context(context, selected, summary)
+            total = (
+                estimate_tokens(system_prompt) + estimate_tokens(student_context)
+                + history_tokens + question_tokens + 2 * MESSAGE_OVERHEAD_TOKENS
+            )
+            if total <= self.max_prompt_tokens or not selected:
+                break
+            achievement_tokens -= selected.pop().tokens + ITEM_PREFIX_TOKENS
+        accounting = {
+            "budget": self.max_prompt_tokens,
+            "total": total,
+            "fixed": fixed,
+            "question": question_tokens,
+            "summary": summary_tokens,
+            "history": history_tokens,
+            "achievements": achievement_tokens,
+            "history_messages": len(kept),
+            "folded_messages": len(folded),
+            "achievements_selected": len(selected),
+            "achievements_total": len(context.achievements),
+        }
+
+        return PromptPlan(
+            student_context=student_context,
+            chat_history=[{"role": m["role"], "content": m["content"]} for m in kept],
+            summary=summary,
+            summarized_until=summarized_until,
+            summary_changed=summary_changed,
+            accounting=accounting
+        )
+
+    def retrieve_achievements(self, question: str, context) -> List:
+        """
+        Top-k achievement blocks for the question from the context's BM25 index
+
+        Falls back to the newest achievements when the question matches none
+        (e.g. "帮我做个学习规划").
+        """
+        positions = context.index.search(question, self.retrieval_top_k)
+        if not positions:
+            return list(context.achievements[:self.retrieval_top_k])
+        return [context.achievements[position] for position in positions]
+
+    async def _fold(self, summary: Optional[str], messages: Sequence[Dict]) -> str:
+        """Summarize messages into the summary with the summary model, falling back to excerpts"""
+        from services.ai_chat_service import ai_chat_service
+        folded = await ai_chat_service.summarize_history(
+            summary, list(messages), max_tokens=self.summary_max_tokens
+        )
+        if folded:
+            return folded
+        logger.warning("AI chat summary unavailable, appending %d messages as excerpts", len(messages))
+        return self._append_excerpts(summary, messages)
+
+    def _append_excerpts(self, summary: Optional[str], messages: Sequence[Dict]) -> str:
+        """Append clipped messages to the summary, dropping its oldest lines beyond summary_max_tokens"""
+        lines = summary.split("\n") if summary else []
+        for message in messages:
+            speaker = "学生" if message["role"] == "user" else "助手"
+            lines.append(f"{speaker}：{_clip(message['content'], EXCERPT_CLIP_CHARS)}")
+
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_max_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def _render_context(self, context, selected: Sequence, summary: Optional[str]) -> str:
+        parts = []
+        if context.profile:
+            parts.append(context.profile)
+
+        total_count = len(context.achievements)
+        if total_count:
+            parts.append(f"\n学习成果详情（按与当前问题的相关度选取 {len(selected)}/{total_count} 项）：")
+            for i, block in enumerate(selected, 1):
+                parts.append(f"  {i}. {block.text}")
+            if total_count > len(selected):
+                parts.append(f"  ...以及其他 {total_count - len(selected)} 项成果（数量见成果统计）")
+
+        parts.append(f"\n{context.statistics}")
+
+        if summary:
+            parts.append(f"\n此前对话摘要：\n{summary}")
+
+        return "\n".join(parts)
+
+
+def log_turn(session_id: str, accounting: Dict, usage: Optional[Dict] = None):
+    """Log one chat turn's estimated prompt size by part, with the model's reported usage when known"""
+    actual = ""
+    if usage:
+        actual = (
+            f" actual_prompt={usage.get('prompt_tokens')}"
+            f" completion={usage.get('completion_tokens')}"
+        )
+    logger.info(
+        "AI chat prompt session=%s est_total=%d/%d fixed=%d question=%d summary=%d "
+        "history=%d(%d msgs, %d folded) achievements=%d(%d/%d)%s",
+        session_id, accounting["total"], accounting["budget"], accounting["fixed"],
+        accounting["question"], accounting["summary"], accounting["history"],
+        accounting["history_messages"], accounting["folded_messages"],
+        accounting["achievements"], accounting["achievements_selected"],
+        accounting["achievements_total"], actual
+    )
+    if accounting["total"] > accounting["budget"]:
+        logger.warning(
+            "AI chat prompt session=%s exceeds budget (%d > %d)",
+            session_id, accounting["total"], accounting["budget"]
+        )
+
+
+# Create singleton instance
+chat_prompt_builder = ChatPromptBuilder(
+    max_prompt_tokens=settings.AI_CHAT_MAX_PROMPT_TOKENS,
+    summary_max_tokens=settings.AI_CHAT_SUMMARY_MAX_TOKENS,
+    history_max_messages=settings.AI_CHAT_HISTORY_MAX_MESSAGES,
+    retrieval_top_k=settings.AI_CHAT_RETRIEVAL_TOP_K
+)
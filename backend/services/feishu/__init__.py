@@ -3,8 +3,14 @@ Feishu Services Package
 飞书集成服务层
 """
 
-from .feishu_client import FeishuClient
+from .feishu_client import FeishuClient, FeishuClientRegistry, feishu_client_registry, get_feishu_client
 from .data_mapper import DataMapper
 from .attachment_downloader import AttachmentDownloader
+from .import_engine import BulkImportEngine
+from .import_jobs import FeishuImportJobRunner, feishu_import_runner
 
-__all__ = ['FeishuClient', 'DataMapper', 'AttachmentDownloader']
+__all__ = [
+    'FeishuClient', 'FeishuClientRegistry', 'feishu_client_registry', 'get_feishu_client',
+    'DataMapper', 'AttachmentDownloader', 'BulkImportEngine',
+    'FeishuImportJobRunner', 'feishu_import_runner'
+]
@@ -2,17 +2,46 @@
 Attachment Downloader Service
 飞书附件下载服务，复用现有file_manager
 """
+import asyncio
+import os
+import uuid
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
+from urllib.parse import urlparse
 import httpx
 from datetime import datetime
 import logging
+from config import settings
 from services.file_manager import file_manager
-from services.feishu.feishu_client import FeishuClient
+from services.feishu.feishu_client import FeishuClient, get_feishu_client
 
 logger = logging.getLogger(__name__)
 
 
+class HostRateLimiter:
+    """按主机限速：同一主机的请求间隔不小于 1/rate 秒"""
+    
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot: Dict[str, float] = {}
+    
+    async def acquire(self, host: str):
+        """等待该主机的下一个可用时间片"""
+        if not self.interval:
+            return
+        
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.interval
+        
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+# 全局限速器（所有导入任务共享）
+download_rate_limiter = HostRateLimiter(settings.FEISHU_DOWNLOAD_RATE_PER_HOST)
+
+
 class AttachmentDownloader:
     """飞书附件下载器"""
     
@@ -25,6 +54,9 @@ class AttachmentDownloader:
         """
         self.feishu_client = feishu_client
         self.file_manager = file_manager
+        self.host = urlparse(feishu_client.base_url).netloc
+        self.max_retries = settings.FEISHU_DOWNLOAD_MAX_RETRIES
+        self.retry_backoff = settings.FEISHU_DOWNLOAD_RETRY_BACKOFF
     
     async def download_and_save(
         self, 
@@ -33,7 +65,7 @@ class AttachmentDownloader:
         filename_prefix: str = "feishu_cert"
     ) -> Tuple[Optional[str], bool, Optional[str]]:
         """
-        下载飞书附件并保存到本地
+        下载飞书附件并保存到本地（流式写盘，失败时指数退避重试）
         
         Args:
             file_token: 飞书文件token
@@ -43,50 +75,103 @@ class AttachmentDownloader:
         Returns:
             (本地文件URL, 是否成功, 飞书token用于重试)
         """
-        try:
-            # 步骤1: 下载文件内容
-            logger.info(f"开始下载飞书附件: {file_token}")
-            file_content = await self.feishu_client.download_file_content(file_token)
+        # 保存到学生目录，文件名带随机后缀避免并发下载时重名
+        student_dir = Path(self.file_manager.upload_dir) / "certificates" / f"student_{student_id}"
+        student_dir.mkdir(parents=True, exist_ok=True)
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base_name = f"{filename_prefix}_{timestamp}_{str(uuid.uuid4())[:8]}"
+        temp_path = student_dir / f"{base_name}.part"
+        
+        attempt = 0
+        while True:
+            attempt += 1
+            retryable = False
             
-            if not file_content:
-                logger.error(f"下载的文件内容为空: {file_token}")
-                return (None, False, file_token)
+            try:
+                # 步骤1: 流式下载到临时文件
+                logger.info(f"开始下载飞书附件: {file_token} (第{attempt}次)")
+                await download_rate_limiter.acquire(self.host)
+                size, head = await self.feishu_client.download_file_to_path(file_token, temp_path)
+                
+                if size == 0:
+                    logger.error(f"下载的文件内容为空: {file_token}")
+                    self._remove_quietly(temp_path)
+                    return (None, False, file_token)
+                
+                # 步骤2: 检测文件类型并重命名
+                file_ext = self._detect_file_extension(head)
+                filename = f"{base_name}.{file_ext}"
+                os.replace(temp_path, student_dir / filename)
+                
+                # 生成相对URL
+                relative_url = f"/uploads/certificates/student_{student_id}/{filename}"
+                
+                logger.info(f"✅ 附件下载成功: {file_token} -> {relative_url}")
+                return (relative_url, True, None)
             
-            # 步骤2: 检测文件类型
-            file_ext = self._detect_file_extension(file_content)
+            except httpx.HTTPStatusError as e:
+                status_code = e.response.status_code
+                retryable = status_code == 429 or status_code >= 500
+                logger.warning(f"⚠️ 下载失败 HTTP {status_code}: {file_token}")
             
-            # 步骤3: 保存到学生目录
-            student_dir = Path(self.file_manager.upload_dir) / "certificates" / f"student_{student_id}"
-            student_dir.mkdir(parents=True, exist_ok=True)
+            except httpx.TransportError as e:
+                retryable = True
+                logger.warning(f"⚠️ 网络错误，下载失败: {file_token} - {str(e)}")
             
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{filename_prefix}_{timestamp}.{file_ext}"
-            file_path = student_dir / filename
+            except Exception as e:
+                logger.error(f"❌ 下载附件失败: {file_token} - {str(e)}")
             
-            # 保存文件
-            with open(file_path, "wb") as f:
-                f.write(file_content)
+            self._remove_quietly(temp_path)
             
-            # 生成相对URL
-            relative_url = f"/uploads/certificates/student_{student_id}/{filename}"
+            if not retryable or attempt > self.max_retries:
+                return (None, False, file_token)
             
-            logger.info(f"✅ 附件下载成功: {file_token} -> {relative_url}")
-            return (relative_url, True, None)
+            await asyncio.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+    
+    async def download_many(
+        self,
+        tasks: List[Tuple[Any, str, int]],
+        concurrency: Optional[int] = None
+    ) -> Dict[Any, Tuple[Optional[str], bool, Optional[str]]]:
+        """
+        并发下载多个附件（有界并发）
+        
+        Args:
+            tasks: [(key, file_token, student_id), ...]，key用于把结果对应回数据行
+            concurrency: 最大并发下载数，默认 FEISHU_DOWNLOAD_CONCURRENCY
             
-        except httpx.HTTPError as e:
-            logger.warning(f"⚠️ 网络错误，下载失败: {file_token} - {str(e)}")
-            return (None, False, file_token)
+        Returns:
+            {key: (本地文件URL, 是否成功, 飞书token用于重试)}
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency or settings.FEISHU_DOWNLOAD_CONCURRENCY))
+        
+        async def run(key: Any, file_token: str, student_id: int):
+            async with semaphore:
+                return key, await self.download_and_save(file_token, student_id)
         
-        except Exception as e:
-            logger.error(f"❌ 下载附件失败: {file_token} - {str(e)}")
-            return (None, False, file_token)
+        results = await asyncio.gather(*(run(*task) for task in tasks))
+        
+        success_count = sum(1 for _, (_, success, _) in results if success)
+        logger.info(f"并发下载完成: 成功{success_count}/{len(tasks)}")
+        
+        return dict(results)
+    
+    @staticmethod
+    def _remove_quietly(path: Path):
+        """删除临时文件（忽略错误）"""
+        try:
+            if path.exists():
+                path.unlink()
+        except OSError:
+            pass
     
     def _detect_file_extension(self, file_content: bytes) -> str:
         """
         根据文件内容检测文件类型
         
         Args:
-            file_content: 文件字节内容
+            file_content: 文件字节内容（至少包含文件头）
             
         Returns:
             文件扩展名（不含点）
@@ -113,7 +198,7 @@ class AttachmentDownloader:
         student_id: int
     ) -> list[Tuple[str, Optional[str], bool]]:
         """
-        批量下载附件
+        批量下载附件（并发）
         
         Args:
             file_tokens: 文件token列表
@@ -122,21 +207,14 @@ class AttachmentDownloader:
         Returns:
             [(file_token, local_url, success), ...]
         """
-        results = []
+        downloaded = await self.download_many([
+            (idx, token, student_id) for idx, token in enumerate(file_tokens)
+        ])
         
-        for idx, token in enumerate(file_tokens, 1):
-            logger.info(f"批量下载进度: {idx}/{len(file_tokens)}")
-            local_url, success, retry_token = await self.download_and_save(
-                token, 
-                student_id,
-                filename_prefix=f"feishu_cert_{idx}"
-            )
-            results.append((token, local_url, success))
-        
-        success_count = sum(1 for _, _, success in results if success)
-        logger.info(f"批量下载完成: 成功{success_count}/{len(file_tokens)}")
-        
-        return results
+        return [
+            (token, downloaded[idx][0], downloaded[idx][1])
+            for idx, token in enumerate(file_tokens)
+        ]
 
 
 async def retry_failed_downloads(db_session) -> int:
@@ -150,7 +228,6 @@ async def retry_failed_downloads(db_session) -> int:
         成功重试的数量
     """
     from models import BizAchievement
-    from config import settings
     
     # 查找需要重试的记录
     failed_records = db_session.query(BizAchievement).filter(
@@ -163,7 +240,7 @@ async def retry_failed_downloads(db_session) -> int:
         return 0
     
     # 初始化飞书客户端和下载器
-    feishu_client = FeishuClient(
+    feishu_client = get_feishu_client(
         settings.FEISHU_APP_ID,
         settings.FEISHU_APP_SECRET
     )
@@ -171,21 +248,21 @@ async def retry_failed_downloads(db_session) -> int:
     
     success_count = 0
     
+    downloaded = await downloader.download_many([
+        (record.id, record.feishu_attachment_token, record.student_id)
+        for record in failed_records
+    ])
+    
     for record in failed_records:
-        try:
-            local_url, success, _ = await downloader.download_and_save(
-                record.feishu_attachment_token,
-                record.student_id
-            )
-            
-            if success and local_url:
-                record.evidence_url = local_url
-                record.feishu_attachment_token = None  # 清除token
-                success_count += 1
-                logger.info(f"✅ 重试成功: Achievement#{record.id}")
-            
-        except Exception as e:
-            logger.error(f"重试失败: Achievement#{record.id} - {str(e)}")
+        local_url, success, _ = downloaded[record.id]
+        
+        if success and local_url:
+            record.evidence_url = local_url
+            record.feishu_attachment_token = None  # 清除token
+            success_count += 1
+            logger.info(f"✅ 重试成功: Achievement#{record.id}")
+        else:
+            logger.error(f"重试失败: Achievement#{record.id}")
     
     # 提交更新
     db_session.commit()
@@ -5,7 +5,7 @@ Data Mapper Service
 from typing import Dict, List, Any, Tuple, Optional
 from datetime import datetime
 from sqlalchemy.orm import Session
-from models import SysTeacher, SysStudent
+from models import SysTeacher, SysStudent, FeishuFieldMapping
 import logging
 import re
 
@@ -405,3 +405,29 @@ def create_default_mappings() -> List[Dict[str, Any]]:
             "display_order": 9
         }
     ]
+
+
+def get_or_create_default_mappings(db: Session, config_id: int) -> List[FeishuFieldMapping]:
+    """获取或创建默认字段映射"""
+    # 检查是否已存在
+    existing = db.query(FeishuFieldMapping).filter(
+        FeishuFieldMapping.config_id == config_id
+    ).all()
+    
+    if existing:
+        return existing
+    
+    # 创建默认映射
+    default_configs = create_default_mappings()
+    mappings = []
+    
+    for cfg in default_configs:
+        mapping = FeishuFieldMapping(
+            config_id=config_id,
+            **cfg
+        )
+        db.add(mapping)
+        mappings.append(mapping)
+    
+    db.commit()
+    return mappings
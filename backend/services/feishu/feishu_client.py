@@ -2,69 +2,184 @@
 Feishu Client Service
 飞书API客户端，封装飞书SDK调用
 """
+import asyncio
+import json
+import sqlite3
+import threading
+import aiofiles
 import httpx
-from typing import List, Dict, Any, Optional
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from datetime import datetime, timedelta
 import logging
+from config import settings
 
 logger = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401  HTTP/2 support for httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class TenantTokenCache:
+    """
+    tenant_access_token缓存
+    进程内字典 + 可选的本地SQLite文件，同一主机上的多个worker共享token
+    """
+    
+    def __init__(self, db_path: str = ""):
+        self._tokens: Dict[str, Tuple[str, datetime]] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS feishu_tokens ("
+                "app_id TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at TEXT NOT NULL)"
+            )
+            self._conn.commit()
+    
+    def get(self, app_id: str, refresh_window: timedelta = timedelta(0)) -> Optional[Tuple[str, datetime]]:
+        """
+        获取缓存的 (token, 过期时间)，只返回距过期超过refresh_window的token
+        
+        进程内缓存缺失或进入刷新窗口时重新读取SQLite：其他worker可能已刷新过，
+        只有SQLite中的token也需要刷新时才返回None（由调用方向飞书请求新token）
+        """
+        deadline = datetime.now() + refresh_window
+        with self._lock:
+            cached = self._tokens.get(app_id)
+            if cached and cached[1] > deadline:
+                return cached
+            if not self._conn:
+                return None
+            
+            row = self._conn.execute(
+                "SELECT token, expires_at FROM feishu_tokens WHERE app_id = ?", (app_id,)
+            ).fetchone()
+            if not row:
+                return None
+            
+            shared = (row[0], datetime.fromisoformat(row[1]))
+            if shared[1] <= deadline:
+                return None
+            self._tokens[app_id] = shared
+            return shared
+    
+    def set(self, app_id: str, token: str, expires_at: datetime):
+        """写入token"""
+        with self._lock:
+            self._tokens[app_id] = (token, expires_at)
+            if self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO feishu_tokens (app_id, token, expires_at) VALUES (?, ?, ?)",
+                    (app_id, token, expires_at.isoformat())
+                )
+                self._conn.commit()
+    
+    def invalidate(self, app_id: str):
+        """删除token（如密钥变更）"""
+        with self._lock:
+            self._tokens.pop(app_id, None)
+            if self._conn:
+                self._conn.execute("DELETE FROM feishu_tokens WHERE app_id = ?", (app_id,))
+                self._conn.commit()
+
+
+# 全局token缓存
+tenant_token_cache = TenantTokenCache(settings.FEISHU_TOKEN_CACHE_PATH)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """创建带连接池的HTTP客户端（keep-alive，可用时启用HTTP/2）"""
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=30.0,
+        limits=httpx.Limits(
+            max_connections=settings.FEISHU_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.FEISHU_MAX_CONNECTIONS,
+            keepalive_expiry=60.0
+        )
+    )
+
 
 class FeishuClient:
     """飞书API客户端"""
     
-    def __init__(self, app_id: str, app_secret: str):
+    def __init__(
+        self,
+        app_id: str,
+        app_secret: str,
+        http_client: Optional[httpx.AsyncClient] = None,
+        token_cache: Optional[TenantTokenCache] = None
+    ):
         """
         初始化飞书客户端
         
         Args:
             app_id: 飞书应用ID
             app_secret: 飞书应用密钥
+            http_client: 共享的HTTP客户端（为空时自行创建）
+            token_cache: 共享的token缓存（为空时使用全局缓存）
         """
         self.app_id = app_id
         self.app_secret = app_secret
         self.base_url = "https://open.feishu.cn/open-apis"
         
-        # Token缓存
-        self._access_token: Optional[str] = None
-        self._token_expires_at: Optional[datetime] = None
+        # 复用连接池，避免每次请求重新建立TCP/TLS连接
+        self.http_client = http_client or create_http_client()
+        self.token_cache = token_cache or tenant_token_cache
+        self._token_lock = asyncio.Lock()
     
     async def get_access_token(self) -> str:
         """
         获取tenant_access_token（企业级访问凭证）
-        Token有效期2小时，自动缓存和刷新
+        Token有效期2小时，自动缓存和刷新（跨请求、跨worker共享）
         
         Returns:
             str: Access token
         """
-        # 检查缓存是否有效（提前30分钟刷新）
-        now = datetime.now()
-        if self._access_token and self._token_expires_at:
-            if now < self._token_expires_at - timedelta(minutes=30):
-                return self._access_token
-        
-        # 获取新token
-        url = f"{self.base_url}/auth/v3/tenant_access_token/internal"
-        payload = {
-            "app_id": self.app_id,
-            "app_secret": self.app_secret
-        }
+        token = self._get_cached_token()
+        if token:
+            return token
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, json=payload)
+        # 同一时刻只发起一次刷新请求
+        async with self._token_lock:
+            token = self._get_cached_token()
+            if token:
+                return token
+            
+            # 获取新token
+            now = datetime.now()
+            url = f"{self.base_url}/auth/v3/tenant_access_token/internal"
+            payload = {
+                "app_id": self.app_id,
+                "app_secret": self.app_secret
+            }
+            
+            response = await self.http_client.post(url, json=payload, timeout=30.0)
             result = response.json()
             
             if result.get("code") == 0:
-                self._access_token = result["tenant_access_token"]
-                # Token有效期2小时
-                self._token_expires_at = now + timedelta(hours=2)
+                access_token = result["tenant_access_token"]
+                # Token有效期以飞书返回为准（默认2小时）
+                expires_at = now + timedelta(seconds=result.get("expire", 7200))
+                self.token_cache.set(self.app_id, access_token, expires_at)
                 logger.info("飞书Access Token获取成功")
-                return self._access_token
+                return access_token
             else:
                 error_msg = result.get("msg", "Unknown error")
                 logger.error(f"获取飞书Access Token失败: {error_msg}")
                 raise Exception(f"获取飞书Access Token失败: {error_msg}")
     
+    def _get_cached_token(self) -> Optional[str]:
+        """返回仍有效的缓存token（提前30分钟刷新）"""
+        cached = self.token_cache.get(self.app_id, refresh_window=timedelta(minutes=30))
+        return cached[0] if cached else None
+    
     async def list_tables(self, app_token: str) -> List[Dict[str, Any]]:
         """
         列出多维表格中的所有数据表
@@ -83,24 +198,127 @@ class FeishuClient:
             "Content-Type": "application/json"
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url, headers=headers)
+        response = await self.http_client.get(url, headers=headers, timeout=30.0)
+        result = response.json()
+        
+        if result.get("code") == 0:
+            tables = result.get("data", {}).get("items", [])
+            return [
+                {
+                    "table_id": table.get("table_id"),
+                    "name": table.get("name"),
+                    "record_count": 0  # 飞书API不直接返回记录数
+                }
+                for table in tables
+            ]
+        else:
+            error_msg = result.get("msg", "Unknown error")
+            logger.error(f"获取飞书表格列表失败: {error_msg}")
+            raise Exception(f"获取表格列表失败: {error_msg}")
+    
+    async def iter_record_pages(
+        self,
+        app_token: str,
+        table_id: str,
+        page_size: int = 100,
+        view_id: Optional[str] = None,
+        filter_formula: Optional[str] = None,
+        page_token: Optional[str] = None,
+        automatic_fields: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        逐页获取数据表记录（异步生成器），每页到达即返回，不在内存中累积整表
+        
+        Args:
+            app_token: 多维表格app_token
+            table_id: 数据表table_id
+            page_size: 每页记录数（最大500）
+            view_id: 可选的视图ID
+            filter_formula: 可选的服务端筛选公式，如 CurrentValue.[学生姓名]="张三"
+            page_token: 可选的起始分页标记（用于断点续传）
+            automatic_fields: 是否返回 created_time / last_modified_time 等系统字段（增量同步使用）
+            
+        Yields:
+            {"items": 本页记录, "page_token": 下一页标记, "has_more": 是否还有下一页, "total": 记录总数}
+        """
+        url = f"{self.base_url}/bitable/v1/apps/{app_token}/tables/{table_id}/records"
+        has_more = True
+        fetched = 0
+        
+        while has_more:
+            # 每页重新取token，长时间遍历时可自动刷新
+            token = await self.get_access_token()
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"
+            }
+            
+            params = {
+                "page_size": min(page_size, 500)  # 飞书限制最大500
+            }
+            if page_token:
+                params["page_token"] = page_token
+            if view_id:
+                params["view_id"] = view_id
+            if filter_formula:
+                params["filter"] = filter_formula
+            if automatic_fields:
+                params["automatic_fields"] = "true"
+            
+            response = await self.http_client.get(url, headers=headers, params=params, timeout=60.0)
             result = response.json()
             
-            if result.get("code") == 0:
-                tables = result.get("data", {}).get("items", [])
-                return [
-                    {
-                        "table_id": table.get("table_id"),
-                        "name": table.get("name"),
-                        "record_count": 0  # 飞书API不直接返回记录数
-                    }
-                    for table in tables
-                ]
-            else:
+            if result.get("code") != 0:
                 error_msg = result.get("msg", "Unknown error")
-                logger.error(f"获取飞书表格列表失败: {error_msg}")
-                raise Exception(f"获取表格列表失败: {error_msg}")
+                logger.error(f"获取飞书记录失败: {error_msg}")
+                raise Exception(f"获取记录失败: {error_msg}")
+            
+            data = result.get("data", {})
+            items = data.get("items") or []
+            has_more = data.get("has_more", False)
+            page_token = data.get("page_token")
+            fetched += len(items)
+            
+            logger.info(f"已获取 {len(items)} 条记录，总计 {fetched} 条")
+            yield {"items": items, "page_token": page_token, "has_more": has_more, "total": data.get("total")}
+    
+    async def iter_records(
+        self,
+        app_token: str,
+        table_id: str,
+        limit: Optional[int] = None,
+        page_size: int = 500,
+        view_id: Optional[str] = None,
+        filter_formula: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        逐条获取数据表记录，达到limit后立即停止（不再请求后续页）
+        
+        Args:
+            app_token: 多维表格app_token
+            table_id: 数据表table_id
+            limit: 最多返回的记录数，None表示全部
+            page_size: 每页记录数（最大500）
+            view_id: 可选的视图ID
+            filter_formula: 可选的服务端筛选公式
+            
+        Yields:
+            单条记录
+        """
+        if limit is not None:
+            if limit <= 0:
+                return
+            page_size = min(page_size, limit)
+        
+        count = 0
+        async for page in self.iter_record_pages(
+            app_token, table_id, page_size=page_size, view_id=view_id, filter_formula=filter_formula
+        ):
+            for item in page["items"]:
+                yield item
+                count += 1
+                if limit is not None and count >= limit:
+                    return
     
     async def get_table_records(
         self, 
@@ -111,6 +329,7 @@ class FeishuClient:
     ) -> List[Dict[str, Any]]:
         """
         获取数据表的所有记录
+        大表请优先使用 iter_record_pages / iter_records
         
         Args:
             app_token: 多维表格app_token
@@ -121,56 +340,65 @@ class FeishuClient:
         Returns:
             记录列表
         """
+        all_records = []
+        async for page in self.iter_record_pages(app_token, table_id, page_size=page_size, view_id=view_id):
+            all_records.extend(page["items"])
+        
+        return all_records
+    
+    async def get_file_download_url(self, file_token: str) -> str:
+        """
+        获取附件的临时下载链接
+        
+        Args:
+            file_token: 文件token
+            
+        Returns:
+            临时下载URL（有效期约1小时）
+        """
         token = await self.get_access_token()
-        url = f"{self.base_url}/bitable/v1/apps/{app_token}/tables/{table_id}/records"
+        url = f"{self.base_url}/drive/v1/medias/{file_token}/download"
         
         headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
+            "Authorization": f"Bearer {token}"
         }
         
-        all_records = []
-        page_token = None
-        has_more = True
+        # 飞书下载API会302重定向到真实下载地址
+        response = await self.http_client.get(url, headers=headers, follow_redirects=False, timeout=30.0)
         
-        while has_more:
-            params = {
-                "page_size": min(page_size, 500)  # 飞书限制最大500
-            }
-            if page_token:
-                params["page_token"] = page_token
-            if view_id:
-                params["view_id"] = view_id
-            
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.get(url, headers=headers, params=params)
+        if response.status_code in [200, 302]:
+            # 302重定向时，Location头包含真实下载地址
+            if response.status_code == 302:
+                download_url = response.headers.get("Location")
+                logger.info(f"获取附件下载链接成功: {file_token}")
+                return download_url
+            else:
+                # 某些情况下直接返回200，需要从响应体解析
                 result = response.json()
-                
                 if result.get("code") == 0:
-                    data = result.get("data", {})
-                    items = data.get("items", [])
-                    all_records.extend(items)
-                    
-                    has_more = data.get("has_more", False)
-                    page_token = data.get("page_token")
-                    
-                    logger.info(f"已获取 {len(items)} 条记录，总计 {len(all_records)} 条")
-                else:
-                    error_msg = result.get("msg", "Unknown error")
-                    logger.error(f"获取飞书记录失败: {error_msg}")
-                    raise Exception(f"获取记录失败: {error_msg}")
+                    # 注意：飞书drive API可能直接返回文件内容
+                    # 这里返回原始URL供后续下载
+                    return url
         
-        return all_records
+        # 错误处理
+        try:
+            result = response.json()
+            error_msg = result.get("msg", "Unknown error")
+        except:
+            error_msg = f"HTTP {response.status_code}"
+        
+        logger.error(f"获取附件下载链接失败: {error_msg}")
+        raise Exception(f"获取附件下载链接失败: {error_msg}")
     
-    async def get_file_download_url(self, file_token: str) -> str:
+    async def download_file_content(self, file_token: str) -> bytes:
         """
-        获取附件的临时下载链接
+        直接下载文件内容
         
         Args:
             file_token: 文件token
             
         Returns:
-            临时下载URL（有效期约1小时）
+            文件字节内容
         """
         token = await self.get_access_token()
         url = f"{self.base_url}/drive/v1/medias/{file_token}/download"
@@ -179,43 +407,42 @@ class FeishuClient:
             "Authorization": f"Bearer {token}"
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # 飞书下载API会302重定向到真实下载地址
-            response = await client.get(url, headers=headers, follow_redirects=False)
-            
-            if response.status_code in [200, 302]:
-                # 302重定向时，Location头包含真实下载地址
-                if response.status_code == 302:
-                    download_url = response.headers.get("Location")
-                    logger.info(f"获取附件下载链接成功: {file_token}")
-                    return download_url
-                else:
-                    # 某些情况下直接返回200，需要从响应体解析
-                    result = response.json()
-                    if result.get("code") == 0:
-                        # 注意：飞书drive API可能直接返回文件内容
-                        # 这里返回原始URL供后续下载
-                        return url
-            
-            # 错误处理
-            try:
+        response = await self.http_client.get(url, headers=headers, follow_redirects=True, timeout=60.0)
+        
+        if response.status_code == 200:
+            # 检查Content-Type，确保是文件内容
+            content_type = response.headers.get("Content-Type", "")
+            if "application/json" in content_type:
+                # 可能是错误响应
                 result = response.json()
-                error_msg = result.get("msg", "Unknown error")
-            except:
-                error_msg = f"HTTP {response.status_code}"
+                if result.get("code") != 0:
+                    error_msg = result.get("msg", "Unknown error")
+                    raise Exception(f"下载文件失败: {error_msg}")
             
-            logger.error(f"获取附件下载链接失败: {error_msg}")
-            raise Exception(f"获取附件下载链接失败: {error_msg}")
+            logger.info(f"文件下载成功: {file_token}, 大小: {len(response.content)} bytes")
+            return response.content
+        else:
+            raise Exception(f"下载文件失败: HTTP {response.status_code}")
     
-    async def download_file_content(self, file_token: str) -> bytes:
+    async def download_file_to_path(
+        self,
+        file_token: str,
+        dest_path: Path,
+        chunk_size: int = 65536
+    ) -> Tuple[int, bytes]:
         """
-        直接下载文件内容
+        流式下载文件到本地路径，不在内存中保存整个文件
         
         Args:
             file_token: 文件token
+            dest_path: 目标文件路径
+            chunk_size: 每次写入的块大小
             
         Returns:
-            文件字节内容
+            (写入字节数, 文件头部字节，用于检测文件类型)
+            
+        Raises:
+            httpx.HTTPStatusError: 非200响应（调用方可据状态码决定是否重试）
         """
         token = await self.get_access_token()
         url = f"{self.base_url}/drive/v1/medias/{file_token}/download"
@@ -224,23 +451,38 @@ class FeishuClient:
             "Authorization": f"Bearer {token}"
         }
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.get(url, headers=headers, follow_redirects=True)
+        size = 0
+        head = b""
+        
+        async with self.http_client.stream(
+            "GET", url, headers=headers, follow_redirects=True, timeout=60.0
+        ) as response:
+            if response.status_code != 200:
+                response.raise_for_status()
             
-            if response.status_code == 200:
-                # 检查Content-Type，确保是文件内容
-                content_type = response.headers.get("Content-Type", "")
-                if "application/json" in content_type:
-                    # 可能是错误响应
-                    result = response.json()
-                    if result.get("code") != 0:
-                        error_msg = result.get("msg", "Unknown error")
-                        raise Exception(f"下载文件失败: {error_msg}")
+            # 检查Content-Type，JSON通常是错误响应
+            content_type = response.headers.get("Content-Type", "")
+            if "application/json" in content_type:
+                body = await response.aread()
+                result = json.loads(body)
+                if result.get("code") != 0:
+                    error_msg = result.get("msg", "Unknown error")
+                    raise Exception(f"下载文件失败: {error_msg}")
                 
-                logger.info(f"文件下载成功: {file_token}, 大小: {len(response.content)} bytes")
-                return response.content
-            else:
-                raise Exception(f"下载文件失败: HTTP {response.status_code}")
+                async with aiofiles.open(dest_path, "wb") as f:
+                    await f.write(body)
+                return len(body), body[:16]
+            
+            async with aiofiles.open(dest_path, "wb") as f:
+                async for chunk in response.aiter_bytes(chunk_size):
+                    # 保留前16字节用于类型检测
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    await f.write(chunk)
+                    size += len(chunk)
+        
+        logger.info(f"文件下载成功: {file_token}, 大小: {size} bytes")
+        return size, head
     
     async def test_connection(self) -> bool:
         """
@@ -255,3 +497,69 @@ class FeishuClient:
         except Exception as e:
             logger.error(f"飞书连接测试失败: {str(e)}")
             return False
+
+
+class FeishuClientRegistry:
+    """
+    应用级飞书客户端注册表
+    每个app_id共享一个连接池和token缓存，避免每次请求重新握手和鉴权
+    """
+    
+    def __init__(self):
+        self._clients: Dict[str, FeishuClient] = {}
+        # 密钥变更后被替换的客户端：可能仍有导入任务在使用，留到应用关闭时再关闭
+        self._retired: List[FeishuClient] = []
+    
+    def get_client(self, app_id: str, app_secret: str) -> FeishuClient:
+        """
+        获取app_id对应的共享客户端
+        
+        Args:
+            app_id: 飞书应用ID
+            app_secret: 飞书应用密钥（变更后会重建客户端并丢弃旧token）
+            
+        Returns:
+            FeishuClient实例
+        """
+        client = self._clients.get(app_id)
+        if client and client.app_secret == app_secret:
+            return client
+        
+        if client:
+            tenant_token_cache.invalidate(app_id)
+            self._retired.append(client)
+        
+        client = FeishuClient(app_id, app_secret, http_client=create_http_client())
+        self._clients[app_id] = client
+        return client
+    
+    async def close_all(self):
+        """关闭所有连接池（应用关闭时调用）"""
+        for client in [*self._clients.values(), *self._retired]:
+            await client.http_client.aclose()
+        self._clients.clear()
+        self._retired.clear()
+
+
+# 全局注册表
+feishu_client_registry = FeishuClientRegistry()
+
+
+def get_feishu_client(app_id: str, app_secret: str) -> FeishuClient:
+    """获取共享的飞书客户端"""
+    return feishu_client_registry.get_client(app_id, app_secret)
+
+
+def build_equals_filter(field_name: str, value: str) -> str:
+    """
+    构造飞书多维表格的等值筛选公式
+    
+    Args:
+        field_name: 字段名，如 学生姓名
+        value: 目标值
+        
+    Returns:
+        筛选公式，如 CurrentValue.[学生姓名]="张三"
+    """
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'CurrentValue.[{field_name}]="{escaped}"'
@@ -0,0 +1,246 @@
+"""
+Bulk Import Engine
+飞书成果批量导入引擎：分批验证、多行INSERT/批量UPDATE、按块提交
+"""
+from typing import Dict, List, Any, Iterable, Tuple, Callable
+from datetime import datetime
+from sqlalchemy import insert, update, bindparam
+from sqlalchemy.orm import Session
+import logging
+
+from config import settings
+from models import BizAchievement, AchievementStatus
+from services.feishu.data_mapper import DataMapper
+
+logger = logging.getLogger(__name__)
+
+# 由飞书记录映射而来的内容列；任一列或附件变化才视为内容变化
+CONTENT_COLUMNS = ("student_id", "teacher_id", "title", "type", "content_json")
+
+
+class BulkImportEngine:
+    """成果批量导入引擎"""
+
+    def __init__(self, db: Session, mapper: DataMapper, chunk_size: int = None):
+        """
+        初始化导入引擎
+
+        Args:
+            db: 数据库session
+            mapper: 数据映射器
+            chunk_size: 每个INSERT语句/事务的行数
+        """
+        self.db = db
+        self.mapper = mapper
+        self.chunk_size = max(1, chunk_size or settings.FEISHU_IMPORT_CHUNK_SIZE)
+        self.table = BizAchievement.__table__
+
+    def prepare(
+        self,
+        records: Iterable[Tuple[int, Dict[str, Any]]],
+        skip_invalid: bool = True
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        映射并验证记录，生成待插入的行
+
+        Args:
+            records: [(行号, 飞书记录), ...]
+            skip_invalid: 是否跳过无效记录
+
+        Returns:
+            (待插入行列表, 失败结果列表)
+            待插入行格式: {"row": 行号, "values": 列值, "file_token": 附件token,
+                          "record_id": 飞书记录ID, "modified_at": 飞书最后修改时间}
+        """
+        prepared = []
+        failures = []
+
+        for idx, record in records:
+            fields = record.get("fields", {})
+            transformed, errors = self.mapper.transform_record(fields)
+
+            # 跳过无效记录
+            if errors and skip_invalid:
+                failures.append({"row": idx, "status": "failed", "error": "; ".join(errors)})
+                continue
+
+            try:
+                values = self.build_values(transformed)
+            except (KeyError, ValueError) as e:
+                failures.append({"row": idx, "status": "failed", "error": f"缺少字段或字段无效: {str(e)}"})
+                continue
+
+            file_token = None
+            attachments = fields.get("证书附件", [])
+            if attachments and len(attachments) > 0:
+                file_token = attachments[0].get("file_token")
+
+            prepared.append({
+                "row": idx,
+                "values": values,
+                "file_token": file_token,
+                "record_id": record.get("record_id"),
+                "modified_at": record.get("last_modified_time")
+            })
+
+        return prepared, failures
+
+    def build_values(self, transformed: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将映射后的数据转换为 biz_achievements 列值
+
+        多行INSERT不会逐行执行ORM默认值，这里显式填充所有列
+        """
+        title = transformed["title"]
+        if len(title) > 200:
+            raise ValueError("成果标题超过200字符")
+
+        return {
+            "student_id": transformed["student_id"],
+            "teacher_id": transformed["teacher_id"],
+            "title": title,
+            "type": transformed.get("type", ""),
+            "content_json": {
+                "date": transformed.get("date"),
+                "award_level": transformed.get("level"),
+                "award": transformed.get("award"),
+                "issuer": transformed.get("issuer"),
+                "certificate_number": transformed.get("certificate_number")
+            },
+            "evidence_url": None,
+            "feishu_attachment_token": None,
+            "status": AchievementStatus.PENDING,
+            "audit_comment": None,
+            "is_deleted": False,
+            "created_at": datetime.utcnow()
+        }
+
+    def has_changes(self, row: Dict[str, Any], achievement: BizAchievement, file_token: str = None) -> bool:
+        """
+        映射后的内容与已导入的成果相比是否有变化
+
+        Args:
+            row: prepare() 返回的行
+            achievement: 该记录已导入的成果
+            file_token: 上次导入的附件token
+        """
+        if row["file_token"] != file_token:
+            return True
+        return any(
+            row["values"][column] != getattr(achievement, column)
+            for column in CONTENT_COLUMNS
+        )
+
+    def insert(self, rows: List[Dict[str, Any]], commit: bool = True) -> List[Dict[str, Any]]:
+        """
+        分块插入，每块一个多行INSERT + 保存点，并单独提交
+        某块失败时回滚该块并逐行重试，只有真正出错的行记为失败
+
+        Args:
+            rows: prepare() 返回的待插入行
+            commit: 是否每块提交；为False时只用保存点，由调用方与进度检查点一起提交
+
+        Returns:
+            每行的导入结果 {"row", "status", "achievement_id" / "error"}
+        """
+        return self._write_chunks(
+            rows,
+            lambda chunk: self._insert_chunk([r["values"] for r in chunk]),
+            commit
+        )
+
+    def update(self, rows: List[Dict[str, Any]], commit: bool = True) -> List[Dict[str, Any]]:
+        """
+        分块更新已导入的成果（executemany UPDATE），用于增量同步
+        只应传入内容有变化的行（见 has_changes()），这些成果重新进入待审核状态；
+        内容未变化的记录由调用方跳过，审核状态和审核意见保持不变
+
+        Args:
+            rows: prepare() 返回的行，附加 "achievement_id"
+            commit: 同 insert()
+
+        Returns:
+            每行的导入结果，格式同 insert()
+        """
+        return self._write_chunks(rows, self._update_chunk, commit)
+
+    def _write_chunks(
+        self,
+        rows: List[Dict[str, Any]],
+        write_chunk: Callable[[List[Dict[str, Any]]], List[int]],
+        commit: bool
+    ) -> List[Dict[str, Any]]:
+        results = []
+
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+
+            try:
+                with self.db.begin_nested():
+                    ids = write_chunk(chunk)
+                if commit:
+                    self.db.commit()
+
+                results.extend(
+                    {"row": r["row"], "status": "success", "achievement_id": achievement_id}
+                    for r, achievement_id in zip(chunk, ids)
+                )
+            except Exception as e:
+                logger.warning(f"批量写入第{chunk[0]['row']}-{chunk[-1]['row']}行失败，逐行重试: {str(e)}")
+                results.extend(self._write_rows_individually(chunk, write_chunk, commit))
+
+        return results
+
+    def _insert_chunk(self, values: List[Dict[str, Any]]) -> List[int]:
+        """
+        执行一条多行INSERT并返回新ID（与values顺序一致）
+        """
+        stmt = insert(self.table).values(values)
+        dialect = self.db.get_bind().dialect
+
+        if getattr(dialect, "insert_returning", False):
+            result = self.db.execute(stmt.returning(self.table.c.id))
+            return [row[0] for row in result]
+
+        # MySQL: 单条多行INSERT属于"simple insert"，自增ID连续分配，
+        # LAST_INSERT_ID() 返回第一行ID
+        result = self.db.execute(stmt)
+        first_id = result.lastrowid
+        return list(range(first_id, first_id + len(values)))
+
+    def _update_chunk(self, chunk: List[Dict[str, Any]]) -> List[int]:
+        """按主键批量UPDATE（一条语句executemany）"""
+        params = []
+        for r in chunk:
+            values = {
+                key: value for key, value in r["values"].items()
+                if key not in ("created_at", "is_deleted")
+            }
+            values["_achievement_id"] = r["achievement_id"]
+            params.append(values)
+
+        stmt = update(self.table).where(self.table.c.id == bindparam("_achievement_id"))
+        self.db.execute(stmt, params)
+        return [r["achievement_id"] for r in chunk]
+
+    def _write_rows_individually(
+        self,
+        chunk: List[Dict[str, Any]],
+        write_chunk: Callable[[List[Dict[str, Any]]], List[int]],
+        commit: bool
+    ) -> List[Dict[str, Any]]:
+        """逐行写入（每行一个保存点），用于隔离失败块中的坏数据"""
+        results = []
+
+        for r in chunk:
+            try:
+                with self.db.begin_nested():
+                    achievement_id = write_chunk([r])[0]
+                results.append({"row": r["row"], "status": "success", "achievement_id": achievement_id})
+            except Exception as e:
+                logger.error(f"导入第{r['row']}行失败: {str(e)}")
+                results.append({"row": r["row"], "status": "failed", "error": str(e)})
+
+        if commit:
+            self.db.commit()
+        return results
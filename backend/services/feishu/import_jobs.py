@@ -0,0 +1,518 @@
+"""
+Feishu Import Jobs
+飞书导入后台任务：逐页导入并写入进度检查点，进程中断后从检查点续传
+"""
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+import asyncio
+import logging
+
+from config import settings
+from database import SessionLocal
+from models import BizAchievement, FeishuConfig, FeishuImportLog, FeishuRecordMapping, FeishuSyncState
+from services.feishu.feishu_client import get_feishu_client
+from services.feishu.data_mapper import DataMapper, get_or_create_default_mappings
+from services.feishu.attachment_downloader import AttachmentDownloader
+from services.feishu.import_engine import BulkImportEngine
+from services.chat_context import context_version_bump
+
+logger = logging.getLogger(__name__)
+
+# 任务状态（保存在 feishu_import_logs.status）
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+UNFINISHED_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+# 导入模式
+MODE_FULL = "full"  # 处理所有记录（已导入的记录更新，不重复插入）
+MODE_INCREMENTAL = "incremental"  # 只处理上次同步后修改过的记录
+
+
+class FeishuImportJobRunner:
+    """飞书导入后台任务执行器"""
+
+    def __init__(
+        self,
+        concurrency: int,
+        page_size: int,
+        stale_seconds: int,
+        watermark_overlap_seconds: int = 300
+    ):
+        """
+        初始化任务执行器
+
+        Args:
+            concurrency: 本进程同时执行的导入任务数
+            page_size: 每页拉取的记录数（每页一个检查点）
+            stale_seconds: 运行中任务超过该时间无进度更新则视为中断，可被接管续传
+            watermark_overlap_seconds: 水位线回退秒数，容忍服务器与飞书的时钟偏差
+        """
+        self.concurrency = max(1, concurrency)
+        self.page_size = page_size
+        self.stale_seconds = stale_seconds
+        self.watermark_overlap_seconds = watermark_overlap_seconds
+
+        # 在事件循环中延迟创建
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._watchdog: Optional[asyncio.Task] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def start(self):
+        """启动巡检任务，接管中断的导入任务（崩溃/重启后续传）"""
+        if self._watchdog:
+            return
+        self._watchdog = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        """取消执行中的任务（未提交的当前页会回滚，重启后从检查点续传）"""
+        tasks = list(self._tasks.values())
+        if self._watchdog:
+            tasks.append(self._watchdog)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = {}
+        self._watchdog = None
+
+    def submit(self, log_id: int):
+        """
+        在后台执行导入任务
+
+        Args:
+            log_id: 状态为queued的导入日志ID
+        """
+        if log_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(log_id))
+        self._tasks[log_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(log_id, None))
+
+    async def _watch(self):
+        """定期查找无人处理的未完成任务"""
+        while True:
+            try:
+                stale_ids = await asyncio.to_thread(self._find_stale_jobs)
+                for log_id in stale_ids:
+                    logger.info(f"接管中断的导入任务: {log_id}")
+                    self.submit(log_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"巡检导入任务失败: {str(e)}")
+
+            await asyncio.sleep(max(self.stale_seconds / 2, 5))
+
+    def _find_stale_jobs(self) -> List[int]:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        db = SessionLocal()
+        try:
+            return [
+                row.id for row in db.query(FeishuImportLog.id).filter(
+                    FeishuImportLog.status.in_(UNFINISHED_STATUSES),
+                    FeishuImportLog.updated_at < cutoff
+                ).all()
+            ]
+        finally:
+            db.close()
+
+    def _claim(self, db: Session, log_id: int) -> Optional[FeishuImportLog]:
+        """
+        原子地把任务标记为running，多个worker同时接管时只有一个成功
+
+        Returns:
+            接管成功时返回导入日志，否则返回None
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        claimed = db.query(FeishuImportLog).filter(
+            FeishuImportLog.id == log_id,
+            FeishuImportLog.status.in_(UNFINISHED_STATUSES),
+            or_(FeishuImportLog.status == JOB_QUEUED, FeishuImportLog.updated_at < cutoff)
+        ).update(
+            {"status": JOB_RUNNING, "updated_at": datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.commit()
+        if claimed != 1:
+            return None
+        return db.query(FeishuImportLog).filter(FeishuImportLog.id == log_id).first()
+
+    async def _run(self, log_id: int):
+        # 同步Session的查询和提交都放到线程池执行，不阻塞事件循环
+        async with self._get_semaphore():
+            db = SessionLocal()
+            try:
+                log = await asyncio.to_thread(self._claim, db, log_id)
+                if log is None:
+                    return
+
+                heartbeat = asyncio.create_task(self._heartbeat(log_id))
+                try:
+                    await self._import_pages(db, log)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"导入任务{log_id}失败: {str(e)}")
+                    await asyncio.to_thread(self._fail, db, log, str(e))
+                finally:
+                    heartbeat.cancel()
+                    await asyncio.gather(heartbeat, return_exceptions=True)
+            finally:
+                await asyncio.to_thread(db.close)
+
+    async def _heartbeat(self, log_id: int):
+        """
+        定期刷新运行中任务的updated_at
+
+        附件下载较慢时一页可能超过stale_seconds才提交；没有心跳的话，巡检
+        会把仍在执行的任务当作中断任务，由其他worker重复导入同一页
+        """
+        interval = max(self.stale_seconds / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self._touch, log_id)
+            except Exception as e:
+                logger.warning(f"导入任务{log_id}心跳失败: {str(e)}")
+
+    def _touch(self, log_id: int):
+        db = SessionLocal()
+        try:
+            db.query(FeishuImportLog).filter(
+                FeishuImportLog.id == log_id,
+                FeishuImportLog.status == JOB_RUNNING
+            ).update({"updated_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _fail(self, db: Session, log: FeishuImportLog, error: str):
+        db.rollback()
+        log.error_message = error
+        self._finish(log, JOB_FAILED)
+        db.commit()
+
+    async def _import_pages(self, db: Session, log: FeishuImportLog):
+        """
+        逐页导入，每页的数据与进度检查点在同一事务中提交
+        已导入过的记录（按record_id）内容有变化时更新原成果，未变化时跳过；
+        增量模式跳过水位线之前未修改的记录
+        """
+        config, mapper, watermark, retry_ids = await asyncio.to_thread(self._load_job_settings, db, log)
+
+        client = get_feishu_client(config.app_id, config.app_secret)
+        downloader = AttachmentDownloader(client)
+        engine = BulkImportEngine(db, mapper)
+
+        if log.last_page_token:
+            logger.info(f"导入任务{log.id}从第{log.processed_records + 1}行续传")
+
+        async for page in client.iter_record_pages(
+            log.app_token,
+            log.table_id,
+            page_size=self.page_size,
+            page_token=log.last_page_token,
+            automatic_fields=True
+        ):
+            batch = await asyncio.to_thread(
+                self._prepare_page, db, log, engine, page["items"], watermark, retry_ids
+            )
+
+            # 并发下载附件
+            download_rows = batch["download_rows"]
+            downloads = await downloader.download_many([
+                (row["row"], row["file_token"], row["values"]["student_id"])
+                for row in download_rows
+            ])
+            for row in download_rows:
+                local_url, success, retry_token = downloads[row["row"]]
+                if success:
+                    row["values"]["evidence_url"] = local_url
+                else:
+                    row["values"]["feishu_attachment_token"] = retry_token
+
+            await asyncio.to_thread(self._write_page, db, log, engine, page, batch)
+
+        await asyncio.to_thread(self._complete_if_running, db, log)
+
+    def _load_job_settings(self, db: Session, log: FeishuImportLog):
+        """读取飞书配置、构造数据映射器（预加载教师和学生），以及增量同步的水位线和重试集合"""
+        config = db.query(FeishuConfig).filter(FeishuConfig.status == "active").first()
+        if not config:
+            raise Exception("请先配置飞书应用")
+
+        mapper = DataMapper(get_or_create_default_mappings(db, config.id), db)
+
+        watermark = 0
+        retry_ids = set()
+        if log.mode == MODE_INCREMENTAL:
+            state = self._get_sync_state(db, log)
+            if state:
+                watermark = state.last_modified_watermark or 0
+                retry_ids = set(state.retry_record_ids or [])
+
+        return config, mapper, watermark, retry_ids
+
+    def _prepare_page(
+        self,
+        db: Session,
+        log: FeishuImportLog,
+        engine: BulkImportEngine,
+        items: List[Dict[str, Any]],
+        watermark: int,
+        retry_ids: set
+    ) -> Dict[str, Any]:
+        """映射验证本页记录，按record_id区分新增、更新和需要下载附件的行"""
+        records = [
+            (idx, record) for idx, record in enumerate(items, log.processed_records + 1)
+            if record.get("last_modified_time") is None
+            or record["last_modified_time"] > watermark
+            or record.get("record_id") in retry_ids
+        ]
+        skipped = len(items) - len(records)
+
+        # 映射验证，按record_id区分新增和更新
+        rows, results = engine.prepare(records, log.skip_invalid)
+        existing = self._load_record_mappings(db, log, rows)
+
+        inserts, updates, download_rows = [], [], []
+        affected_students = set()
+        for row in rows:
+            mapping, achievement = existing.get(row["record_id"], (None, None))
+
+            if achievement is None:
+                inserts.append(row)
+            elif achievement.is_deleted:
+                # 学生已删除的成果不再恢复
+                skipped += 1
+                continue
+            elif not engine.has_changes(row, achievement, mapping.file_token):
+                # 内容未变化（如全量模式重复导入）：不改动审核状态和审核意见
+                skipped += 1
+                continue
+            else:
+                row["achievement_id"] = achievement.id
+                updates.append(row)
+                affected_students.add(achievement.student_id)
+                if row["file_token"] == mapping.file_token:
+                    # 附件未变化，沿用已下载的文件
+                    row["values"]["evidence_url"] = achievement.evidence_url
+                    row["values"]["feishu_attachment_token"] = achievement.feishu_attachment_token
+                    continue
+
+            if row["file_token"]:
+                download_rows.append(row)
+
+        return {
+            "records": records,
+            "results": results,
+            "existing": existing,
+            "inserts": inserts,
+            "updates": updates,
+            "download_rows": download_rows,
+            "affected_students": affected_students,
+            "skipped": skipped
+        }
+
+    def _write_page(
+        self,
+        db: Session,
+        log: FeishuImportLog,
+        engine: BulkImportEngine,
+        page: Dict[str, Any],
+        batch: Dict[str, Any]
+    ):
+        """写入本页成果、record_id映射和进度检查点，并在同一事务中提交"""
+        results = batch["results"]
+        affected_students = batch["affected_students"]
+
+        # 批量写入（不单独提交）并记录record_id映射
+        for written_rows, written_results in (
+            (batch["inserts"], engine.insert(batch["inserts"], commit=False)),
+            (batch["updates"], engine.update(batch["updates"], commit=False))
+        ):
+            results.extend(written_results)
+            self._save_record_mappings(db, log, batch["existing"], written_rows, written_results)
+            affected_students.update(row["values"]["student_id"] for row in written_rows)
+
+        # 与成果写入同一事务失效学生的AI对话上下文缓存
+        affected_students.discard(None)
+        if affected_students:
+            db.execute(context_version_bump(affected_students))
+
+        # 更新检查点
+        failed = sorted((r for r in results if r["status"] == "failed"), key=lambda r: r["row"])
+        record_ids = {idx: record.get("record_id") for idx, record in batch["records"]}
+        self._update_retry_set(
+            db, log,
+            processed={rid for rid in record_ids.values() if rid},
+            failed={record_ids[r["row"]] for r in failed if record_ids.get(r["row"])}
+        )
+        log.success_count = (log.success_count or 0) + len(results) - len(failed)
+        log.failed_count = (log.failed_count or 0) + len(failed)
+        log.skipped_count = (log.skipped_count or 0) + batch["skipped"]
+        if failed:
+            log.error_details = (log.error_details or []) + failed
+        log.processed_records = (log.processed_records or 0) + len(page["items"])
+        log.last_page_token = page["page_token"]
+        if page.get("total") is not None:
+            log.total_records = page["total"]
+
+        if not page["has_more"]:
+            self._complete(db, log)
+        else:
+            log.updated_at = datetime.utcnow()
+
+        db.commit()
+
+    def _complete_if_running(self, db: Session, log: FeishuImportLog):
+        # 提交后log已过期，在线程中读取状态，避免在事件循环上触发刷新查询
+        if log.status == JOB_RUNNING:
+            self._complete(db, log)
+            db.commit()
+
+    def _load_record_mappings(
+        self,
+        db: Session,
+        log: FeishuImportLog,
+        rows: List[Dict[str, Any]]
+    ) -> Dict[str, Tuple[FeishuRecordMapping, Optional[BizAchievement]]]:
+        """批量查询本页记录已有的映射及对应成果"""
+        record_ids = [row["record_id"] for row in rows if row["record_id"]]
+        if not record_ids:
+            return {}
+
+        pairs = db.query(FeishuRecordMapping, BizAchievement).outerjoin(
+            BizAchievement, BizAchievement.id == FeishuRecordMapping.achievement_id
+        ).filter(
+            FeishuRecordMapping.app_token == log.app_token,
+            FeishuRecordMapping.table_id == log.table_id,
+            FeishuRecordMapping.record_id.in_(record_ids)
+        ).all()
+
+        return {mapping.record_id: (mapping, achievement) for mapping, achievement in pairs}
+
+    def _save_record_mappings(
+        self,
+        db: Session,
+        log: FeishuImportLog,
+        existing: Dict[str, Tuple[FeishuRecordMapping, Optional[BizAchievement]]],
+        rows: List[Dict[str, Any]],
+        results: List[Dict[str, Any]]
+    ):
+        for row, result in zip(rows, results):
+            if result["status"] != "success" or not row["record_id"]:
+                continue
+
+            mapping = existing.get(row["record_id"], (None, None))[0]
+            if mapping is None:
+                mapping = FeishuRecordMapping(
+                    app_token=log.app_token,
+                    table_id=log.table_id,
+                    record_id=row["record_id"]
+                )
+                db.add(mapping)
+
+            mapping.achievement_id = result["achievement_id"]
+            mapping.file_token = row["file_token"]
+            mapping.feishu_modified_at = row["modified_at"]
+
+    def _get_sync_state(self, db: Session, log: FeishuImportLog) -> Optional[FeishuSyncState]:
+        return db.query(FeishuSyncState).filter(
+            FeishuSyncState.app_token == log.app_token,
+            FeishuSyncState.table_id == log.table_id
+        ).first()
+
+    def _get_or_create_sync_state(self, db: Session, log: FeishuImportLog) -> FeishuSyncState:
+        state = self._get_sync_state(db, log)
+        if state is None:
+            state = FeishuSyncState(app_token=log.app_token, table_id=log.table_id)
+            db.add(state)
+        return state
+
+    def _update_retry_set(self, db: Session, log: FeishuImportLog, processed: set, failed: set):
+        """
+        维护失败重试集合（与本页数据同一事务提交）
+
+        水位线会越过本次失败的记录，这些record_id保存下来，下次增量同步时即使
+        未在飞书中修改也会重新导入；本页处理成功的记录从集合中移除
+        """
+        state = self._get_sync_state(db, log)
+        if state is None:
+            if not failed:
+                return
+            state = self._get_or_create_sync_state(db, log)
+
+        retry_ids = set(state.retry_record_ids or [])
+        updated = (retry_ids - processed) | failed
+        if updated != retry_ids:
+            state.retry_record_ids = sorted(updated)
+
+    def _complete(self, db: Session, log: FeishuImportLog):
+        """
+        标记任务完成并推进同步水位线
+
+        水位线取任务开始时间（减去重叠窗口），而不是看到的最大修改时间：
+        遍历过程中被修改的记录在下次同步时仍会被拉取；
+        本次失败的记录已记入 retry_record_ids，下次同步时重试
+        """
+        self._finish(log, JOB_COMPLETED)
+
+        started_at = log.created_at.replace(tzinfo=timezone.utc).timestamp()
+        watermark = int((started_at - self.watermark_overlap_seconds) * 1000)
+
+        state = self._get_or_create_sync_state(db, log)
+        state.last_modified_watermark = max(state.last_modified_watermark or 0, watermark)
+        state.last_import_log_id = log.id
+        state.last_synced_at = datetime.utcnow()
+
+    def _finish(self, log: FeishuImportLog, status: str):
+        now = datetime.utcnow()
+        log.status = status
+        log.finished_at = now
+        log.updated_at = now
+        log.total_records = max(log.total_records or 0, log.processed_records or 0)
+        log.import_duration_seconds = int((now - log.created_at).total_seconds())
+
+
+def import_job_view(log: FeishuImportLog) -> Dict[str, Any]:
+    """导入任务进度（供API返回）"""
+    total = log.total_records or 0
+    processed = log.processed_records or 0
+
+    return {
+        "job_id": log.id,
+        "mode": log.mode,
+        "status": log.status,
+        "app_token": log.app_token,
+        "table_id": log.table_id,
+        "total_records": total,
+        "processed_records": processed,
+        "success_count": log.success_count or 0,
+        "failed_count": log.failed_count or 0,
+        "skipped_count": log.skipped_count or 0,
+        "progress": round(processed / total * 100, 1) if total else (100.0 if log.status == JOB_COMPLETED else 0.0),
+        "error_message": log.error_message,
+        "error_details": log.error_details or [],
+        "import_duration_seconds": log.import_duration_seconds or 0,
+        "created_at": log.created_at.isoformat() if log.created_at else None,
+        "updated_at": log.updated_at.isoformat() if log.updated_at else None,
+        "finished_at": log.finished_at.isoformat() if log.finished_at else None
+    }
+
+
+# 全局单例
+feishu_import_runner = FeishuImportJobRunner(
+    concurrency=settings.FEISHU_IMPORT_JOB_CONCURRENCY,
+    page_size=settings.FEISHU_IMPORT_PAGE_SIZE,
+    stale_seconds=settings.FEISHU_IMPORT_JOB_STALE_SECONDS,
+    watermark_overlap_seconds=settings.FEISHU_SYNC_WATERMARK_OVERLAP_SECONDS
+)
@@ -0,0 +1,432 @@
+"""
+OCR Job Queue Service
+Runs certificate recognition in background workers so uploads return immediately
+"""
+
+import asyncio
+import enum
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OcrJobStatus(str, enum.Enum):
+    """OCR job status enumeration"""
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+FINISHED_STATUSES = (OcrJobStatus.SUCCEEDED.value, OcrJobStatus.FAILED.value)
+
+
+def format_recognition_result(validated_result: Dict, file_info: Dict) -> Dict:
+    """
+    Build the API payload for a validated recognition result
+
+    Args:
+        validated_result: Result of validate_recognition_result
+        file_info: File info returned by file_manager.save_certificate_permanent
+
+    Returns:
+        Response data for the student OCR endpoints
+    """
+    data = validated_result.get("data", {})
+
+    return {
+        "recognized_data": {
+            # Basic fields
+            "title": data.get("certificate_name"),
+            "date": data.get("issue_date"),
+            "issuer": data.get("issuing_organization"),
+            "suggested_type": data.get("category"),
+            "award_level": data.get("award_level"),  # 奖项级别（国家级、省部级等）
+            "award": data.get("award"),  # 具体奖项（一等奖、二等奖等）
+            "certificate_number": data.get("certificate_number"),
+            "recipient_name": data.get("recipient_name"),
+
+            # New enhanced fields
+            "project_name": data.get("project_name"),
+            "team_members": data.get("team_members", []),
+            "advisors": data.get("advisors", []),
+            "additional_info": data.get("additional_info"),
+
+            # Confidence scores
+            "recognition_confidence": data.get("recognition_confidence", {})
+        },
+        "file_url": file_info["file_url"],
+        "file_info": {
+            "filename": file_info["filename"],
+            "original_filename": file_info["original_filename"],
+            "size_bytes": file_info["size_bytes"]
+        },
+        "ai_metadata": {
+            "model_used": data.get("model_used"),
+            "recognition_time": data.get("recognition_time"),
+            "confidence": data.get("confidence")
+        },
+        "usage": validated_result.get("usage", {}),
+        "cached": validated_result.get("cached", False)
+    }
+
+
+class MemoryOcrJobStore:
+    """
+    In-process job store (jobs are lost on restart)
+
+    Only valid with a single worker process: a status or SSE request served by
+    another process than the upload would not find the job.
+    """
+
+    shared = False  # Jobs are only visible to this process
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+
+    def save(self, job: Dict):
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_unfinished(self) -> List[Dict]:
+        with self._lock:
+            return [dict(job) for job in self._jobs.values() if job["status"] not in FINISHED_STATUSES]
+
+    def claim(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] != OcrJobStatus.QUEUED.value:
+                return None
+            job.update(status=OcrJobStatus.PROCESSING.value, updated_at=datetime.utcnow().isoformat())
+            return dict(job)
+
+    def requeue_stale(self, cutoff: datetime) -> int:
+        with self._lock:
+            stale = [
+                job for job in self._jobs.values()
+                if job["status"] == OcrJobStatus.PROCESSING.value and job["updated_at"] < cutoff.isoformat()
+            ]
+            for job in stale:
+                job["status"] = OcrJobStatus.QUEUED.value
+            return len(stale)
+
+    def purge_finished_before(self, cutoff: datetime) -> int:
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in FINISHED_STATUSES and job["updated_at"] < cutoff.isoformat()
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            return len(expired)
+
+
+class SqliteOcrJobStore:
+    """
+    Local SQLite job store (unfinished jobs are re-queued after restart)
+
+    Shared by all worker processes on the host; required when running more
+    than one worker.
+    """
+
+    shared = True  # Other processes change jobs without notifying this one
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_jobs ("
+            "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, updated_at TEXT NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def save(self, job: Dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_jobs (job_id, status, updated_at, payload) VALUES (?, ?, ?, ?)",
+                (job["job_id"], job["status"], job["updated_at"], json.dumps(job, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM ocr_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_unfinished(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM ocr_jobs WHERE status NOT IN (?, ?) ORDER BY updated_at",
+                FINISHED_STATUSES
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def claim(self, job_id: str) -> Optional[Dict]:
+        """
+        Atomically move a queued job to processing
+
+        Every worker process re-queues unfinished jobs on startup, so the same
+        job can sit in several in-process queues; only the process whose
+        conditional UPDATE matches runs it.
+        """
+        now = datetime.utcnow().isoformat()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE ocr_jobs SET status = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                (OcrJobStatus.PROCESSING.value, now, job_id, OcrJobStatus.QUEUED.value)
+            )
+            if cursor.rowcount != 1:
+                self._conn.rollback()
+                return None
+
+            row = self._conn.execute(
+                "SELECT payload FROM ocr_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            job = json.loads(row[0])
+            job.update(status=OcrJobStatus.PROCESSING.value, updated_at=now)
+            self._conn.execute(
+                "UPDATE ocr_jobs SET payload = ? WHERE job_id = ?",
+                (json.dumps(job, ensure_ascii=False), job_id)
+            )
+            self._conn.commit()
+        return job
+
+    def requeue_stale(self, cutoff: datetime) -> int:
+        """Put processing jobs not updated since cutoff (their worker died) back in the queue"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM ocr_jobs WHERE status = ? AND updated_at < ?",
+                (OcrJobStatus.PROCESSING.value, cutoff.isoformat())
+            ).fetchall()
+            for row in rows:
+                job = json.loads(row[0])
+                job["status"] = OcrJobStatus.QUEUED.value
+                self._conn.execute(
+                    "UPDATE ocr_jobs SET status = ?, payload = ? WHERE job_id = ? AND status = ?",
+                    (job["status"], json.dumps(job, ensure_ascii=False), job["job_id"],
+                     OcrJobStatus.PROCESSING.value)
+                )
+            self._conn.commit()
+        return len(rows)
+
+    def purge_finished_before(self, cutoff: datetime) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM ocr_jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (*FINISHED_STATUSES, cutoff.isoformat())
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+
+def create_job_store():
+    """Create the job store selected by OCR_JOB_BACKEND"""
+    if settings.OCR_JOB_BACKEND == "sqlite":
+        return SqliteOcrJobStore(settings.OCR_JOB_DB_PATH)
+    return MemoryOcrJobStore()
+
+
+class OcrJobQueue:
+    """
+    Bounded in-process worker pool for certificate recognition jobs
+
+    Store calls run in a thread (the SQLite store does blocking file I/O).
+    """
+
+    def __init__(self, store, worker_count: int):
+        self.store = store
+        self.worker_count = max(1, worker_count)
+
+        # Created in start() so they bind to the running event loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._changed: Optional[asyncio.Condition] = None
+        self._sequence = 0  # Bumped on every job change, see wait_for_change()
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        """
+        Start worker tasks and re-queue jobs left unfinished by a previous run
+
+        Processing jobs are only re-queued once they have been idle for
+        OCR_JOB_STALE_SECONDS (another worker process may still be running
+        them); workers claim each job atomically before running it.
+        """
+        if self._workers:
+            return
+
+        self._queue = asyncio.Queue()
+        self._changed = asyncio.Condition()
+
+        await asyncio.to_thread(
+            self.store.requeue_stale,
+            datetime.utcnow() - timedelta(seconds=settings.OCR_JOB_STALE_SECONDS)
+        )
+        for job in await asyncio.to_thread(self.store.list_unfinished):
+            if job["status"] == OcrJobStatus.QUEUED.value:
+                self._queue.put_nowait(job["job_id"])
+
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.worker_count)
+        ]
+        logger.info(f"OCR job queue started with {self.worker_count} workers")
+
+    async def stop(self):
+        """Cancel worker tasks (queued jobs stay in the store)"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, student_id: int, file_info: Dict) -> Dict:
+        """
+        Queue a saved certificate for recognition
+
+        Args:
+            student_id: Owner of the certificate
+            file_info: File info returned by file_manager.save_certificate_permanent
+
+        Returns:
+            The created job
+        """
+        await asyncio.to_thread(
+            self.store.purge_finished_before,
+            datetime.utcnow() - timedelta(hours=settings.OCR_JOB_TTL_HOURS)
+        )
+
+        now = datetime.utcnow().isoformat()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "student_id": student_id,
+            "status": OcrJobStatus.QUEUED.value,
+            "file_info": file_info,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        await asyncio.to_thread(self.store.save, job)
+        await self._queue.put(job["job_id"])
+        return job
+
+    async def get_job(self, job_id: str, student_id: int) -> Optional[Dict]:
+        """Get a job if it belongs to the given student"""
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if not job or job["student_id"] != student_id:
+            return None
+        return job
+
+    @property
+    def poll_interval(self) -> float:
+        """
+        Seconds between job re-reads while waiting for a change
+
+        Changes made by other processes to a shared store are not signalled
+        to this one, so waiters poll for them.
+        """
+        return settings.OCR_JOB_POLL_SECONDS if self.store.shared else 15
+
+    def change_sequence(self) -> int:
+        """Current change sequence number; read it before reading job state"""
+        return self._sequence
+
+    async def wait_for_change(self, after: int, timeout: float) -> bool:
+        """
+        Wait until any job changes state after sequence number `after`
+
+        Checking the sequence under the condition means a change signalled
+        between reading the job and calling this is not missed.
+
+        Returns:
+            True if a change happened, False on timeout
+        """
+        async with self._changed:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self._sequence != after), timeout
+                )
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    async def _update(self, job: Dict, **fields):
+        job.update(fields, updated_at=datetime.utcnow().isoformat())
+        await asyncio.to_thread(self.store.save, job)
+        await self._notify()
+
+    async def _notify(self):
+        async with self._changed:
+            self._sequence += 1
+            self._changed.notify_all()
+
+    async def _worker(self, index: int):
+        from services.certificate_recognition_openai import certificate_recognition_service_openai
+
+        while True:
+            job_id = await self._queue.get()
+            job = None
+            try:
+                # Another worker process may have claimed the same job
+                job = await asyncio.to_thread(self.store.claim, job_id)
+                if not job:
+                    continue
+                await self._notify()
+
+                recognition_result = await certificate_recognition_service_openai.recognize_certificate_async(
+                    job["file_info"]["file_path"]
+                )
+                validated_result = certificate_recognition_service_openai.validate_recognition_result(
+                    recognition_result
+                )
+
+                if validated_result.get("success"):
+                    await self._update(
+                        job,
+                        status=OcrJobStatus.SUCCEEDED.value,
+                        result=format_recognition_result(validated_result, job["file_info"])
+                    )
+                else:
+                    await self._update(
+                        job,
+                        status=OcrJobStatus.FAILED.value,
+                        error=validated_result.get("error")
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"OCR job {job_id} failed in worker {index}: {str(e)}")
+                if job:
+                    await self._update(job, status=OcrJobStatus.FAILED.value, error=str(e))
+            finally:
+                self._queue.task_done()
+
+
+def public_job_view(job: Dict) -> Dict:
+    """Job fields exposed to API clients (hides the server file path)"""
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "file_url": job["file_info"]["file_url"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+
+# Create singleton instance
+ocr_job_queue = OcrJobQueue(create_job_store(), settings.OCR_JOB_WORKERS)
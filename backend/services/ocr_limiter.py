@@ -0,0 +1,22 @@
+"""
+OCR Concurrency Limiter
+Single per-worker limit on concurrent certificate recognition model calls,
+shared by the upload routes (certificate_recognition) and the OCR job
+workers (certificate_recognition_openai) so OCR_MAX_CONCURRENCY caps both
+together.
+"""
+
+import asyncio
+from typing import Optional
+from config import settings
+
+# Created lazily so it binds to the running event loop
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_ocr_semaphore() -> asyncio.Semaphore:
+    """Get the semaphore limiting concurrent OCR model calls"""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max(1, settings.OCR_MAX_CONCURRENCY))
+    return _semaphore
@@ -0,0 +1,124 @@
+"""
+Password Hashing Pool
+Runs Argon2 hashing/verification on a small dedicated thread pool so logins
+do not block the event loop, and rejects work once the pool is saturated
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from auth import verify_password, get_password_hash
+from config import settings
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when too many hash operations are already queued"""
+
+
+class PasswordHasher:
+    """
+    Bounded pool for password hash operations
+
+    argon2-cffi releases the GIL while hashing, so threads give real
+    parallelism. Each Argon2 call uses ~64 MB, so the worker count also caps
+    memory; callers beyond max_queue are rejected instead of piling up.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="password-hash"
+        )
+
+        self._lock = threading.Lock()
+        self._pending = 0  # queued + running
+        self._latencies_ms = deque(maxlen=500)
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "max_pending": 0
+        }
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Verify a password on the hashing pool
+
+        Raises:
+            HashingPoolSaturated: If the pool queue is full
+        """
+        return await self._submit(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password on the hashing pool
+
+        Raises:
+            HashingPoolSaturated: If the pool queue is full
+        """
+        return await self._submit(get_password_hash, password)
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise HashingPoolSaturated()
+            self._pending += 1
+            self._stats["max_pending"] = max(self._stats["max_pending"], self._pending)
+
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._pending -= 1
+                self._stats["completed"] += 1
+                self._latencies_ms.append(elapsed_ms)
+
+    def get_stats(self) -> Dict:
+        """
+        Get pool metrics
+
+        Returns:
+            Queue depth, limits, counters and latency percentiles (ms, including queue wait)
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            pending = self._pending
+            latencies = sorted(self._latencies_ms)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 1)
+
+        stats.update({
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": pending,
+            "queue_depth": max(0, pending - self.max_workers),
+            "latency_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1], 1) if latencies else 0,
+                "samples": len(latencies)
+            }
+        })
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# Create singleton instance
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
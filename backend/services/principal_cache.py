@@ -0,0 +1,163 @@
+"""
+Authenticated Principal Cache
+Keeps the per-user data needed for authorization in memory so authenticated
+requests do not have to load SysUser/SysStudent rows
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from config import settings
+from models import SysUser, UserRole
+
+
+def credential_version(password_hash: str) -> str:
+    """
+    Short fingerprint of a password hash
+
+    Carried in tokens as the "pwv" claim; changes whenever the password does,
+    which invalidates tokens issued before the change.
+    """
+    return hashlib.sha256(password_hash.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass(frozen=True)
+class AuthPrincipal:
+    """Identity of the authenticated caller"""
+    user_id: int
+    username: str
+    role: UserRole
+    student_id: Optional[int]
+    credential_version: str
+
+    @property
+    def id(self) -> int:
+        """Alias so code written against SysUser (e.g. admin.id) keeps working"""
+        return self.user_id
+
+    def to_claims(self) -> Dict:
+        """JWT claims for tokens issued to this principal"""
+        return {
+            "sub": str(self.user_id),
+            "role": self.role.value,
+            "sid": self.student_id,
+            "pwv": self.credential_version
+        }
+
+    def matches_claims(self, payload: Dict) -> bool:
+        """
+        Check that a token was issued for the current state of this user
+
+        Tokens issued before claims were added carry no "pwv" and are only
+        checked against the role.
+        """
+        if payload.get("role") != self.role.value:
+            return False
+        if "pwv" in payload and payload["pwv"] != self.credential_version:
+            return False
+        return True
+
+
+def build_principal(user: SysUser) -> AuthPrincipal:
+    """Build a principal from a loaded user row"""
+    return AuthPrincipal(
+        user_id=user.id,
+        username=user.username,
+        role=user.role,
+        student_id=user.student.id if user.student else None,
+        credential_version=credential_version(user.password_hash)
+    )
+
+
+class PrincipalCache:
+    """
+    TTL + LRU cache of principals keyed by user id
+
+    Invalidation is per process; the TTL bounds how long other workers keep
+    serving a principal after a password or role change.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[AuthPrincipal]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def set(self, principal: AuthPrincipal):
+        with self._lock:
+            self._entries[principal.user_id] = (principal, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(principal.user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """Drop a cached principal (call after changing a user's password or role)"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def load(self, db: Session, user_id: int) -> Optional[AuthPrincipal]:
+        """
+        Get a principal, loading user and student in one query on a miss
+
+        Returns:
+            The principal, or None if the user does not exist
+        """
+        principal = self.get(user_id)
+        if principal:
+            return principal
+
+        user = db.query(SysUser).options(joinedload(SysUser.student)).filter(
+            SysUser.id == user_id
+        ).first()
+        if not user:
+            return None
+
+        principal = build_principal(user)
+        self.set(principal)
+        return principal
+
+    async def load_async(self, db: AsyncSession, user_id: int) -> Optional[AuthPrincipal]:
+        """Same as load() for an async session"""
+        principal = self.get(user_id)
+        if principal:
+            return principal
+
+        result = await db.execute(
+            select(SysUser).options(joinedload(SysUser.student)).where(SysUser.id == user_id)
+        )
+        user = result.scalars().first()
+        if not user:
+            return None
+
+        principal = build_principal(user)
+        self.set(principal)
+        return principal
+
+
+# Create singleton instance
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS,
+    max_entries=settings.AUTH_PRINCIPAL_CACHE_MAX_ENTRIES
+)
@@ -0,0 +1,239 @@
+"""
+Rate Limiter Service
+Sliding-window limits and failed-login counters for the auth endpoints,
+kept in process memory or in a local Redis shared by all workers
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class MemoryRateLimitBackend:
+    """Sliding-window log per key in process memory (async interface, no I/O)"""
+
+    _SWEEP_INTERVAL = 1000  # Operations between sweeps of idle keys
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._windows: Dict[str, deque] = {}
+        self._windows_seconds: Dict[str, float] = {}
+        self._operations = 0
+
+    def _prune(self, key: str, window: float, now: float) -> deque:
+        events = self._windows.setdefault(key, deque())
+        self._windows_seconds[key] = window
+        while events and events[0] <= now - window:
+            events.popleft()
+        return events
+
+    def _maybe_sweep(self, now: float):
+        self._operations += 1
+        if self._operations % self._SWEEP_INTERVAL:
+            return
+        for key in list(self._windows):
+            events = self._windows[key]
+            if not events or events[-1] <= now - self._windows_seconds[key]:
+                del self._windows[key]
+                del self._windows_seconds[key]
+
+    async def hit(self, key: str, limit: int, window: float) -> float:
+        """
+        Record an event if the key is under its limit
+
+        Returns:
+            0 if allowed, otherwise seconds until the next event is allowed
+        """
+        now = time.time()
+        with self._lock:
+            self._maybe_sweep(now)
+            events = self._prune(key, window, now)
+            if len(events) >= limit:
+                return max(events[0] + window - now, 0.001)
+            events.append(now)
+            return 0
+
+    async def peek(self, key: str, limit: int, window: float) -> float:
+        """Like hit() but does not record an event"""
+        now = time.time()
+        with self._lock:
+            events = self._prune(key, window, now)
+            if len(events) >= limit:
+                return max(events[0] + window - now, 0.001)
+            return 0
+
+    async def add(self, key: str, window: float):
+        """Record an event unconditionally"""
+        now = time.time()
+        with self._lock:
+            self._maybe_sweep(now)
+            self._prune(key, window, now).append(now)
+
+    async def reset(self, key: str):
+        with self._lock:
+            self._windows.pop(key, None)
+            self._windows_seconds.pop(key, None)
+
+    async def close(self):
+        pass
+
+
+class RedisRateLimitBackend:
+    """
+    Sliding-window log per key in a Redis sorted set (shared by all workers)
+
+    Uses the asyncio client so throttle checks do not block the event loop
+    on the Redis round trip.
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        self._redis = aioredis.Redis.from_url(url, socket_timeout=1)
+        self._prefix = prefix
+
+    async def _retry_after(self, key: str, window: float, now: float) -> float:
+        oldest = await self._redis.zrange(key, 0, 0, withscores=True)
+        if not oldest:
+            return 0.001
+        return max(oldest[0][1] + window - now, 0.001)
+
+    async def hit(self, key: str, limit: int, window: float) -> float:
+        key = self._prefix + key
+        now = time.time()
+        member = f"{now}:{uuid.uuid4().hex[:8]}"
+
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(key, 0, now - window)
+        pipe.zadd(key, {member: now})
+        pipe.zcard(key)
+        pipe.expire(key, int(window) + 1)
+        count = (await pipe.execute())[2]
+
+        if count > limit:
+            await self._redis.zrem(key, member)
+            return await self._retry_after(key, window, now)
+        return 0
+
+    async def peek(self, key: str, limit: int, window: float) -> float:
+        key = self._prefix + key
+        now = time.time()
+
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(key, 0, now - window)
+        pipe.zcard(key)
+        count = (await pipe.execute())[1]
+
+        if count >= limit:
+            return await self._retry_after(key, window, now)
+        return 0
+
+    async def add(self, key: str, window: float):
+        key = self._prefix + key
+        now = time.time()
+
+        pipe = self._redis.pipeline()
+        pipe.zadd(key, {f"{now}:{uuid.uuid4().hex[:8]}": now})
+        pipe.expire(key, int(window) + 1)
+        await pipe.execute()
+
+    async def reset(self, key: str):
+        await self._redis.delete(self._prefix + key)
+
+    async def close(self):
+        await self._redis.close()
+
+
+def create_rate_limit_backend():
+    """Create the backend selected by AUTH_RATE_LIMIT_BACKEND"""
+    if settings.AUTH_RATE_LIMIT_BACKEND == "redis":
+        if REDIS_AVAILABLE:
+            return RedisRateLimitBackend(settings.AUTH_RATE_LIMIT_REDIS_URL)
+        logger.warning("redis package not installed, falling back to in-memory rate limiting")
+    return MemoryRateLimitBackend()
+
+
+class AuthThrottle:
+    """
+    Login/refresh throttling
+
+    - Sliding-window limits per client IP and per username
+    - Failed-login counter per (username, IP): once it reaches the limit,
+      further attempts are rejected before the user lookup and password hash
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def _safe(self, func, *args) -> float:
+        # A broken limiter store must not lock everybody out
+        try:
+            return await func(*args) or 0
+        except Exception as e:
+            logger.error(f"Rate limiter error: {str(e)}")
+            return 0
+
+    async def check_login(self, username: str, client_ip: str) -> float:
+        """
+        Check a login attempt against all limits (records the attempt if allowed)
+
+        Returns:
+            0 if the attempt may proceed, otherwise Retry-After seconds
+        """
+        username = username.lower()
+
+        retry_after = await self._safe(
+            self.backend.peek,
+            f"login-fail:{username}:{client_ip}",
+            settings.LOGIN_MAX_FAILED_ATTEMPTS,
+            settings.LOGIN_FAILURE_WINDOW_SECONDS
+        )
+        if retry_after:
+            return retry_after
+
+        retry_after = await self._safe(
+            self.backend.hit, f"login-ip:{client_ip}",
+            settings.LOGIN_RATE_LIMIT_PER_IP, settings.AUTH_RATE_LIMIT_WINDOW_SECONDS
+        )
+        if retry_after:
+            return retry_after
+
+        return await self._safe(
+            self.backend.hit, f"login-user:{username}",
+            settings.LOGIN_RATE_LIMIT_PER_USER, settings.AUTH_RATE_LIMIT_WINDOW_SECONDS
+        )
+
+    async def record_login_failure(self, username: str, client_ip: str):
+        await self._safe(
+            self.backend.add,
+            f"login-fail:{username.lower()}:{client_ip}",
+            settings.LOGIN_FAILURE_WINDOW_SECONDS
+        )
+
+    async def record_login_success(self, username: str, client_ip: str):
+        await self._safe(self.backend.reset, f"login-fail:{username.lower()}:{client_ip}")
+
+    async def check_refresh(self, client_ip: str) -> float:
+        """Check a token refresh against the per-IP limit (records it if allowed)"""
+        return await self._safe(
+            self.backend.hit, f"refresh-ip:{client_ip}",
+            settings.REFRESH_RATE_LIMIT_PER_IP, settings.AUTH_RATE_LIMIT_WINDOW_SECONDS
+        )
+
+    async def close(self):
+        """Close the backend's connections (application shutdown)"""
+        await self.backend.close()
+
+
+# Create singleton instance
+auth_throttle = AuthThrottle(create_rate_limit_backend())
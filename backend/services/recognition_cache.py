@@ -0,0 +1,217 @@
+"""
+Certificate Recognition Cache
+Persists recognition results keyed by image content so re-uploads skip the vision model
+"""
+
+import hashlib
+import io
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from PIL import Image
+from config import settings
+
+
+def compute_perceptual_hash(image_bytes: bytes, hash_size: int = 16) -> Optional[str]:
+    """
+    Compute a difference hash (dHash) of an image
+
+    Re-encoded or slightly resized copies of the same certificate produce the
+    same (or a very close) hash. Certificates printed from one template only
+    differ in small text, so keep the allowed distance tight.
+
+    Args:
+        image_bytes: Raw image file content
+        hash_size: Hash grid size (16 -> 256-bit hash)
+
+    Returns:
+        Hex string of the hash, or None if the file is not a readable image (e.g. PDF)
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+            pixels = list(img.getdata())
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def _hamming_distance(hash_a: str, hash_b: str) -> int:
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+class RecognitionCache:
+    """SQLite-backed recognition result cache with TTL and size-based eviction"""
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl_hours: int,
+        max_entries: int,
+        use_perceptual_hash: bool = False,
+        max_hash_distance: int = 2
+    ):
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_entries = max_entries
+        self.use_perceptual_hash = use_perceptual_hash
+        self.max_hash_distance = max_hash_distance
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS recognition_cache ("
+            "sha256 TEXT PRIMARY KEY, phash TEXT, result TEXT NOT NULL, "
+            "created_at TEXT NOT NULL, last_hit_at TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_recognition_cache_phash ON recognition_cache (phash)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_recognition_cache_last_hit ON recognition_cache (last_hit_at)"
+        )
+        self._conn.commit()
+
+        self._stats = {
+            "hits": 0,
+            "perceptual_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+
+    def compute_keys(self, image_bytes: bytes) -> Tuple[str, Optional[str]]:
+        """
+        Compute cache keys for an image
+
+        Returns:
+            (sha256 hex digest, perceptual hash or None)
+        """
+        sha256 = hashlib.sha256(image_bytes).hexdigest()
+        phash = compute_perceptual_hash(image_bytes) if self.use_perceptual_hash else None
+        return sha256, phash
+
+    def get(self, sha256: str, phash: Optional[str] = None) -> Optional[Dict]:
+        """
+        Look up a cached recognition result
+
+        Args:
+            sha256: Exact content hash
+            phash: Optional perceptual hash for near-duplicate matching
+
+        Returns:
+            Cached recognition result or None
+        """
+        now = datetime.utcnow()
+        expires_before = (now - self.ttl).isoformat()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, result FROM recognition_cache WHERE sha256 = ? AND created_at >= ?",
+                (sha256, expires_before)
+            ).fetchone()
+            stat_key = "hits"
+
+            if row is None and phash:
+                candidates = self._conn.execute(
+                    "SELECT sha256, result, phash FROM recognition_cache "
+                    "WHERE phash IS NOT NULL AND created_at >= ?",
+                    (expires_before,)
+                ).fetchall()
+                best = None
+                for candidate in candidates:
+                    distance = _hamming_distance(phash, candidate[2])
+                    if distance <= self.max_hash_distance and (best is None or distance < best[0]):
+                        best = (distance, candidate)
+                if best:
+                    row = best[1]
+                    stat_key = "perceptual_hits"
+
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE recognition_cache SET last_hit_at = ? WHERE sha256 = ?",
+                (now.isoformat(), row[0])
+            )
+            self._conn.commit()
+            self._stats[stat_key] += 1
+
+        result = json.loads(row[1])
+        result["cached"] = True
+        return result
+
+    def set(self, sha256: str, phash: Optional[str], result: Dict):
+        """
+        Store a successful recognition result and evict expired/overflow entries
+
+        Args:
+            sha256: Exact content hash
+            phash: Optional perceptual hash
+            result: Recognition result (only successful results should be cached)
+        """
+        now = datetime.utcnow()
+        payload = json.dumps(result, ensure_ascii=False)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO recognition_cache (sha256, phash, result, created_at, last_hit_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (sha256, phash, payload, now.isoformat(), now.isoformat())
+            )
+            self._stats["stores"] += 1
+
+            # TTL eviction
+            cursor = self._conn.execute(
+                "DELETE FROM recognition_cache WHERE created_at < ?",
+                ((now - self.ttl).isoformat(),)
+            )
+            evicted = cursor.rowcount
+
+            # Size eviction (least recently hit first)
+            cursor = self._conn.execute(
+                "DELETE FROM recognition_cache WHERE sha256 IN ("
+                "SELECT sha256 FROM recognition_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            evicted += cursor.rowcount
+
+            self._conn.commit()
+            self._stats["evictions"] += evicted
+
+    def get_stats(self) -> Dict:
+        """
+        Get cache counters (per process) and current size
+
+        Returns:
+            Dictionary with hit/miss counters, hit rate and entry count
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM recognition_cache").fetchone()[0]
+            stats = dict(self._stats)
+
+        lookups = stats["hits"] + stats["perceptual_hits"] + stats["misses"]
+        stats["entries"] = entries
+        stats["max_entries"] = self.max_entries
+        stats["hit_rate"] = round((stats["hits"] + stats["perceptual_hits"]) / lookups * 100, 2) if lookups else 0
+        return stats
+
+
+# Create singleton instance
+recognition_cache = RecognitionCache(
+    settings.OCR_CACHE_DB_PATH,
+    ttl_hours=settings.OCR_CACHE_TTL_HOURS,
+    max_entries=settings.OCR_CACHE_MAX_ENTRIES,
+    use_perceptual_hash=settings.OCR_CACHE_PERCEPTUAL_HASH,
+    max_hash_distance=settings.OCR_CACHE_PHASH_MAX_DISTANCE
+)
@@ -0,0 +1,193 @@
+"""
+Student Search Index
+In-process index of student names and numbers for the admin filters:
+name substring (character postings), student-number prefix and pinyin
+prefix / initials (e.g. "zs" or "zhangs" for 张三)
+"""
+
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import event, inspect, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from models import SysStudent
+
+try:
+    from pypinyin import lazy_pinyin
+    PYPINYIN_AVAILABLE = True
+except ImportError:
+    PYPINYIN_AVAILABLE = False
+
+
+def _normalize(text: str) -> str:
+    return (text or "").replace(" ", "").lower()
+
+
+def _prefix_matches(keys: List[Tuple[str, int]], prefix: str) -> Set[int]:
+    """Ids whose key starts with prefix (keys sorted by key)"""
+    matches = set()
+    index = bisect_left(keys, (prefix,))
+    while index < len(keys) and keys[index][0].startswith(prefix):
+        matches.add(keys[index][1])
+        index += 1
+    return matches
+
+
+class _Snapshot:
+    """Immutable index data; searches read one snapshot while a rebuild prepares the next"""
+
+    def __init__(self, rows):
+        self.students: Dict[int, Tuple[str, str]] = {}
+        self.name_postings: Dict[str, Set[int]] = {}
+        number_keys = []
+        pinyin_keys = []
+
+        for student_id, name, student_number in rows:
+            self.students[student_id] = (name, student_number)
+            normalized = _normalize(name)
+            for char in set(normalized):
+                self.name_postings.setdefault(char, set()).add(student_id)
+            if student_number:
+                number_keys.append((student_number.lower(), student_id))
+            if PYPINYIN_AVAILABLE and normalized:
+                syllables = [s.lower() for s in lazy_pinyin(normalized)]
+                pinyin_keys.append(("".join(syllables), student_id))
+                pinyin_keys.append(("".join(s[0] for s in syllables if s), student_id))
+
+        self.number_keys = sorted(number_keys)
+        self.pinyin_keys = sorted(pinyin_keys)
+
+
+class StudentSearchIndex:
+    """
+    Student name/number index kept in each worker
+
+    Writes through the ORM in this process mark it dirty; rows added by
+    other processes (init scripts, other workers) are picked up by comparing
+    COUNT/MAX(id) at most every STUDENT_SEARCH_REFRESH_SECONDS.
+    """
+
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[_Snapshot] = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._dirty = True
+        self._lock = threading.Lock()
+        self._refresh_lock: Optional[asyncio.Lock] = None  # Created lazily inside the event loop
+
+    def mark_dirty(self, *args):
+        self._dirty = True
+
+    def mark_dirty_if_searchable_changed(self, mapper, connection, target):
+        """after_update listener: only name / student_number changes affect the index"""
+        state = inspect(target)
+        if state.attrs.name.history.has_changes() or state.attrs.student_number.history.has_changes():
+            self._dirty = True
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and not self._dirty
+            and time.monotonic() - self._checked_at < self.refresh_seconds
+        )
+
+    async def ensure_fresh(self, db: AsyncSession):
+        """Rebuild the index if students changed since it was built"""
+        if self._is_fresh():
+            return
+
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+
+        async with self._refresh_lock:
+            if self._is_fresh():
+                return
+
+            result = await db.execute(select(func.count(SysStudent.id), func.max(SysStudent.id)))
+            signature = tuple(result.one())
+            self._checked_at = time.monotonic()
+            if not self._dirty and signature == self._signature:
+                return
+
+            # Writes from here on mark the index dirty again
+            self._dirty = False
+            result = await db.execute(
+                select(SysStudent.id, SysStudent.name, SysStudent.student_number)
+            )
+            rows = result.all()
+
+            # Pinyin conversion of 100k names takes seconds, keep it off the event loop
+            snapshot = await asyncio.to_thread(_Snapshot, rows)
+            with self._lock:
+                self._snapshot = snapshot
+                self._signature = signature
+
+    def search(self, query: str, limit: int) -> Optional[List[int]]:
+        """
+        Find students by name substring, student-number prefix or pinyin prefix/initials
+
+        Args:
+            query: Search text
+            limit: Maximum number of matches
+
+        Returns:
+            Matching student ids, or None if more than limit students match
+            (callers fall back to a database filter)
+        """
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None:
+            return None
+
+        query = _normalize(query)
+        if not query:
+            return None
+
+        matches = set()
+
+        # Name substring: intersect the postings of each character, then confirm order
+        postings = [snapshot.name_postings.get(char) for char in set(query)]
+        if all(postings):
+            candidates = set.intersection(*sorted(postings, key=len))
+            matches.update(
+                student_id for student_id in candidates
+                if query in _normalize(snapshot.students[student_id][0])
+            )
+
+        if query.isascii() and query.isalnum():
+            matches |= _prefix_matches(snapshot.number_keys, query)
+            if query.isalpha():
+                matches |= _prefix_matches(snapshot.pinyin_keys, query)
+
+        if len(matches) > limit:
+            return None
+        return sorted(matches)
+
+    def describe(self, student_ids: List[int]) -> List[Dict]:
+        """Name and number of indexed students, in the given order"""
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None:
+            return []
+
+        return [
+            {
+                "id": student_id,
+                "name": snapshot.students[student_id][0],
+                "student_number": snapshot.students[student_id][1]
+            }
+            for student_id in student_ids
+            if student_id in snapshot.students
+        ]
+
+
+# Create singleton instance
+student_search_index = StudentSearchIndex(refresh_seconds=settings.STUDENT_SEARCH_REFRESH_SECONDS)
+
+event.listen(SysStudent, "after_insert", student_search_index.mark_dirty)
+event.listen(SysStudent, "after_delete", student_search_index.mark_dirty)
+event.listen(SysStudent, "after_update", student_search_index.mark_dirty_if_searchable_changed)
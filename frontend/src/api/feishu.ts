@@ -53,6 +53,14 @@ export function executeFeishuImport(data: FeishuImportRequest) {
     return request.post('/api/v1/feishu/import', data)
 }
 
+export function syncFeishuTable(data: FeishuImportRequest) {
+    return request.post('/api/v1/feishu/sync', data)
+}
+
+export function getFeishuImportJob(jobId: number) {
+    return request.get(`/api/v1/feishu/import-jobs/${jobId}`)
+}
+
 export function getImportHistory(params: { page: number; page_size: number }) {
     return request.get('/api/v1/feishu/import-history', { params })
 }
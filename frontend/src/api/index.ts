@@ -11,11 +11,14 @@ import type {
     TeachersResponse,
     UploadFileResponse,
     CertificateRecognitionResponse,
+    OcrJobSubmitResponse,
+    OcrJobResponse,
     AchievementCreateRequest,
     AchievementCreateResponse,
     AchievementsResponse,
     AchievementsReviewQuery,
     AchievementsReviewResponse,
+    AchievementStatsResponse,
     AuditAchievementRequest,
     ChatRequest,
     ChatResponse,
@@ -91,15 +94,48 @@ export function getStudentProfile(): Promise<any> {
 }
 
 /**
- * 证书OCR识别（步骤1：上传并识别）
+ * 提交证书OCR识别任务（上传后立即返回任务ID）
  * POST /api/v1/student/ocr/recognize
  */
-export function recognizeCertificate(file: File): Promise<CertificateRecognitionResponse> {
+export function submitCertificateOcr(file: File): Promise<OcrJobSubmitResponse> {
     const formData = new FormData()
     formData.append('file', file)
-    return request.post('/api/v1/student/ocr/recognize', formData, {
-        timeout: 60000 // OCR识别可能需要更长时间
-    })
+    return request.post('/api/v1/student/ocr/recognize', formData)
+}
+
+/**
+ * 查询证书OCR识别任务状态
+ * GET /api/v1/student/ocr/jobs/{job_id}
+ */
+export function getOcrJob(jobId: string): Promise<OcrJobResponse> {
+    return request.get(`/api/v1/student/ocr/jobs/${jobId}`)
+}
+
+/**
+ * 证书OCR识别（步骤1：上传并识别）
+ * 提交任务后轮询任务状态，直到识别完成
+ */
+export async function recognizeCertificate(
+    file: File,
+    pollInterval = 1500,
+    timeout = 180000
+): Promise<CertificateRecognitionResponse> {
+    const { job_id } = await submitCertificateOcr(file)
+    const deadline = Date.now() + timeout
+
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, pollInterval))
+        const job = await getOcrJob(job_id)
+
+        if (job.status === 'succeeded' && job.result) {
+            return job.result
+        }
+        if (job.status === 'failed') {
+            throw new Error(`Certificate saved but recognition failed: ${job.error}`)
+        }
+    }
+
+    throw new Error('OCR识别超时，请稍后重试')
 }
 
 /**
@@ -144,6 +180,74 @@ export function chatWithAI(data: ChatRequest): Promise<ChatResponse> {
     return request.post('/api/v1/student/ai/chat', data)
 }
 
+/**
+ * AI对话（流式）
+ * POST /api/v1/student/ai/chat/stream
+ * 通过SSE逐段返回回复，onDelta 收到目前为止拼接好的完整内容
+ * 返回值与 chatWithAI 相同
+ */
+export async function streamChatWithAI(
+    data: ChatRequest,
+    onDelta?: (content: string) => void
+): Promise<ChatResponse> {
+    const baseURL = (import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000').replace(/\/$/, '')
+    const token = localStorage.getItem('token')
+    const response = await fetch(`${baseURL}/api/v1/student/ai/chat/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            ...(token ? { Authorization: `Bearer ${token}` } : {})
+        },
+        body: JSON.stringify(data)
+    })
+
+    const contentType = response.headers.get('content-type') || ''
+    if (!response.ok || !response.body || !contentType.includes('text/event-stream')) {
+        const body = await response.json().catch(() => null)
+        throw new Error(body?.msg || body?.detail || `AI对话请求失败 (${response.status})`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let content = ''
+    let sessionId = data.session_id || ''
+
+    while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+
+        // SSE事件以空行分隔
+        let boundary = buffer.indexOf('\n\n')
+        while (boundary !== -1) {
+            const rawEvent = buffer.slice(0, boundary)
+            buffer = buffer.slice(boundary + 2)
+            boundary = buffer.indexOf('\n\n')
+
+            let event = 'message'
+            let payload = ''
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7)
+                else if (line.startsWith('data: ')) payload += line.slice(6)
+            }
+            if (!payload) continue
+
+            const parsed = JSON.parse(payload)
+            if (event === 'session') {
+                sessionId = parsed.session_id
+            } else if (event === 'delta') {
+                content += parsed.content
+                onDelta?.(content)
+            } else if (event === 'done') {
+                content = parsed.message
+            }
+        }
+    }
+
+    return { session_id: sessionId, message: content }
+}
+
 /**
  * 获取学生画像
  * GET /api/v1/student/persona
@@ -232,6 +336,14 @@ export function getAchievementsForReview(params?: AchievementsReviewQuery): Prom
     return request.get('/api/v1/admin/achievements', { params })
 }
 
+/**
+ * 获取成果状态统计（仪表盘）
+ * GET /api/v1/admin/achievements/stats
+ */
+export function getAchievementStats(): Promise<AchievementStatsResponse> {
+    return request.get('/api/v1/admin/achievements/stats')
+}
+
 /**
  * 审核成果
  * PATCH /api/v1/admin/achievements/{id}/audit
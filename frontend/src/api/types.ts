@@ -94,6 +94,24 @@ export interface CertificateRecognitionResponse {
     }
 }
 
+export type OcrJobStatus = 'queued' | 'processing' | 'succeeded' | 'failed'
+
+export interface OcrJobSubmitResponse {
+    job_id: string
+    status: OcrJobStatus
+    file_url: string
+}
+
+export interface OcrJobResponse {
+    job_id: string
+    status: OcrJobStatus
+    file_url: string
+    result: CertificateRecognitionResponse | null
+    error: string | null
+    created_at: string
+    updated_at: string
+}
+
 // ============= 成果相关 =============
 
 export type AchievementStatus = 'pending' | 'approved' | 'rejected'
@@ -145,11 +163,23 @@ export interface AchievementsReviewQuery {
     student_name?: string
     page?: number
     page_size?: number
+    cursor?: string  // 上一页返回的 next_cursor，传入时忽略 page
+    with_total?: boolean
 }
 
 export interface AchievementsReviewResponse {
     list: Achievement[]
+    total: number | null  // with_total=false 时为 null
+    has_more?: boolean
+    next_cursor?: string | null
+}
+
+export interface AchievementStatsResponse {
     total: number
+    approved: number
+    pending: number
+    rejected: number
+    approval_rate: number
 }
 
 export interface AuditAchievementRequest {
@@ -235,10 +235,15 @@ const aiChatModule: Module<AiChatState, any> = {
             commit('SET_SENDING', true)
 
             try {
-                // 调用API
+                // 调用API（流式接口会逐段回调，收到首段即结束加载状态）
                 const response = await chatWithAI({
                     message: message,
                     session_id: state.sessionId
+                }, (content: string) => {
+                    commit('UPDATE_MESSAGE', {
+                        id: aiMsgId,
+                        updates: { content, loading: false }
+                    })
                 })
 
                 // 更新SessionID